@@ -0,0 +1,52 @@
+"""add product search indexes (pg_trgm + unaccent)
+
+Revision ID: 010_add_product_search_indexes
+Revises: 009_create_sales_tables
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '010_add_product_search_indexes'
+down_revision = '009_create_sales_tables'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+
+    # unaccent() é STABLE; o wrapper IMMUTABLE permite usá-lo em índices de expressão
+    op.execute("""
+        CREATE OR REPLACE FUNCTION f_unaccent(text)
+        RETURNS text AS $$
+            SELECT public.unaccent('public.unaccent', $1)
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """)
+
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_products_name_trgm
+        ON products USING gin (f_unaccent(lower(name)) gin_trgm_ops)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_products_description_trgm
+        ON products USING gin (f_unaccent(lower(description)) gin_trgm_ops)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_products_sku_trgm
+        ON products USING gin (lower(sku) gin_trgm_ops)
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_sku_lower ON products (lower(sku))")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_ean_gtin ON products (ean_gtin)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_products_ean_gtin")
+    op.execute("DROP INDEX IF EXISTS ix_products_sku_lower")
+    op.execute("DROP INDEX IF EXISTS ix_products_sku_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_description_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_name_trgm")
+    op.execute("DROP FUNCTION IF EXISTS f_unaccent(text)")
@@ -0,0 +1,35 @@
+"""add composite indexes for keyset pagination
+
+Revision ID: 011_add_keyset_pagination_indexes
+Revises: 010_add_product_search_indexes
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '011_add_keyset_pagination_indexes'
+down_revision = '010_add_product_search_indexes'
+branch_labels = None
+depends_on = None
+
+
+# (nome do índice, tabela, colunas) — chave de ordenação + id das listagens
+INDEXES = [
+    ('ix_products_created_at_id', 'products', 'created_at, id'),
+    ('ix_products_name_id', 'products', 'name, id'),
+    ('ix_sales_created_at_id', 'sales', 'created_at, id'),
+    ('ix_sale_orders_created_at_id', 'sale_orders', 'created_at, id'),
+    ('ix_pessoas_nome_id', 'pessoas', 'nome, id'),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def downgrade():
+    for name, _, _ in reversed(INDEXES):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
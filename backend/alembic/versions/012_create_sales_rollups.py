@@ -0,0 +1,222 @@
+"""create daily sales rollup tables maintained by triggers
+
+Revision ID: 012_create_sales_rollups
+Revises: 011_add_keyset_pagination_indexes
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '012_create_sales_rollups'
+down_revision = '011_add_keyset_pagination_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Vendas por dia e produto / por dia e tipo de cliente (PF, PJ, AVULSO).
+    # Contam todas as vendas não canceladas; o dia é o de created_at (horário do Brasil, br_now).
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS sales_daily_by_product (
+            day DATE NOT NULL,
+            product_id UUID NOT NULL REFERENCES products(id),
+            quantity NUMERIC(14, 3) NOT NULL DEFAULT 0,
+            revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            items_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product_id)
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS sales_daily_by_client_type (
+            day DATE NOT NULL,
+            client_type VARCHAR(10) NOT NULL,
+            sales_count INTEGER NOT NULL DEFAULT 0,
+            revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, client_type)
+        )
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_rollup_day(p_created_at TIMESTAMP, p_sale_date TIMESTAMP)
+        RETURNS DATE AS $$
+            SELECT COALESCE(p_created_at, p_sale_date, LOCALTIMESTAMP)::date
+        $$ LANGUAGE sql STABLE
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_rollup_client_type(p_client_id UUID)
+        RETURNS VARCHAR AS $$
+            SELECT COALESCE((SELECT person_type::text FROM clients WHERE id = p_client_id), 'AVULSO')
+        $$ LANGUAGE sql STABLE
+    """)
+
+    # Soma (ou subtrai, com p_sign = -1) os itens de uma venda no rollup por produto
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_rollup_add_items(p_sale_id UUID, p_day DATE, p_sign INTEGER)
+        RETURNS VOID AS $$
+            INSERT INTO sales_daily_by_product AS r (day, product_id, quantity, revenue, items_count)
+            SELECT p_day, product_id, p_sign * SUM(quantity), p_sign * SUM(subtotal), p_sign * COUNT(*)
+            FROM sale_items
+            WHERE sale_id = p_sale_id
+            GROUP BY product_id
+            ORDER BY product_id
+            ON CONFLICT (day, product_id) DO UPDATE SET
+                quantity = r.quantity + EXCLUDED.quantity,
+                revenue = r.revenue + EXCLUDED.revenue,
+                items_count = r.items_count + EXCLUDED.items_count
+        $$ LANGUAGE sql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_rollup_add_client_type(p_day DATE, p_client_id UUID,
+                                                               p_total NUMERIC, p_sign INTEGER)
+        RETURNS VOID AS $$
+            INSERT INTO sales_daily_by_client_type AS r (day, client_type, sales_count, revenue)
+            VALUES (p_day, sales_rollup_client_type(p_client_id), p_sign, p_sign * COALESCE(p_total, 0))
+            ON CONFLICT (day, client_type) DO UPDATE SET
+                sales_count = r.sales_count + EXCLUDED.sales_count,
+                revenue = r.revenue + EXCLUDED.revenue
+        $$ LANGUAGE sql
+    """)
+
+    # Venda: desfaz a contribuição antiga e aplica a nova (status, total, cliente ou dia mudaram)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_rollup_on_sale()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            old_counted BOOLEAN := FALSE;
+            new_counted BOOLEAN := FALSE;
+            old_day DATE;
+            new_day DATE;
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                old_counted := COALESCE(OLD.status::text, '') <> 'cancelled';
+                old_day := sales_rollup_day(OLD.created_at, OLD.sale_date);
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                new_counted := COALESCE(NEW.status::text, '') <> 'cancelled';
+                new_day := sales_rollup_day(NEW.created_at, NEW.sale_date);
+            END IF;
+
+            IF old_counted THEN
+                PERFORM sales_rollup_add_client_type(old_day, OLD.client_id, OLD.total, -1);
+            END IF;
+            IF new_counted THEN
+                PERFORM sales_rollup_add_client_type(new_day, NEW.client_id, NEW.total, 1);
+            END IF;
+
+            -- Itens: no INSERT ainda não existem e no DELETE já foram removidos (FK),
+            -- então só o UPDATE que cancela/reativa ou muda o dia mexe no rollup por produto
+            IF TG_OP = 'UPDATE' AND (old_counted <> new_counted OR old_day <> new_day) THEN
+                IF old_counted THEN
+                    PERFORM sales_rollup_add_items(OLD.id, old_day, -1);
+                END IF;
+                IF new_counted THEN
+                    PERFORM sales_rollup_add_items(NEW.id, new_day, 1);
+                END IF;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    # Item: aplica a diferença no rollup por produto se a venda conta
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_rollup_on_item()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            sale RECORD;
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                SELECT status, sales_rollup_day(created_at, sale_date) AS day INTO sale
+                FROM sales WHERE id = OLD.sale_id;
+                IF FOUND AND COALESCE(sale.status::text, '') <> 'cancelled' THEN
+                    INSERT INTO sales_daily_by_product AS r (day, product_id, quantity, revenue, items_count)
+                    VALUES (sale.day, OLD.product_id, -OLD.quantity, -OLD.subtotal, -1)
+                    ON CONFLICT (day, product_id) DO UPDATE SET
+                        quantity = r.quantity + EXCLUDED.quantity,
+                        revenue = r.revenue + EXCLUDED.revenue,
+                        items_count = r.items_count + EXCLUDED.items_count;
+                END IF;
+            END IF;
+
+            IF TG_OP <> 'DELETE' THEN
+                SELECT status, sales_rollup_day(created_at, sale_date) AS day INTO sale
+                FROM sales WHERE id = NEW.sale_id;
+                IF FOUND AND COALESCE(sale.status::text, '') <> 'cancelled' THEN
+                    INSERT INTO sales_daily_by_product AS r (day, product_id, quantity, revenue, items_count)
+                    VALUES (sale.day, NEW.product_id, NEW.quantity, NEW.subtotal, 1)
+                    ON CONFLICT (day, product_id) DO UPDATE SET
+                        quantity = r.quantity + EXCLUDED.quantity,
+                        revenue = r.revenue + EXCLUDED.revenue,
+                        items_count = r.items_count + EXCLUDED.items_count;
+                END IF;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    op.execute("DROP TRIGGER IF EXISTS trg_sales_rollup ON sales")
+    op.execute("""
+        CREATE TRIGGER trg_sales_rollup
+        AFTER INSERT OR DELETE OR UPDATE OF status, total, client_id, created_at, sale_date ON sales
+        FOR EACH ROW EXECUTE FUNCTION sales_rollup_on_sale()
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_sale_items_rollup ON sale_items")
+    op.execute("""
+        CREATE TRIGGER trg_sale_items_rollup
+        AFTER INSERT OR DELETE OR UPDATE OF sale_id, product_id, quantity, subtotal ON sale_items
+        FOR EACH ROW EXECUTE FUNCTION sales_rollup_on_item()
+    """)
+
+    # Recalcula os rollups a partir de p_from (NULL = todo o histórico); usado na carga
+    # inicial e na reconciliação noturna. O LOCK segura os triggers durante a troca.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION reconcile_sales_rollups(p_from DATE DEFAULT NULL)
+        RETURNS VOID AS $$
+        BEGIN
+            LOCK TABLE sales_daily_by_product, sales_daily_by_client_type IN SHARE ROW EXCLUSIVE MODE;
+
+            DELETE FROM sales_daily_by_product WHERE p_from IS NULL OR day >= p_from;
+            DELETE FROM sales_daily_by_client_type WHERE p_from IS NULL OR day >= p_from;
+
+            INSERT INTO sales_daily_by_product (day, product_id, quantity, revenue, items_count)
+            SELECT sales_rollup_day(s.created_at, s.sale_date), si.product_id,
+                   SUM(si.quantity), SUM(si.subtotal), COUNT(*)
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id
+            WHERE COALESCE(s.status::text, '') <> 'cancelled'
+              AND (p_from IS NULL OR sales_rollup_day(s.created_at, s.sale_date) >= p_from)
+            GROUP BY 1, 2;
+
+            INSERT INTO sales_daily_by_client_type (day, client_type, sales_count, revenue)
+            SELECT sales_rollup_day(s.created_at, s.sale_date), COALESCE(c.person_type::text, 'AVULSO'),
+                   COUNT(*), SUM(COALESCE(s.total, 0))
+            FROM sales s
+            LEFT JOIN clients c ON c.id = s.client_id
+            WHERE COALESCE(s.status::text, '') <> 'cancelled'
+              AND (p_from IS NULL OR sales_rollup_day(s.created_at, s.sale_date) >= p_from)
+            GROUP BY 1, 2;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    # Carga inicial com o histórico existente
+    op.execute("SELECT reconcile_sales_rollups(NULL)")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_sale_items_rollup ON sale_items")
+    op.execute("DROP TRIGGER IF EXISTS trg_sales_rollup ON sales")
+    op.execute("DROP FUNCTION IF EXISTS reconcile_sales_rollups(DATE)")
+    op.execute("DROP FUNCTION IF EXISTS sales_rollup_on_item()")
+    op.execute("DROP FUNCTION IF EXISTS sales_rollup_on_sale()")
+    op.execute("DROP FUNCTION IF EXISTS sales_rollup_add_client_type(DATE, UUID, NUMERIC, INTEGER)")
+    op.execute("DROP FUNCTION IF EXISTS sales_rollup_add_items(UUID, DATE, INTEGER)")
+    op.execute("DROP FUNCTION IF EXISTS sales_rollup_client_type(UUID)")
+    op.execute("DROP FUNCTION IF EXISTS sales_rollup_day(TIMESTAMP, TIMESTAMP)")
+    op.execute("DROP TABLE IF EXISTS sales_daily_by_client_type")
+    op.execute("DROP TABLE IF EXISTS sales_daily_by_product")
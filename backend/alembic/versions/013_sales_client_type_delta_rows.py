@@ -0,0 +1,170 @@
+"""append-only delta rows for the sales by client type rollup
+
+Revision ID: 013_sales_client_type_delta_rows
+Revises: 012_create_sales_rollups
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '013_sales_client_type_delta_rows'
+down_revision = '012_create_sales_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # sales_daily_by_client_type tem três linhas por dia (PF, PJ, AVULSO): o upsert a cada venda
+    # serializava todas as vendas do dia na mesma linha. O trigger passa a só acrescentar uma linha
+    # em sales_daily_by_client_type_deltas; compact_sales_rollup_deltas() incorpora os deltas
+    # periodicamente (único escritor da tabela) e as leituras usam vw_sales_daily_by_client_type.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS sales_daily_by_client_type_deltas (
+            id BIGSERIAL PRIMARY KEY,
+            day DATE NOT NULL,
+            client_type VARCHAR(10) NOT NULL,
+            sales_count INTEGER NOT NULL,
+            revenue NUMERIC(14, 2) NOT NULL
+        )
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_rollup_add_client_type(p_day DATE, p_client_id UUID,
+                                                               p_total NUMERIC, p_sign INTEGER)
+        RETURNS VOID AS $$
+            INSERT INTO sales_daily_by_client_type_deltas (day, client_type, sales_count, revenue)
+            VALUES (p_day, sales_rollup_client_type(p_client_id), p_sign, p_sign * COALESCE(p_total, 0))
+        $$ LANGUAGE sql
+    """)
+
+    # Rollup + deltas pendentes; as consultas já somam por dia/tipo, então basta o UNION ALL
+    op.execute("""
+        CREATE OR REPLACE VIEW vw_sales_daily_by_client_type AS
+        SELECT day, client_type, sales_count, revenue FROM sales_daily_by_client_type
+        UNION ALL
+        SELECT day, client_type, sales_count, revenue FROM sales_daily_by_client_type_deltas
+    """)
+
+    # Remoção e upsert na mesma transação: leitores da view nunca contam um delta duas vezes
+    op.execute("""
+        CREATE OR REPLACE FUNCTION compact_sales_rollup_deltas(p_limit INTEGER DEFAULT 100000)
+        RETURNS INTEGER AS $$
+        DECLARE
+            consumed INTEGER;
+        BEGIN
+            WITH batch AS (
+                SELECT id FROM sales_daily_by_client_type_deltas
+                ORDER BY id
+                LIMIT p_limit
+                FOR UPDATE SKIP LOCKED
+            ),
+            removed AS (
+                DELETE FROM sales_daily_by_client_type_deltas d
+                USING batch
+                WHERE d.id = batch.id
+                RETURNING d.*
+            ),
+            grouped AS (
+                SELECT day, client_type, SUM(sales_count) AS sales_count,
+                       SUM(revenue) AS revenue, COUNT(*) AS total
+                FROM removed
+                GROUP BY day, client_type
+            ),
+            applied AS (
+                INSERT INTO sales_daily_by_client_type AS r (day, client_type, sales_count, revenue)
+                SELECT day, client_type, sales_count, revenue
+                FROM grouped
+                ORDER BY day, client_type
+                ON CONFLICT (day, client_type) DO UPDATE SET
+                    sales_count = r.sales_count + EXCLUDED.sales_count,
+                    revenue = r.revenue + EXCLUDED.revenue
+            )
+            SELECT COALESCE(SUM(total), 0) INTO consumed FROM grouped;
+
+            RETURN consumed;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    # Reconciliação: também descarta os deltas dos dias recalculados
+    op.execute("""
+        CREATE OR REPLACE FUNCTION reconcile_sales_rollups(p_from DATE DEFAULT NULL)
+        RETURNS VOID AS $$
+        BEGIN
+            LOCK TABLE sales_daily_by_product, sales_daily_by_client_type,
+                       sales_daily_by_client_type_deltas IN SHARE ROW EXCLUSIVE MODE;
+
+            DELETE FROM sales_daily_by_product WHERE p_from IS NULL OR day >= p_from;
+            DELETE FROM sales_daily_by_client_type WHERE p_from IS NULL OR day >= p_from;
+            DELETE FROM sales_daily_by_client_type_deltas WHERE p_from IS NULL OR day >= p_from;
+
+            INSERT INTO sales_daily_by_product (day, product_id, quantity, revenue, items_count)
+            SELECT sales_rollup_day(s.created_at, s.sale_date), si.product_id,
+                   SUM(si.quantity), SUM(si.subtotal), COUNT(*)
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id
+            WHERE COALESCE(s.status::text, '') <> 'cancelled'
+              AND (p_from IS NULL OR sales_rollup_day(s.created_at, s.sale_date) >= p_from)
+            GROUP BY 1, 2;
+
+            INSERT INTO sales_daily_by_client_type (day, client_type, sales_count, revenue)
+            SELECT sales_rollup_day(s.created_at, s.sale_date), COALESCE(c.person_type::text, 'AVULSO'),
+                   COUNT(*), SUM(COALESCE(s.total, 0))
+            FROM sales s
+            LEFT JOIN clients c ON c.id = s.client_id
+            WHERE COALESCE(s.status::text, '') <> 'cancelled'
+              AND (p_from IS NULL OR sales_rollup_day(s.created_at, s.sale_date) >= p_from)
+            GROUP BY 1, 2;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def downgrade():
+    op.execute("SELECT compact_sales_rollup_deltas(NULL)")
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_rollup_add_client_type(p_day DATE, p_client_id UUID,
+                                                               p_total NUMERIC, p_sign INTEGER)
+        RETURNS VOID AS $$
+            INSERT INTO sales_daily_by_client_type AS r (day, client_type, sales_count, revenue)
+            VALUES (p_day, sales_rollup_client_type(p_client_id), p_sign, p_sign * COALESCE(p_total, 0))
+            ON CONFLICT (day, client_type) DO UPDATE SET
+                sales_count = r.sales_count + EXCLUDED.sales_count,
+                revenue = r.revenue + EXCLUDED.revenue
+        $$ LANGUAGE sql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION reconcile_sales_rollups(p_from DATE DEFAULT NULL)
+        RETURNS VOID AS $$
+        BEGIN
+            LOCK TABLE sales_daily_by_product, sales_daily_by_client_type IN SHARE ROW EXCLUSIVE MODE;
+
+            DELETE FROM sales_daily_by_product WHERE p_from IS NULL OR day >= p_from;
+            DELETE FROM sales_daily_by_client_type WHERE p_from IS NULL OR day >= p_from;
+
+            INSERT INTO sales_daily_by_product (day, product_id, quantity, revenue, items_count)
+            SELECT sales_rollup_day(s.created_at, s.sale_date), si.product_id,
+                   SUM(si.quantity), SUM(si.subtotal), COUNT(*)
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id
+            WHERE COALESCE(s.status::text, '') <> 'cancelled'
+              AND (p_from IS NULL OR sales_rollup_day(s.created_at, s.sale_date) >= p_from)
+            GROUP BY 1, 2;
+
+            INSERT INTO sales_daily_by_client_type (day, client_type, sales_count, revenue)
+            SELECT sales_rollup_day(s.created_at, s.sale_date), COALESCE(c.person_type::text, 'AVULSO'),
+                   COUNT(*), SUM(COALESCE(s.total, 0))
+            FROM sales s
+            LEFT JOIN clients c ON c.id = s.client_id
+            WHERE COALESCE(s.status::text, '') <> 'cancelled'
+              AND (p_from IS NULL OR sales_rollup_day(s.created_at, s.sale_date) >= p_from)
+            GROUP BY 1, 2;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP FUNCTION IF EXISTS compact_sales_rollup_deltas(INTEGER)")
+    op.execute("DROP VIEW IF EXISTS vw_sales_daily_by_client_type")
+    op.execute("DROP TABLE IF EXISTS sales_daily_by_client_type_deltas")
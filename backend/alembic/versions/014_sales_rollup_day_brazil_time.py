@@ -0,0 +1,42 @@
+"""sales rollup day in Brazil time with an explicit AT TIME ZONE
+
+Revision ID: 014_sales_rollup_day_brazil_time
+Revises: 013_sales_client_type_delta_rows
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '014_sales_rollup_day_brazil_time'
+down_revision = '013_sales_client_type_delta_rows'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # created_at/sale_date recebem br_now() (com fuso), que o PostgreSQL grava na coluna sem fuso
+    # já convertido para o TimeZone da sessão (UTC). ::date pegava o dia nesse fuso: vendas entre
+    # 21h e 0h (Brasil) caíam no dia seguinte. Lido de volta no fuso da sessão e convertido para
+    # o horário de Brasília.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_rollup_day(p_created_at TIMESTAMP, p_sale_date TIMESTAMP)
+        RETURNS DATE AS $$
+            SELECT (COALESCE(p_created_at, p_sale_date, LOCALTIMESTAMP)::timestamptz
+                    AT TIME ZONE 'America/Sao_Paulo')::date
+        $$ LANGUAGE sql STABLE
+    """)
+
+    # Refaz os rollups com os dias corrigidos
+    op.execute("SELECT reconcile_sales_rollups(NULL)")
+
+
+def downgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sales_rollup_day(p_created_at TIMESTAMP, p_sale_date TIMESTAMP)
+        RETURNS DATE AS $$
+            SELECT COALESCE(p_created_at, p_sale_date, LOCALTIMESTAMP)::date
+        $$ LANGUAGE sql STABLE
+    """)
+    op.execute("SELECT reconcile_sales_rollups(NULL)")
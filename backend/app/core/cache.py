@@ -0,0 +1,107 @@
+"""
+Cache em memória com TTL e limite de tamanho (LRU), seguro entre threads
+
+Usado para dados consultados em toda requisição e que mudam pouco
+(permissões por role, usuário autenticado, resumos de dashboard).
+Cada processo do uvicorn tem seu próprio cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Cache LRU com expiração por tempo e contadores de acerto"""
+
+    def __init__(self, name: str, ttl_seconds: float, max_size: int = 1024):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Retorna o valor em cache ou carrega, guarda e retorna"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+_registry: Dict[str, TTLCache] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(name: str, ttl_seconds: float, max_size: int = 1024) -> TTLCache:
+    """Cache nomeado do processo (criado no primeiro uso)"""
+    with _registry_lock:
+        cache = _registry.get(name)
+        if cache is None:
+            cache = TTLCache(name, ttl_seconds, max_size)
+            _registry[name] = cache
+        return cache
+
+
+def all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Estatísticas de todos os caches registrados"""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return {cache.name: cache.stats() for cache in caches}
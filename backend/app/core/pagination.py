@@ -0,0 +1,212 @@
+"""
+Paginação por cursor (keyset) para listagens grandes
+
+Em vez de OFFSET (que lê e descarta todas as linhas anteriores), a próxima
+página começa logo após a última linha da página atual, comparando pela
+chave de ordenação + id. O cursor ``after`` é opaco para o cliente: base64
+de um JSON com os valores dessa chave.
+
+Para usar índice, cada listagem precisa de um índice composto
+(chave de ordenação, id) — ver alembic 011_add_keyset_pagination_indexes e
+migrations/028_create_keyset_pagination_indexes.sql.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import and_, literal, or_, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+# Header com o cursor da próxima página nas listagens que retornam lista pura
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Modos de contagem do total: exato (COUNT), estimado pelo planner ou nenhum
+COUNT_MODES = ("exact", "estimated", "none")
+
+# Abaixo disso a estimativa é trocada pelo COUNT exato, que já é barato
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def _encode_value(value: Any) -> list:
+    if value is None:
+        return ["n", None]
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, datetime):
+        return ["dt", value.isoformat()]
+    if isinstance(value, date):
+        return ["d", value.isoformat()]
+    if isinstance(value, Decimal):
+        return ["dec", str(value)]
+    if isinstance(value, UUID):
+        return ["u", str(value)]
+    if isinstance(value, bool):
+        return ["b", value]
+    if isinstance(value, (int, float)):
+        return ["num", value]
+    return ["s", str(value)]
+
+
+def _decode_value(item: list) -> Any:
+    kind, value = item
+    if kind == "n":
+        return None
+    if kind == "dt":
+        return datetime.fromisoformat(value)
+    if kind == "d":
+        return date.fromisoformat(value)
+    if kind == "dec":
+        return Decimal(value)
+    if kind == "u":
+        return UUID(value)
+    if kind in ("b", "num", "s"):
+        return value
+    raise ValueError(f"tipo desconhecido: {kind}")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Gera o token opaco a partir dos valores da chave (ordenação, id)"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int = 2) -> List[Any]:
+    """Lê o token ``after``; token inválido gera 400"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        items = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        values = [_decode_value(item) for item in items]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+    if len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+    return values
+
+
+def _is_nullable(column) -> bool:
+    expression = getattr(column, "expression", column)
+    return getattr(expression, "nullable", True)
+
+
+def keyset_page(query, sort_column, id_column, descending: bool, after: Optional[str],
+                limit: int, skip: int = 0) -> Tuple[list, Optional[str]]:
+    """
+    Aplica ordenação (chave, id), o filtro "depois do cursor" e o LIMIT.
+    Retorna (linhas, cursor da próxima página ou None na última página).
+
+    Sem ``after`` continua aceitando ``skip`` (OFFSET), para os clientes
+    atuais; o cursor devolvido permite seguir dali em diante sem OFFSET.
+
+    Segue a ordenação padrão do PostgreSQL para NULL (maior que tudo:
+    por último em ASC, primeiro em DESC), então nenhuma linha é pulada
+    quando a coluna de ordenação aceita NULL.
+    """
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    if after:
+        last_key, last_id = decode_cursor(after)
+        query = query.filter(_after_condition(sort_column, id_column, descending, last_key, last_id))
+    elif skip:
+        query = query.offset(skip)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    entity = last[0] if isinstance(last, Row) else last
+    return rows, encode_cursor([getattr(entity, sort_column.key), getattr(entity, id_column.key)])
+
+
+def _after_condition(sort_column, id_column, descending: bool, last_key: Any, last_id: Any):
+    nullable = _is_nullable(sort_column)
+    # Parâmetros com o tipo da coluna (GUID, Enum, DateTime...)
+    cursor_id = literal(last_id, type_=id_column.type)
+    cursor_key = literal(last_key, type_=sort_column.type) if last_key is not None else None
+    if descending:
+        if last_key is None:
+            # Ainda dentro do bloco de NULLs (que vem primeiro em DESC)
+            return or_(
+                and_(sort_column.is_(None), id_column < cursor_id),
+                sort_column.isnot(None)
+            )
+        return tuple_(sort_column, id_column) < tuple_(cursor_key, cursor_id)
+
+    if last_key is None:
+        return and_(sort_column.is_(None), id_column > cursor_id)
+    condition = tuple_(sort_column, id_column) > tuple_(cursor_key, cursor_id)
+    if nullable:
+        condition = or_(condition, sort_column.is_(None))
+    return condition
+
+
+def keyset_sql(sort_expr: str, id_expr: str, descending: bool,
+               after: Optional[str]) -> Tuple[str, str, list]:
+    """
+    Versão para SQL puro (psycopg2), para chaves NOT NULL.
+    Retorna (condição WHERE ou "", ORDER BY, parâmetros da condição).
+    """
+    direction = "DESC" if descending else "ASC"
+    order_by = f"{sort_expr} {direction}, {id_expr} {direction}"
+    if not after:
+        return "", order_by, []
+
+    last_key, last_id = decode_cursor(after)
+    operator = "<" if descending else ">"
+    return f"({sort_expr}, {id_expr}) {operator} (%s, %s)", order_by, [last_key, str(last_id)]
+
+
+def trim_page(rows: list, limit: int, sort_index: int, id_index: int) -> Tuple[list, Optional[str]]:
+    """Recorta as linhas buscadas com LIMIT + 1 e gera o cursor da próxima página"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([rows[-1][sort_index], rows[-1][id_index]])
+
+
+def count_rows(db: Session, query, mode: str = "exact") -> Optional[int]:
+    """
+    Total de linhas da listagem conforme o modo:
+    - exact: COUNT(*) da consulta filtrada
+    - estimated: linhas estimadas pelo planner (EXPLAIN), sem varrer a tabela;
+      estimativas pequenas são confirmadas com COUNT exato
+    - none: não conta (retorna None)
+    """
+    if mode == "none":
+        return None
+    if mode == "estimated":
+        estimate = _planner_estimate(db, query)
+        if estimate is not None and estimate >= EXACT_COUNT_THRESHOLD:
+            return estimate
+    return query.order_by(None).count()
+
+
+def _planner_estimate(db: Session, query) -> Optional[int]:
+    try:
+        compiled = query.order_by(None).statement.compile(
+            dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True}
+        )
+    except Exception:
+        # Tipos sem renderização literal: cai para o COUNT exato
+        return None
+
+    try:
+        # SAVEPOINT: um EXPLAIN que falha no servidor não pode abortar a
+        # transação em que o COUNT exato (fallback) vai rodar
+        with db.begin_nested():
+            plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}").scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception:
+        return None
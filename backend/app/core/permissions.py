@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import FrozenSet, List, Optional
 from functools import wraps
 from fastapi import HTTPException, Depends
 from sqlalchemy.orm import Session
@@ -8,32 +8,69 @@ from app.models.role import Role
 from app.models.permission import Permission
 from app.models.role_permission import RolePermission
 from app.core.auth import get_current_user
+from app.core.cache import get_cache
+from app.config import settings
 
 
-def get_user_permissions(user: User, db: Session) -> List[str]:
+# Permissões resolvidas por role_id e por role legado. Expiram sozinhas pelo
+# TTL e são invalidadas pelos routers de roles/permissões quando os grants mudam.
+permission_cache = get_cache("permissions", ttl_seconds=settings.permission_cache_ttl_seconds)
+
+
+def get_role_permissions(role_id, db: Session) -> FrozenSet[str]:
     """
-    Retorna lista de permissões do usuário no formato 'resource:action'
+    Retorna as permissões concedidas a um role (em cache por role_id)
     """
-    permissions = []
-    
-    if user.role_id:
-        # Buscar permissões via novo sistema de roles
-        role_permissions = db.query(RolePermission).join(Permission).filter(
-            RolePermission.role_id == user.role_id,
+    def load() -> FrozenSet[str]:
+        rows = db.query(Permission.resource, Permission.action).join(
+            RolePermission, RolePermission.permission_id == Permission.id
+        ).filter(
+            RolePermission.role_id == role_id,
             RolePermission.granted == True,
             Permission.is_active == True
         ).all()
-        
-        for rp in role_permissions:
-            permission_key = f"{rp.permission.resource}:{rp.permission.action}"
-            permissions.append(permission_key)
+        return frozenset(f"{resource}:{action}" for resource, action in rows)
+
+    return permission_cache.get_or_load(("role_id", str(role_id)), load)
+
+
+def get_user_permission_set(user: User, db: Session) -> FrozenSet[str]:
+    """
+    Conjunto de permissões do usuário ('resource:action'), sem consultar o banco se em cache
+    """
+    permissions = frozenset()
+    
+    if user.role_id:
+        # Buscar permissões via novo sistema de roles
+        permissions = get_role_permissions(user.role_id, db)
     
     # Fallback para sistema antigo de roles
     if user.role:
-        legacy_permissions = get_legacy_role_permissions(user.role.value)
-        permissions.extend(legacy_permissions)
+        legacy_role = user.role.value
+        legacy_permissions = permission_cache.get_or_load(
+            ("legacy", legacy_role),
+            lambda: frozenset(get_legacy_role_permissions(legacy_role))
+        )
+        permissions = permissions | legacy_permissions
     
-    return list(set(permissions))  # Remove duplicatas
+    return permissions
+
+
+def get_user_permissions(user: User, db: Session) -> List[str]:
+    """
+    Retorna lista de permissões do usuário no formato 'resource:action'
+    """
+    return list(get_user_permission_set(user, db))
+
+
+def invalidate_role_permissions(role_id=None):
+    """
+    Descarta permissões em cache de um role (ou de todos, se role_id for None)
+    """
+    if role_id is None:
+        permission_cache.clear()
+    else:
+        permission_cache.invalidate(("role_id", str(role_id)))
 
 
 def get_legacy_role_permissions(role: str) -> List[str]:
@@ -102,8 +139,7 @@ def has_permission(user: User, resource: str, action: str, db: Session) -> bool:
     Verifica se o usuário tem uma permissão específica
     """
     permission_key = f"{resource}:{action}"
-    user_permissions = get_user_permissions(user, db)
-    return permission_key in user_permissions
+    return permission_key in get_user_permission_set(user, db)
 
 
 def require_permission(resource: str, action: str):
@@ -144,7 +180,7 @@ def require_permissions(permissions: List[str]):
             if not current_user or not db:
                 raise HTTPException(status_code=500, detail="Dependências não encontradas")
             
-            user_permissions = get_user_permissions(current_user, db)
+            user_permissions = get_user_permission_set(current_user, db)
             
             # Verifica se o usuário tem pelo menos uma das permissões necessárias
             has_any_permission = any(perm in user_permissions for perm in permissions)
@@ -4,13 +4,24 @@ from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from app.config import settings
 from app.core.database import get_db
+from app.core.cache import get_cache
 from app.models.user import User
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Campos usados na autorização, em cache por id do usuário para evitar um
+# SELECT em users a cada requisição (invalidado pelo router de usuários e no logout)
+USER_CACHE_FIELDS = ("id", "role", "role_id", "is_active", "name")
+user_cache = get_cache(
+    "authenticated_users",
+    ttl_seconds=settings.user_cache_ttl_seconds,
+    max_size=settings.user_cache_max_size
+)
 
 
 def create_access_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -50,6 +61,21 @@ def decode_token(token: str) -> dict:
         )
 
 
+def invalidate_cached_user(user_id: Union[str, Any]) -> None:
+    """Descartar o usuário do cache de autenticação"""
+    user_cache.invalidate(str(user_id))
+
+
+def _user_from_cache(fields: dict, db: Session) -> User:
+    """
+    Reconstrói o usuário a partir do cache e o associa à sessão sem SELECT.
+    Campos fora do cache (email, password_hash, role_obj) são carregados sob demanda.
+    """
+    user = User(**fields)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -63,6 +89,10 @@ def get_current_user(
             detail="Token inválido"
         )
     
+    cached_fields = user_cache.get(str(user_id))
+    if cached_fields is not None:
+        return _user_from_cache(cached_fields, db)
+    
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         raise HTTPException(
@@ -70,6 +100,7 @@ def get_current_user(
             detail="Usuário não encontrado"
         )
     
+    user_cache.set(str(user_id), {field: getattr(user, field) for field in USER_CACHE_FIELDS})
     return user
 
 
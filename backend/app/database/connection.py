@@ -1,35 +1,267 @@
 """
-Módulo de conexão com banco usando psycopg2 (fallback)
+Módulo de conexão com banco usando psycopg2 (pool de conexões)
+
+Os serviços de SQL puro (compras, estoque, contas a pagar) emprestam conexões
+de um pool único por processo em vez de abrir uma conexão nova a cada chamada.
 """
+import threading
+import time
+import urllib.parse
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
 import psycopg2
-import os
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+
 from app.config import settings
 
-def get_db_connection():
-    """Obter conexão com o banco de dados"""
-    try:
-        # Tentar usar parâmetros separados para evitar problemas de encoding
-        conn = psycopg2.connect(
-            host="localhost",
-            database="erp_db",
-            user="erp_user", 
-            password="erp_password",
-            port=5432
-        )
-        return conn
-    except Exception as e:
-        # Se falhar, tentar usar a URL do settings
+logger = logging.getLogger(__name__)
+
+
+def parse_database_url(database_url: str) -> Dict[str, Any]:
+    """Converter a DATABASE_URL em parâmetros do psycopg2"""
+    # Parse da URL para evitar problemas de encoding
+    parsed = urllib.parse.urlparse(database_url)
+    return {
+        'host': parsed.hostname,
+        'database': parsed.path[1:],  # Remove a / do início
+        'user': urllib.parse.unquote(parsed.username) if parsed.username else None,
+        'password': urllib.parse.unquote(parsed.password) if parsed.password else None,
+        'port': parsed.port or 5432,
+    }
+
+
+class PooledConnection:
+    """
+    Conexão emprestada do pool.
+
+    Repassa tudo para a conexão psycopg2 real; ``close()`` devolve a conexão
+    ao pool em vez de fechá-la, mantendo compatível o código que já faz
+    ``conn.close()`` no ``finally``.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __del__(self):
+        # Quem esqueceu o close(): sem isso a vaga ficaria ocupada até o restart
+        # (antes do pool o GC fechava a conexão avulsa)
+        if getattr(self, '_conn', None) is not None:
+            try:
+                self._pool.record_leak()
+                self.close()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._conn is not None:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        self.close()
+
+
+class ConnectionPool:
+    """Pool de conexões psycopg2 thread-safe com health check e estatísticas"""
+
+    def __init__(self, conn_params: Dict[str, Any], min_size: int = 1,
+                 max_size: int = 10, timeout: float = 30.0):
+        if min_size > max_size:
+            raise ValueError("min_size não pode ser maior que max_size")
+
+        self.conn_params = conn_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+
+        self._pool = pg_pool.ThreadedConnectionPool(min_size, max_size, **conn_params)
+        # O ThreadedConnectionPool lança PoolError quando esgotado; o semáforo
+        # faz quem chega esperar (até o timeout) por uma conexão livre.
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._borrowed_total = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._discarded_total = 0
+        self._timeouts_total = 0
+        self._leaked_total = 0
+
+    def acquire(self) -> PooledConnection:
+        """Emprestar uma conexão saudável do pool"""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._timeouts_total += 1
+            raise Exception(
+                f"Erro ao conectar no banco: nenhuma conexão livre no pool após {self.timeout}s"
+            )
+
+        try:
+            conn = self._borrow_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._in_use += 1
+            self._borrowed_total += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+
+        return PooledConnection(self, conn)
+
+    def _borrow_healthy(self):
+        """Pegar conexão do pool descartando as que caíram"""
+        # Uma tentativa por conexão ociosa possível + uma conexão nova
+        for _ in range(self.max_size + 1):
+            conn = self._pool.getconn()
+            if self._is_healthy(conn):
+                return conn
+            with self._lock:
+                self._discarded_total += 1
+            self._pool.putconn(conn, close=True)
+        raise Exception("Erro ao conectar no banco: nenhuma conexão saudável disponível")
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def release(self, conn):
+        """Devolver conexão ao pool, descartando transação pendente"""
+        discard = bool(conn.closed)
+        if not discard:
+            try:
+                status = conn.get_transaction_status()
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
         try:
-            import urllib.parse
-            # Parse da URL para evitar problemas de encoding
-            parsed = urllib.parse.urlparse(settings.database_url)
-            conn = psycopg2.connect(
-                host=parsed.hostname,
-                database=parsed.path[1:],  # Remove a / do início
-                user=parsed.username,
-                password=parsed.password,
-                port=parsed.port
+            self._pool.putconn(conn, close=discard)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                if discard:
+                    self._discarded_total += 1
+            self._slots.release()
+
+    def record_leak(self):
+        """Conexão devolvida pelo GC em vez de close()"""
+        with self._lock:
+            self._leaked_total += 1
+        logger.warning("Conexão do pool não foi fechada; devolvida na coleta de lixo")
+
+    @contextmanager
+    def connection(self):
+        """Emprestar conexão com commit/rollback automático ao sair do bloco"""
+        conn = self.acquire()
+        with conn:
+            yield conn
+
+    def stats(self) -> Dict[str, Any]:
+        """Estatísticas de uso do pool"""
+        with self._lock:
+            idle = len(self._pool._pool)
+            borrowed = self._borrowed_total
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': idle,
+                'borrowed_total': borrowed,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / borrowed, 3) if borrowed else 0.0,
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'discarded_total': self._discarded_total,
+                'timeouts_total': self._timeouts_total,
+                'leaked_total': self._leaked_total,
+            }
+
+    def close_all(self):
+        self._pool.closeall()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def init_pool() -> ConnectionPool:
+    """Criar o pool do processo (chamado no startup da aplicação)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            conn_params = parse_database_url(settings.database_url)
+            _pool = ConnectionPool(
+                conn_params,
+                min_size=settings.db_pool_min_size,
+                max_size=settings.db_pool_max_size,
+                timeout=settings.db_pool_timeout,
+            )
+            logger.info(
+                f"Pool de conexões iniciado em {conn_params['host']}:{conn_params['port']}/"
+                f"{conn_params['database']} (min={settings.db_pool_min_size}, max={settings.db_pool_max_size})"
             )
-            return conn
-        except Exception as e2:
-            raise Exception(f"Erro ao conectar no banco: {e2}")
\ No newline at end of file
+        return _pool
+
+
+def get_pool() -> ConnectionPool:
+    """Pool do processo, inicializado sob demanda para scripts avulsos"""
+    return _pool if _pool is not None else init_pool()
+
+
+def close_pool():
+    """Fechar todas as conexões do pool (shutdown da aplicação)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+
+def get_db_connection() -> PooledConnection:
+    """Obter conexão com o banco de dados (emprestada do pool; ``close()`` devolve)"""
+    try:
+        return get_pool().acquire()
+    except pg_pool.PoolError as e:
+        raise Exception(f"Erro ao conectar no banco: {e}")
+    except psycopg2.Error as e:
+        raise Exception(f"Erro ao conectar no banco: {e}")
+
+
+@contextmanager
+def db_connection():
+    """Context manager: empresta conexão, faz commit/rollback e devolve ao pool"""
+    with get_pool().connection() as conn:
+        yield conn
@@ -0,0 +1,74 @@
+"""
+Executor limitado para rodar chamadas bloqueantes do psycopg2 fora do event loop
+
+Os serviços de SQL puro expõem métodos ``async`` para os routers, mas o
+psycopg2 é síncrono. Cada método bloqueante é escrito como função comum e
+decorado com ``@run_in_db_executor``; a chamada vira uma corrotina que roda o
+corpo em uma thread do executor, liberando o loop para as outras requisições.
+
+O executor é dimensionado pelo pool de conexões e fica só para o psycopg2.
+Trabalho bloqueante que não usa o banco (ex.: gerar PDF com ReportLab) usa
+``@run_in_thread``, que roda no threadpool padrão do Starlette.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Executor do processo; o número de threads acompanha o tamanho do pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.db_pool_max_size,
+                    thread_name_prefix="db-executor",
+                )
+    return _executor
+
+
+def shutdown_db_executor():
+    """Encerrar o executor (shutdown da aplicação)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Executar ``func`` no executor do banco e aguardar o resultado"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_db_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def run_in_db_executor(func):
+    """Decorator: transforma um método bloqueante em corrotina não bloqueante"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_blocking(func, *args, **kwargs)
+
+    wrapper.sync = func
+    return wrapper
+
+
+def run_in_thread(func):
+    """Decorator: como run_in_db_executor, mas fora do executor do banco (trabalho sem banco)"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_threadpool(func, *args, **kwargs)
+
+    wrapper.sync = func
+    return wrapper
@@ -0,0 +1,131 @@
+"""
+Respostas em streaming (NDJSON ou CSV) a partir de cursores do lado do servidor
+
+Para listagens sem limite (exportações, /pessoas/all), a consulta roda em um
+cursor nomeado do PostgreSQL e as linhas são lidas em blocos de
+``chunk_size``: o processo nunca guarda o resultado inteiro em memória e o
+cliente começa a receber dados antes do fim da consulta.
+
+A conexão é emprestada do pool só quando o cliente começa a ler o corpo e é
+devolvida ao final (ou se o cliente desconectar no meio).
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+from uuid import UUID, uuid4
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.database.connection import get_db_connection
+
+DEFAULT_CHUNK_SIZE = 1000
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    return str(value)
+
+
+def _csv_value(value: Any):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_query_chunks(sql: str, params: Optional[Sequence[Any]] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Executa ``sql`` em um cursor nomeado e produz (colunas, bloco de linhas)
+    com no máximo ``chunk_size`` linhas por bloco
+    """
+    conn = get_db_connection()
+    try:
+        with conn.cursor(name=f"stream_{uuid4().hex}") as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(sql, params or [])
+            columns: Optional[List[str]] = None
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if columns is None:
+                    columns = [column[0] for column in cursor.description]
+                    if not rows:
+                        # Consulta vazia: ainda permite escrever o cabeçalho do CSV
+                        yield columns, rows
+                if not rows:
+                    break
+                yield columns, rows
+    finally:
+        # Somente leitura: encerra a transação do cursor nomeado
+        conn.rollback()
+        conn.close()
+
+
+def _encode_ndjson(chunks: Iterator[tuple], row_mapper: Optional[Callable]) -> Iterator[str]:
+    for columns, rows in chunks:
+        lines = []
+        for row in rows:
+            record = dict(zip(columns, row))
+            if row_mapper:
+                record = row_mapper(record)
+            lines.append(json.dumps(record, default=_json_default, ensure_ascii=False))
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+
+def _encode_csv(chunks: Iterator[tuple], row_mapper: Optional[Callable]) -> Iterator[str]:
+    header_written = False
+    for columns, rows in chunks:
+        output = io.StringIO()
+        writer = csv.writer(output)
+        if not rows and not header_written and not row_mapper:
+            writer.writerow(columns)
+            header_written = True
+        for row in rows:
+            record = dict(zip(columns, row))
+            if row_mapper:
+                record = row_mapper(record)
+            if not header_written:
+                writer.writerow(record.keys())
+                header_written = True
+            writer.writerow([_csv_value(value) for value in record.values()])
+        yield output.getvalue()
+
+
+def stream_query(sql: str, params: Optional[Sequence[Any]] = None, fmt: str = "ndjson",
+                 filename: Optional[str] = None,
+                 row_mapper: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> StreamingResponse:
+    """
+    Resposta em streaming com as linhas de ``sql`` (placeholders ``%s``)
+    em NDJSON (um objeto JSON por linha) ou CSV com cabeçalho.
+    ``row_mapper`` recebe e devolve o dict de cada linha.
+    """
+    if fmt not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Use: {', '.join(STREAM_FORMATS)}")
+
+    chunks = iter_query_chunks(sql, params, chunk_size)
+    body = _encode_csv(chunks, row_mapper) if fmt == "csv" else _encode_ndjson(chunks, row_mapper)
+
+    headers = {}
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename={filename}.{fmt}"
+
+    return StreamingResponse(body, media_type=STREAM_FORMATS[fmt], headers=headers)
@@ -1,6 +1,10 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
+from app.database.connection import init_pool, close_pool, get_pool
+from app.database.executor import shutdown_db_executor
+from app.core.cache import all_cache_stats
+from app.core.security import require_roles
 from app.routers import auth, users, clients, suppliers, categories, products, sales, financial, inventory, reports, roles, permissions, contacts, sale_orders, nfe, payments, quick_sales, pessoas, setup, purchase, stock, accounts_payable
 
 app = FastAPI(
@@ -18,6 +22,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -47,6 +52,191 @@ app.include_router(stock.router)
 app.include_router(accounts_payable.router)
 
 
+@app.on_event("startup")
+def startup_db_pool():
+    """Abrir o pool de conexões uma única vez por processo"""
+    import logging
+    try:
+        init_pool()
+    except Exception as e:
+        # Sem banco no startup: o pool será criado no primeiro uso
+        logging.getLogger(__name__).error(f"Erro ao iniciar pool de conexões: {e}")
+
+
+@app.on_event("startup")
+def warm_barcode_index():
+    """Carregar o índice de códigos de barras antes da primeira venda"""
+    import logging
+    from app.core.database import SessionLocal
+    db = SessionLocal()
+    try:
+        products.barcode_index.load(db)
+    except Exception as e:
+        # O índice é carregado sob demanda na primeira leitura
+        logging.getLogger(__name__).error(f"Erro ao carregar índice de códigos de barras: {e}")
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+async def start_barcode_index_refresher():
+    """Recarregar o índice de códigos de barras periodicamente, fora do event loop"""
+    import asyncio
+    import logging
+    from app.core.database import SessionLocal
+    from app.database.executor import run_blocking
+
+    interval = settings.barcode_index_max_age_seconds
+    if interval <= 0:
+        return
+
+    def reload_index():
+        db = SessionLocal()
+        try:
+            products.barcode_index.load(db)
+        finally:
+            db.close()
+
+    async def refresh_loop():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_blocking(reload_index)
+            except Exception as e:
+                # Mantém o índice atual e tenta no próximo ciclo
+                logging.getLogger(__name__).error(f"Erro ao recarregar índice de códigos de barras: {e}")
+
+    app.state.barcode_index_refresher = asyncio.create_task(refresh_loop())
+
+
+@app.on_event("startup")
+async def start_stock_delta_compactor():
+    """No modo delta de estoque, compactar os deltas periodicamente em segundo plano"""
+    import asyncio
+    import logging
+    from app.services.stock_service import StockService
+
+    interval = settings.stock_delta_compaction_interval_seconds
+    if not settings.stock_delta_mode or interval <= 0:
+        return
+
+    async def compact_loop():
+        service = StockService()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = await service.compact_stock_deltas()
+                if not result.success:
+                    logging.getLogger(__name__).error(result.message)
+            except Exception as e:
+                # Falha pontual (ex.: banco indisponível): tenta no próximo ciclo
+                logging.getLogger(__name__).error(f"Erro na compactação de deltas de estoque: {e}")
+
+    app.state.stock_delta_compactor = asyncio.create_task(compact_loop())
+
+
+@app.on_event("startup")
+async def start_rollup_reconciler():
+    """Reconciliar os rollups dos dashboards uma vez por noite"""
+    import asyncio
+    import logging
+    from datetime import timedelta
+    from app.models.base import br_now
+    from app.services.dashboard_service import DashboardService
+
+    hour = settings.rollup_reconcile_hour
+    if hour < 0:
+        return
+
+    async def reconcile_loop():
+        service = DashboardService()
+        while True:
+            now = br_now()
+            next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+            try:
+                result = await service.reconcile_rollups(settings.rollup_reconcile_days)
+                if not result.success:
+                    logging.getLogger(__name__).error(result.message)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Erro na reconciliação dos rollups: {e}")
+
+    app.state.rollup_reconciler = asyncio.create_task(reconcile_loop())
+
+
+@app.on_event("startup")
+async def start_rollup_compactor():
+    """Compactar periodicamente os deltas do rollup de vendas por tipo de cliente"""
+    import asyncio
+    import logging
+    from app.services.dashboard_service import DashboardService
+
+    interval = settings.rollup_compaction_interval_seconds
+    if interval <= 0:
+        return
+
+    async def compact_loop():
+        service = DashboardService()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = await service.compact_rollup_deltas()
+                if not result.success:
+                    logging.getLogger(__name__).error(result.message)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Erro na compactação dos deltas de rollup: {e}")
+
+    app.state.rollup_compactor = asyncio.create_task(compact_loop())
+
+
+@app.on_event("startup")
+async def start_email_outbox_worker():
+    """Enviar os emails da fila em segundo plano, reaproveitando a conexão SMTP"""
+    import asyncio
+    import logging
+    from app.services.email_outbox_service import EmailOutboxService
+
+    interval = settings.email_outbox_poll_interval_seconds
+    if not settings.smtp_host or interval <= 0:
+        return
+
+    async def dispatch_loop():
+        service = EmailOutboxService()
+        while True:
+            try:
+                result = await service.dispatch_pending()
+                if not result.success:
+                    logging.getLogger(__name__).error(result.message)
+                elif result.data['claimed'] >= settings.email_outbox_batch_size:
+                    # Lote cheio: ainda há fila, continua sem esperar
+                    continue
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Erro no worker da fila de emails: {e}")
+            await asyncio.sleep(interval)
+
+    app.state.email_outbox_worker = asyncio.create_task(dispatch_loop())
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    from app.services.email_outbox_service import smtp_connection
+
+    for name in ("barcode_index_refresher", "stock_delta_compactor", "rollup_reconciler",
+                 "rollup_compactor", "email_outbox_worker"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
+    smtp_connection.close()
+
+
+@app.on_event("shutdown")
+def shutdown_db_pool():
+    shutdown_db_executor()
+    close_pool()
+
+
 @app.get("/")
 async def root():
     return {"message": "ERP Sistema API", "version": "1.0.0", "docs": "/docs"}
@@ -56,6 +246,25 @@ async def root():
 async def health_check():
     return {"status": "OK"}
 
+
+@app.get("/health/db-pool", dependencies=[Depends(require_roles("admin"))])
+async def db_pool_stats():
+    """Estatísticas do pool de conexões (em uso, ociosas, tempo de espera)"""
+    try:
+        return {"status": "OK", "pool": get_pool().stats()}
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+
+@app.get("/internal/metrics", dependencies=[Depends(require_roles("admin"))])
+async def internal_metrics():
+    """Métricas internas: caches em memória (taxa de acerto) e pool de conexões"""
+    metrics = {"caches": all_cache_stats(), "barcode_index": products.barcode_index.stats()}
+    try:
+        metrics["db_pool"] = get_pool().stats()
+    except Exception as e:
+        metrics["db_pool"] = {"error": str(e)}
+    return metrics
+
 @app.get("/test-json-main")
 async def test_json_main():
     """Teste JSON direto no main"""
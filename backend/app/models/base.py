@@ -1,5 +1,6 @@
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, time, timezone, timedelta
+from typing import Optional, Tuple
 from sqlalchemy import Column, DateTime, String, TypeDecorator, CHAR
 from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
 from sqlalchemy.engine import Dialect
@@ -13,6 +14,20 @@ def br_now():
     return datetime.now(BR_TIMEZONE)
 
 
+def br_day_range(day: Optional[date] = None) -> Tuple[datetime, datetime]:
+    """
+    Início e fim (exclusivo) do dia no horário do Brasil (hoje por padrão),
+    com tzinfo. As colunas DateTime (sem fuso) recebem br_now() já convertido
+    para o TimeZone da sessão pelo PostgreSQL, e é nesse mesmo fuso que o
+    banco compara a coluna com um limite com fuso. Filtrar por
+    ``coluna >= início AND coluna < fim`` usa o índice da coluna, ao contrário
+    de ``date(coluna) == dia``.
+    """
+    day = day or br_now().date()
+    start = datetime.combine(day, time.min, tzinfo=BR_TIMEZONE)
+    return start, start + timedelta(days=1)
+
+
 class GUID(TypeDecorator):
     """Platform-independent GUID type.
     
@@ -8,4 +8,5 @@ class APIResponse(BaseModel):
     """Resposta padrão da API"""
     success: bool
     message: Optional[str] = None
-    data: Optional[Any] = None
\ No newline at end of file
+    data: Optional[Any] = None
+    next_cursor: Optional[str] = None  # Cursor da próxima página (listagens paginadas)
\ No newline at end of file
@@ -97,6 +97,7 @@ async def get_accounts_payable(
     category: Optional[str] = Query(None),
     limit: int = Query(100, le=500),
     offset: int = Query(0, ge=0),
+    after: Optional[str] = Query(None, description="Cursor da próxima página (next_cursor); substitui offset"),
     current_user: dict = Depends(get_current_user)
 ):
     """Buscar contas a pagar"""
@@ -105,7 +106,8 @@ async def get_accounts_payable(
         
         filters = {
             'limit': limit,
-            'offset': offset
+            'offset': offset,
+            'after': after
         }
         
         if supplier_id:
@@ -123,6 +125,8 @@ async def get_accounts_payable(
         
         return await service.get_accounts_payable(filters)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -225,158 +229,74 @@ async def get_payment_schedule(
 @router.get("/reports/cash-flow", response_model=APIResponse)
 async def get_cash_flow_projection(
     months_ahead: int = Query(3, ge=1, le=12),
+    detail_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Mês (AAAA-MM) com as parcelas detalhadas"),
     current_user: dict = Depends(get_current_user)
 ):
     """Projeção de fluxo de caixa baseado nas contas a pagar"""
     try:
-        from datetime import datetime, timedelta
         from calendar import monthrange
         
         service = AccountsPayableService()
         
-        # Calcular período
+        # Do dia de hoje ao último dia do último mês projetado
         today = date.today()
-        end_date = today.replace(day=1)
-        
-        # Adicionar meses
-        for _ in range(months_ahead):
-            if end_date.month == 12:
-                end_date = end_date.replace(year=end_date.year + 1, month=1)
-            else:
-                end_date = end_date.replace(month=end_date.month + 1)
+        last_month = today.month - 1 + months_ahead - 1
+        end_year, end_month = today.year + last_month // 12, last_month % 12 + 1
+        end_date = date(end_year, end_month, monthrange(end_year, end_month)[1])
         
-        # Último dia do último mês
-        last_day = monthrange(end_date.year, end_date.month)[1]
-        end_date = end_date.replace(day=last_day)
-        
-        # Buscar cronograma
-        schedule_response = await service.get_payment_schedule({
-            'date_from': today,
-            'date_to': end_date,
-            'limit': 1000
-        })
+        detail = None
+        if detail_month:
+            detail = date.fromisoformat(f"{detail_month}-01")
         
-        if schedule_response.success:
-            schedule = schedule_response.data['schedule']
-            
-            # Agrupar por mês
-            monthly_flow = {}
-            current_month = today.replace(day=1)
-            
-            for _ in range(months_ahead):
-                month_key = current_month.strftime('%Y-%m')
-                monthly_flow[month_key] = {
-                    'month': current_month.strftime('%B %Y'),
-                    'total_due': 0,
-                    'overdue_count': 0,
-                    'installments': []
-                }
-                
-                # Próximo mês
-                if current_month.month == 12:
-                    current_month = current_month.replace(year=current_month.year + 1, month=1)
-                else:
-                    current_month = current_month.replace(month=current_month.month + 1)
-            
-            # Agrupar parcelas por mês
-            for installment in schedule:
-                due_date = datetime.fromisoformat(installment['due_date']).date()
-                month_key = due_date.strftime('%Y-%m')
-                
-                if month_key in monthly_flow:
-                    monthly_flow[month_key]['total_due'] += installment['balance']
-                    if installment['urgency'] == 'overdue':
-                        monthly_flow[month_key]['overdue_count'] += 1
-                    monthly_flow[month_key]['installments'].append(installment)
-            
-            return APIResponse(
-                success=True,
-                data={
-                    'period': {
-                        'from': today.isoformat(),
-                        'to': end_date.isoformat(),
-                        'months': months_ahead
-                    },
-                    'monthly_flow': list(monthly_flow.values()),
-                    'total_projection': sum(month['total_due'] for month in monthly_flow.values())
-                },
-                message=f"Projeção de fluxo de caixa para {months_ahead} meses"
-            )
-        
-        return schedule_response
+        return await service.get_cash_flow_projection(today, end_date, detail)
         
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Mês inválido")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/reports/by-supplier", response_model=APIResponse)
 async def get_accounts_by_supplier(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    after: Optional[str] = Query(None, description="Cursor da próxima página (next_cursor); substitui offset"),
     current_user: dict = Depends(get_current_user)
 ):
     """Relatório de contas agrupadas por fornecedor"""
     try:
         service = AccountsPayableService()
         
-        # Buscar todas as contas em aberto
-        accounts_response = await service.get_accounts_payable({
-            'status': 'em_aberto',
-            'limit': 1000
+        return await service.get_accounts_by_supplier({
+            'limit': limit,
+            'offset': offset,
+            'after': after
         })
         
-        if accounts_response.success:
-            accounts = accounts_response.data
-            
-            # Agrupar por fornecedor
-            suppliers_summary = {}
-            
-            for account in accounts:
-                supplier_name = account['supplier']['name']
-                
-                if supplier_name not in suppliers_summary:
-                    suppliers_summary[supplier_name] = {
-                        'supplier_name': supplier_name,
-                        'supplier_document': account['supplier']['document'],
-                        'accounts_count': 0,
-                        'total_balance': 0,
-                        'overdue_balance': 0,
-                        'oldest_due_date': None,
-                        'accounts': []
-                    }
-                
-                supplier = suppliers_summary[supplier_name]
-                supplier['accounts_count'] += 1
-                supplier['total_balance'] += account['values']['balance']
-                
-                if account['is_overdue']:
-                    supplier['overdue_balance'] += account['values']['balance']
-                
-                # Data de vencimento mais antiga
-                due_date = account['dates']['due_date']
-                if not supplier['oldest_due_date'] or due_date < supplier['oldest_due_date']:
-                    supplier['oldest_due_date'] = due_date
-                
-                supplier['accounts'].append(account)
-            
-            # Ordenar por maior saldo devedor
-            suppliers_list = sorted(
-                suppliers_summary.values(),
-                key=lambda x: x['total_balance'],
-                reverse=True
-            )
-            
-            return APIResponse(
-                success=True,
-                data={
-                    'suppliers_count': len(suppliers_list),
-                    'total_accounts': len(accounts),
-                    'total_balance': sum(s['total_balance'] for s in suppliers_list),
-                    'total_overdue': sum(s['overdue_balance'] for s in suppliers_list),
-                    'by_supplier': suppliers_list
-                },
-                message="Relatório por fornecedor"
-            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/reports/by-supplier/{supplier_id}/accounts", response_model=APIResponse)
+async def get_supplier_open_accounts(
+    supplier_id: UUID,
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[str] = Query(None, description="Cursor da próxima página (next_cursor)"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Contas em aberto de um fornecedor (detalhe do relatório por fornecedor)"""
+    try:
+        service = AccountsPayableService()
         
-        return accounts_response
+        return await service.get_accounts_payable({
+            'supplier_id': str(supplier_id),
+            'status': 'em_aberto',
+            'limit': limit,
+            'after': after
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -388,58 +308,7 @@ async def get_dashboard_summary(
     try:
         service = AccountsPayableService()
         
-        # Buscar dados básicos
-        all_accounts = await service.get_accounts_payable({'limit': 1000})
-        overdue_accounts = await service.get_overdue_accounts({'limit': 1000})
-        
-        # Cronograma dos próximos 30 dias
-        today = date.today()
-        schedule_30_days = await service.get_payment_schedule({
-            'date_from': today,
-            'date_to': today + timedelta(days=30),
-            'limit': 1000
-        })
-        
-        summary_data = {
-            'total_accounts': 0,
-            'total_balance': 0,
-            'overdue_accounts': 0,
-            'overdue_balance': 0,
-            'due_this_month': 0,
-            'due_this_month_balance': 0,
-            'due_next_30_days': 0,
-            'due_next_30_days_balance': 0
-        }
-        
-        if all_accounts.success:
-            accounts = all_accounts.data
-            summary_data['total_accounts'] = len(accounts)
-            summary_data['total_balance'] = sum(acc['values']['balance'] for acc in accounts)
-        
-        if overdue_accounts.success:
-            overdue = overdue_accounts.data
-            summary_data['overdue_accounts'] = len(overdue)
-            summary_data['overdue_balance'] = sum(acc['values']['balance'] for acc in overdue)
-        
-        if schedule_30_days.success:
-            schedule = schedule_30_days.data['schedule']
-            summary_data['due_next_30_days'] = len(schedule)
-            summary_data['due_next_30_days_balance'] = sum(inst['balance'] for inst in schedule)
-            
-            # Filtrar apenas deste mês
-            this_month = today.strftime('%Y-%m')
-            this_month_installments = [
-                inst for inst in schedule 
-                if inst['due_date'].startswith(this_month)
-            ]
-            summary_data['due_this_month'] = len(this_month_installments)
-            summary_data['due_this_month_balance'] = sum(inst['balance'] for inst in this_month_installments)
-        
-        return APIResponse(
-            success=True,
-            data=summary_data,
-            message="Dashboard das contas a pagar"
-        )
+        return await service.get_dashboard_summary()
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
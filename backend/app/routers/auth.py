@@ -1,9 +1,10 @@
 import uuid
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.core.security import verify_password, get_password_hash, create_access_token, create_refresh_token, decode_token, get_current_user
+from app.core.security import verify_password, get_password_hash, create_access_token, create_refresh_token, decode_token, get_current_user, optional_security, invalidate_cached_user
 from app.models.user import User
 from app.models.password_reset_token import PasswordResetToken
 from app.schemas.auth import LoginRequest, LoginResponse, RefreshTokenRequest, RefreshTokenResponse, ForgotPasswordRequest, ResetPasswordRequest, MessageResponse
@@ -150,6 +151,13 @@ def reset_password(reset_data: ResetPasswordRequest, db: Session = Depends(get_d
 
 
 @router.post("/logout", response_model=MessageResponse)
-def logout():
-    # No JWT stateless, logout é handled no frontend
+def logout(credentials: HTTPAuthorizationCredentials = Depends(optional_security)):
+    # No JWT stateless, logout é handled no frontend; aqui só limpamos o cache do usuário
+    if credentials:
+        try:
+            user_id = decode_token(credentials.credentials).get("sub")
+            if user_id:
+                invalidate_cached_user(user_id)
+        except HTTPException:
+            pass
     return MessageResponse(message="Logout realizado com sucesso")
\ No newline at end of file
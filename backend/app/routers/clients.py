@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func, or_
 from typing import Optional
 from app.core.database import get_db
@@ -24,7 +24,11 @@ def get_clients(
     db: Session = Depends(get_db)
 ):
     """Lista clientes com paginação e busca"""
-    query = db.query(Client)
+    # Telefones e endereços em uma consulta por tabela filha para a página toda
+    query = db.query(Client).options(
+        selectinload(Client.phones),
+        selectinload(Client.addresses)
+    )
     
     # Filtro de status - Lógica simples
     if status == "active":
@@ -73,9 +77,8 @@ def get_clients(
     # Converter para formato JSON serializable
     result = []
     for client in clients:
-        # Buscar telefones e endereços do cliente
-        phones = db.query(Phone).filter(Phone.client_id == client.id).all()
-        addresses = db.query(Address).filter(Address.client_id == client.id).all()
+        phones = client.phones
+        addresses = client.addresses
         
         result.append({
             "id": str(client.id),
@@ -282,8 +285,8 @@ async def create_client(
         db.refresh(client)
         
         # Buscar telefones e endereços criados
-        phones = db.query(Phone).filter(Phone.client_id == client.id).all()
-        addresses = db.query(Address).filter(Address.client_id == client.id).all()
+        phones = client.phones
+        addresses = client.addresses
         
         return {
             "id": str(client.id),
@@ -348,8 +351,8 @@ def get_client(
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     
     # Buscar telefones e endereços do cliente
-    phones = db.query(Phone).filter(Phone.client_id == client.id).all()
-    addresses = db.query(Address).filter(Address.client_id == client.id).all()
+    phones = client.phones
+    addresses = client.addresses
     
     return {
         "id": str(client.id),
@@ -541,8 +544,8 @@ async def update_client(
         db.refresh(client)
         
         # Buscar telefones e endereços atualizados
-        phones = db.query(Phone).filter(Phone.client_id == client.id).all()
-        addresses = db.query(Address).filter(Address.client_id == client.id).all()
+        phones = client.phones
+        addresses = client.addresses
         
         return {
             "id": str(client.id),
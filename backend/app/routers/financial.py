@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.security import get_current_user, require_roles
 from app.models.user import User
+from app.services.dashboard_service import DashboardService
 
 router = APIRouter()
 
@@ -23,12 +24,9 @@ def process_payment(db: Session = Depends(get_db), current_user: User = Depends(
 
 
 @router.get("/dashboard")
-def financial_dashboard(db: Session = Depends(get_db), current_user: User = Depends(require_roles("admin", "financeiro"))):
-    return {
-        "message": "Dashboard financeiro - implementar",
-        "kpis": {
-            "total_receivable": 150000.00,
-            "total_payable": 80000.00,
-            "cash_flow": 70000.00
-        }
-    }
\ No newline at end of file
+async def financial_dashboard(current_user: User = Depends(require_roles("admin", "financeiro"))):
+    """KPIs financeiros: contas a receber, contas a pagar e receita do mês"""
+    result = await DashboardService().get_financial_dashboard()
+    if not result.success:
+        raise HTTPException(status_code=500, detail=result.message)
+    return result.data
\ No newline at end of file
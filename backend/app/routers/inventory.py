@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.security import get_current_user, require_roles
 from app.models.user import User
+from app.services.dashboard_service import DashboardService
 
 router = APIRouter()
 
@@ -28,12 +29,9 @@ def create_inventory(db: Session = Depends(get_db), current_user: User = Depends
 
 
 @router.get("/dashboard")
-def inventory_dashboard(db: Session = Depends(get_db), current_user: User = Depends(require_roles("admin", "estoque"))):
-    return {
-        "message": "Dashboard de estoque - implementar",
-        "kpis": {
-            "total_products": 1250,
-            "low_stock_alerts": 15,
-            "stock_value": 85000.00
-        }
-    }
\ No newline at end of file
+async def inventory_dashboard(current_user: User = Depends(require_roles("admin", "estoque"))):
+    """KPIs de estoque e valor do estoque por dia"""
+    result = await DashboardService().get_inventory_dashboard()
+    if not result.success:
+        raise HTTPException(status_code=500, detail=result.message)
+    return result.data
\ No newline at end of file
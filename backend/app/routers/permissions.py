@@ -7,7 +7,7 @@ from app.core.database import get_db
 from app.models.permission import Permission
 from app.models.user import User
 from app.schemas.role import Permission as PermissionSchema, PermissionCreate, PermissionUpdate
-from app.core.permissions import PermissionChecker
+from app.core.permissions import PermissionChecker, invalidate_role_permissions
 
 router = APIRouter(prefix="/permissions", tags=["permissions"])
 
@@ -174,6 +174,8 @@ async def update_permission(
             setattr(permission, field, value)
     
     db.commit()
+    # resource/action/is_active valem para todos os roles que concedem a permissão
+    invalidate_role_permissions()
     db.refresh(permission)
     
     return PermissionSchema.model_validate(permission)
@@ -192,5 +194,6 @@ async def delete_permission(
     
     permission.is_active = False
     db.commit()
+    invalidate_role_permissions()
     
     return {"message": "Permissão inativada com sucesso"}
\ No newline at end of file
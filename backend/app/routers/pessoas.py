@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func, or_, text
 from typing import Optional, List
 from app.core.database import get_db
+from app.core.pagination import COUNT_MODES, count_rows, keyset_page
+from app.database.streaming import stream_query
 from app.models.pessoa import Pessoa, PessoaPapel, PapelPessoa, ClienteDados, FuncionarioDados, FornecedorDados
 from app.models.contact import Phone, Address
 from app.models.client import PersonType
@@ -20,31 +22,13 @@ async def listar_pessoas(
     papel: Optional[str] = Query(None, description="CLIENTE, FUNCIONARIO, FORNECEDOR"),
     pessoa_tipo: Optional[str] = Query(None, description="PF, PJ"),
     status: Optional[str] = Query("ativos", description="ativos, inativos, todos"),
+    after: Optional[str] = Query(None, description="Cursor da próxima página (next_cursor); substitui skip"),
+    count: str = Query("estimated", description="exact, estimated (planner), none"),
     db: Session = Depends(get_db)
 ):
     """Lista pessoas com filtros opcionais"""
     
     try:
-        # Debug: verificar se tabela existe
-        try:
-            table_check = db.execute(text("SELECT COUNT(*) FROM pessoas")).fetchone()
-            total_registros = table_check[0] if table_check else 0
-        except Exception as table_error:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Erro ao acessar tabela pessoas: {str(table_error)}"
-            )
-        
-        # Se não há registros, retornar vazio
-        if total_registros == 0:
-            return {
-                "pessoas": [],
-                "total": 0,
-                "page": 0,
-                "per_page": limit,
-                "debug_info": "Tabela pessoas está vazia"
-            }
-        
         # Query base para listagem com filtro de status
         base_query = db.query(Pessoa)
         
@@ -85,18 +69,25 @@ async def listar_pessoas(
                 Pessoa.id.in_(db.query(pessoas_com_papel.c.pessoa_id))
             )
         
-        # Contagem total
-        total = filtered_query.count()
-        
-        # Ordenação e paginação com eager loading
-        pessoas = filtered_query.options(
-            joinedload(Pessoa.papeis),
-            joinedload(Pessoa.telefones),
-            joinedload(Pessoa.enderecos),
-            joinedload(Pessoa.dados_cliente),
-            joinedload(Pessoa.dados_funcionario),
-            joinedload(Pessoa.dados_fornecedor)
-        ).order_by(Pessoa.nome).offset(skip).limit(limit).all()
+        if count not in COUNT_MODES:
+            raise HTTPException(status_code=400, detail=f"count deve ser um de: {', '.join(COUNT_MODES)}")
+        
+        # Contagem total conforme o modo pedido
+        total = count_rows(db, filtered_query, count)
+        
+        # Ordenação (nome, id) e paginação por cursor; filhos carregados com
+        # uma consulta IN por relacionamento (sem multiplicar linhas no JOIN)
+        pessoas, next_cursor = keyset_page(
+            filtered_query.options(
+                selectinload(Pessoa.papeis),
+                selectinload(Pessoa.telefones),
+                selectinload(Pessoa.enderecos),
+                selectinload(Pessoa.dados_cliente),
+                selectinload(Pessoa.dados_funcionario),
+                selectinload(Pessoa.dados_fornecedor)
+            ),
+            Pessoa.nome, Pessoa.id, False, after, limit, skip
+        )
         
         # Serializar resultado
         resultado = []
@@ -161,7 +152,8 @@ async def listar_pessoas(
             "total": total,
             "page": skip // limit,
             "per_page": limit,
-            "debug_info": f"Total na tabela: {total_registros}, Filtrados: {total}"
+            "next_cursor": next_cursor,
+            "count_mode": count
         }
         
     except HTTPException:
@@ -515,11 +507,36 @@ async def debug_pessoas(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Uma linha por pessoa com os papéis ativos agregados, para streaming
+PESSOAS_STREAM_SQL = """
+    SELECT
+        p.id, p.nome, p.pessoa_tipo, p.documento, p.is_active,
+        COALESCE(
+            (SELECT array_agg(pp.papel::text ORDER BY pp.papel::text)
+             FROM pessoa_papeis pp
+             WHERE pp.pessoa_id = p.id AND pp.is_active = true),
+            ARRAY[]::text[]
+        ) AS papeis
+    FROM pessoas p
+    WHERE p.is_active = true
+    ORDER BY p.nome, p.id
+"""
+
+
 @router.get("/all")
-async def listar_todas_pessoas(db: Session = Depends(get_db)):
+async def listar_todas_pessoas(
+    formato: str = Query("json", description="json, ndjson (streaming), csv (streaming)"),
+    db: Session = Depends(get_db)
+):
     """Lista TODAS as pessoas ativas sem paginação para debug"""
+    if formato in ("ndjson", "csv"):
+        # Streaming com memória constante, lido em blocos de um cursor nomeado
+        return stream_query(PESSOAS_STREAM_SQL, fmt=formato, filename="pessoas")
+    
     try:
-        pessoas = db.query(Pessoa).filter(Pessoa.is_active == True).order_by(Pessoa.nome).all()
+        pessoas = db.query(Pessoa).options(selectinload(Pessoa.papeis)).filter(
+            Pessoa.is_active == True
+        ).order_by(Pessoa.nome).all()
         
         resultado = []
         for pessoa in pessoas:
@@ -1,17 +1,21 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
+from sqlalchemy import func
 from decimal import Decimal
 import json
 
 from app.core.database import get_db
+from app.config import settings
 from app.models.product import Product
 from app.models.category import Category
 from app.models.user import User
 from app.schemas.product import Product as ProductSchema, ProductCreate, ProductUpdate
 from app.core.auth import get_current_user
 from app.core.permissions import PermissionChecker
+from app.core.pagination import NEXT_CURSOR_HEADER, keyset_page
+from app.services.product_search_service import ProductSearchService, product_text_filter
+from app.services.product_lookup_service import ProductLookupIndex
 
 router = APIRouter(prefix="/products", tags=["products"])
 
@@ -22,6 +26,15 @@ require_products_edit = PermissionChecker("products", "edit")
 require_products_delete = PermissionChecker("products", "delete")
 
 
+def get_stock_status(stock_quantity, min_stock) -> str:
+    """Status do estoque exibido nas listagens e no caixa"""
+    if stock_quantity == 0:
+        return "zerado"
+    if stock_quantity <= min_stock:
+        return "baixo"
+    return "normal"
+
+
 def calculate_product_fields(product: Product) -> dict:
     """Calcula campos derivados do produto"""
     fields = {}
@@ -37,12 +50,7 @@ def calculate_product_fields(product: Product) -> dict:
         fields["margin_percentage"] = None
     
     # Status do estoque
-    if product.stock_quantity == 0:
-        fields["stock_status"] = "zerado"
-    elif product.stock_quantity <= product.min_stock:
-        fields["stock_status"] = "baixo"
-    else:
-        fields["stock_status"] = "normal"
+    fields["stock_status"] = get_stock_status(product.stock_quantity, product.min_stock)
     
     # Nome da categoria
     if hasattr(product, 'category') and product.category:
@@ -82,49 +90,67 @@ def get_effective_margin_for_product(product: Product, db: Session) -> Decimal:
     return Decimal(0)
 
 
+def build_sale_payload(product: Product) -> dict:
+    """Monta o payload de venda usado na leitura de código de barras"""
+    derived_fields = calculate_product_fields(product)
+    
+    return {
+        "id": str(product.id),
+        "name": product.name,
+        "sku": product.sku,
+        "barcode": product.ean_gtin,
+        "description": product.description,
+        "sale_price": float(product.sale_price) if product.sale_price else 0,
+        "cost_price": float(product.cost_price) if product.cost_price else 0,
+        "stock_quantity": float(product.stock_quantity) if product.stock_quantity else 0,
+        "min_stock": float(product.min_stock) if product.min_stock else 0,
+        "unit": product.unit,
+        "category_name": derived_fields.get("category_name"),
+        "stock_status": derived_fields.get("stock_status"),
+        "margin_percentage": derived_fields.get("margin_percentage"),
+        "is_active": product.is_active,
+    }
+
+
+# Índice em memória EAN/GTIN e SKU -> payload de venda (carregado no startup)
+barcode_index = ProductLookupIndex(build_sale_payload, settings.barcode_index_max_age_seconds)
+
+
 @router.get("/search")
-async def search_product_by_barcode(
+def search_product_by_barcode(
     barcode: str = Query(..., description="Código de barras do produto"),
     db: Session = Depends(get_db)
 ):
-    """Busca produto por código de barras para sistema de vendas rápidas"""
+    """Busca produto por código de barras (EAN/GTIN ou SKU) para sistema de vendas rápidas"""
+    # Rota síncrona: roda no threadpool do FastAPI, então a carga inicial do
+    # índice e a leitura do estoque não bloqueiam o event loop
     
     if not barcode.strip():
         raise HTTPException(status_code=400, detail="Código de barras é obrigatório")
     
-    # Busca produto pelo código de barras
-    product = db.query(Product).filter(
-        Product.barcode == barcode.strip(),
-        Product.is_active == True
-    ).first()
+    barcode_index.ensure_loaded(db)
+    product_data = barcode_index.lookup(barcode)
     
-    if not product:
+    # Estoque muda a cada venda (em qualquer worker): lido na hora pela chave primária
+    stock = None
+    if product_data:
+        stock = db.query(Product.stock_quantity, Product.min_stock).filter(
+            Product.id == product_data["id"],
+            Product.is_active == True
+        ).first()
+    
+    if not stock:
         return {
             "success": False,
             "message": "Produto não encontrado",
             "data": None
         }
     
-    # Calcula campos derivados
-    derived_fields = calculate_product_fields(product)
-    
-    # Monta resposta com dados necessários para venda
     product_data = {
-        "id": str(product.id),
-        "name": product.name,
-        "barcode": product.barcode,
-        "description": product.description,
-        "sale_price": float(product.sale_price) if product.sale_price else 0,
-        "cost_price": float(product.cost_price) if product.cost_price else 0,
-        "stock_quantity": float(product.stock_quantity) if product.stock_quantity else 0,
-        "min_stock": float(product.min_stock) if product.min_stock else 0,
-        "unit": product.unit,
-        "category_name": derived_fields.get("category_name"),
-        "stock_status": derived_fields.get("stock_status"),
-        "margin_percentage": derived_fields.get("margin_percentage"),
-        "is_active": product.is_active,
-        "weight": float(product.weight) if product.weight else None,
-        "brand": product.brand,
+        **product_data,
+        "stock_quantity": float(stock.stock_quantity) if stock.stock_quantity else 0,
+        "min_stock": float(stock.min_stock) if stock.min_stock else 0,
+        "stock_status": get_stock_status(stock.stock_quantity, stock.min_stock),
     }
     
     return {
@@ -134,11 +160,31 @@ async def search_product_by_barcode(
     }
 
 
+@router.get("/quick-search")
+def quick_search_products(
+    q: str = Query(..., min_length=1, description="Nome, SKU ou EAN do produto"),
+    limit: int = Query(20, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """
+    Busca rápida para o modal F2: SKU/EAN exatos primeiro, depois por similaridade.
+    Rota síncrona: a consulta roda no threadpool, fora do event loop (uma chamada por tecla).
+    """
+    results = ProductSearchService(db).search(q, limit)
+    return {
+        "success": True,
+        "data": results,
+        "total": len(results)
+    }
+
+
 @router.get("/", response_model=List[ProductSchema])
 async def get_products(
     request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor); substitui skip"),
     search: Optional[str] = Query(None),
     status: Optional[str] = Query("active"),
     stock_status: Optional[str] = Query(None),
@@ -157,12 +203,7 @@ async def get_products(
     
     # Aplicar filtro de busca
     if search:
-        search_filter = or_(
-            Product.name.ilike(f"%{search}%"),
-            Product.sku.ilike(f"%{search}%"),
-            Product.description.ilike(f"%{search}%")
-        )
-        query = query.filter(search_filter)
+        query = query.filter(product_text_filter(search))
     
     # Aplicar filtro de status do estoque
     if stock_status == "zerado":
@@ -172,16 +213,16 @@ async def get_products(
     elif stock_status == "normal":
         query = query.filter(Product.stock_quantity > Product.min_stock)
     
-    # Aplicar ordenação
-    if hasattr(Product, sortBy):
-        order_column = getattr(Product, sortBy)
-        if sortOrder == "desc":
-            query = query.order_by(order_column.desc())
-        else:
-            query = query.order_by(order_column.asc())
+    # Aplicar ordenação (coluna + id, para paginação por cursor estável)
+    order_column = Product.__table__.columns.get(sortBy)
+    order_column = getattr(Product, sortBy) if order_column is not None else Product.created_at
     
     # Aplicar paginação
-    products = query.offset(skip).limit(limit).all()
+    products, next_cursor = keyset_page(
+        query, order_column, Product.id, sortOrder == "desc", after, limit, skip
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     # Adicionar campos calculados
     products_with_fields = []
@@ -254,6 +295,7 @@ async def create_product(
         db.add(product)
         db.commit()
         db.refresh(product)
+        barcode_index.refresh_product(product)
         
         # Retornar com campos calculados
         product_dict = ProductSchema.model_validate(product).model_dump()
@@ -322,6 +364,7 @@ async def update_product(
         
         db.commit()
         db.refresh(product)
+        barcode_index.refresh_product(product)
         
         # Retornar com campos calculados
         product_dict = ProductSchema.model_validate(product).model_dump()
@@ -351,6 +394,7 @@ async def delete_product(
     
     product.is_active = False
     db.commit()
+    barcode_index.remove_product(product.id)
     
     return {"message": "Produto inativado com sucesso"}
 
@@ -368,6 +412,7 @@ async def toggle_product_status(
     
     product.is_active = not product.is_active
     db.commit()
+    barcode_index.refresh_product(product)
     
     status = "ativado" if product.is_active else "inativado"
     return {"message": f"Produto {status} com sucesso"}
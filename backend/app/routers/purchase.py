@@ -9,6 +9,8 @@ from datetime import date
 from pydantic import BaseModel, Field
 
 from app.core.auth import get_current_user
+from app.database.connection import get_db_connection
+from app.database.executor import run_blocking
 from app.services.purchase_service import PurchaseService
 from app.schemas.response import APIResponse
 
@@ -108,11 +110,25 @@ async def get_products_for_purchase(
 ):
     """Buscar lista de produtos ativos para pedidos de compra"""
     try:
-        from app.database.connection import get_db_connection
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        from app.models.response import APIResponse
+        result = await run_blocking(_load_products_for_purchase, limit, offset, search, active_only)
+        return APIResponse(
+            success=True,
+            data=result,
+            message=f"{len(result)} produtos encontrados"
+        )
         
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _load_products_for_purchase(limit: int, offset: int, search: Optional[str], active_only: bool) -> List[Dict[str, Any]]:
+    """Consulta bloqueante (psycopg2) da listagem de produtos; roda no executor do banco"""
+    from app.services.product_search_service import escape_like
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
         # Construir query base
         where_conditions = []
         params = []
@@ -121,8 +137,12 @@ async def get_products_for_purchase(
             where_conditions.append("is_active = true")
         
         if search:
-            where_conditions.append("(name ILIKE %s OR sku ILIKE %s)")
-            search_param = f"%{search}%"
+            # Mesmas expressões dos índices trigram (migration 010_add_product_search_indexes)
+            where_conditions.append(
+                "(f_unaccent(lower(name)) LIKE f_unaccent(lower(%s)) ESCAPE '\\' "
+                "OR lower(sku) LIKE lower(%s) ESCAPE '\\')"
+            )
+            search_param = f"%{escape_like(search.strip())}%"
             params.extend([search_param, search_param])
         
         where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
@@ -153,19 +173,12 @@ async def get_products_for_purchase(
                 'unit': product[6] or 'UN',
                 'description': product[7]
             })
-        
+        return result
+    finally:
+        # Somente leitura: encerra a transação antes de devolver a conexão ao pool
+        conn.rollback()
         cursor.close()
         conn.close()
-        
-        from app.models.response import APIResponse
-        return APIResponse(
-            success=True,
-            data=result,
-            message=f"{len(result)} produtos encontrados"
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
 # ===== PEDIDOS DE COMPRA =====
 
@@ -221,6 +234,7 @@ async def get_purchase_orders(
     date_to: Optional[date] = Query(None),
     limit: int = Query(50, le=200),
     offset: int = Query(0, ge=0),
+    after: Optional[str] = Query(None, description="Cursor da próxima página (next_cursor); substitui offset"),
     current_user: dict = Depends(get_current_user)
 ):
     """Buscar pedidos de compra"""
@@ -229,7 +243,8 @@ async def get_purchase_orders(
         
         filters = {
             'limit': limit,
-            'offset': offset
+            'offset': offset,
+            'after': after
         }
         
         if supplier_id:
@@ -243,6 +258,8 @@ async def get_purchase_orders(
         
         return await service.get_purchase_orders(filters)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -266,18 +283,34 @@ async def update_purchase_order(
     current_user: dict = Depends(get_current_user)
 ):
     """Atualizar pedido de compra - VERSÃO SIMPLIFICADA"""
+    import logging
+    logger = logging.getLogger(__name__)
     try:
-        from app.database.connection import get_db_connection
-        import logging
-        logger = logging.getLogger(__name__)
-        
         logger.error(f"🔥 ATUALIZANDO PEDIDO {order_id} DIRETAMENTE!")
         logger.error(f"Dados: {order_data}")
         logger.error(f"📊 STATUS recebido: {order_data.get('status', 'NÃO INFORMADO')}")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        items_count = await run_blocking(_update_purchase_order_simple, order_id, order_data)
         
+        return {
+            "success": True,
+            "message": "Pedido atualizado com sucesso!",
+            "data": {
+                "id": str(order_id),
+                "items_count": items_count
+            }
+        }
+        
+    except Exception as e:
+        logger.error(f"💥 ERRO: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _update_purchase_order_simple(order_id: UUID, order_data: dict) -> int:
+    """Grava pedido e itens em uma transação (psycopg2, roda no executor do banco)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
         # 1. Atualizar dados básicos do pedido
         cursor.execute("""
             UPDATE pedidos_compra 
@@ -297,14 +330,11 @@ async def update_purchase_order(
             order_data.get('notes', ''),
             order_data.get('urgency', 'normal'),
             order_data.get('status', 'rascunho'),
-            order_id
+            str(order_id)
         ))
         
-        logger.error(f"✅ Dados básicos atualizados!")
-        
         # 2. Limpar itens existentes
-        cursor.execute("DELETE FROM pedidos_compra_itens WHERE pedido_id = %s", (order_id,))
-        logger.error(f"🗑️ Itens antigos removidos!")
+        cursor.execute("DELETE FROM pedidos_compra_itens WHERE pedido_id = %s", (str(order_id),))
         
         # 3. Inserir novos itens
         items = order_data.get('items', [])
@@ -320,38 +350,22 @@ async def update_purchase_order(
                     observacoes_item
                 ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (
-                order_id, item.get('product_id'), quantidade, quantidade,
+                str(order_id), item.get('product_id'), quantidade, quantidade,
                 0.0, 0.0, 0.0, 0.0, 0.0, i,
                 item.get('notes', '')
             ))
         
-        logger.error(f"📦 {len(items)} itens inseridos!")
-        
         # 4. Remove update of totals since we no longer track prices
         
         # 5. COMMIT!
         conn.commit()
-        logger.error(f"💾 COMMIT REALIZADO! Items: {len(items)}")
-        
+        return len(items)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         cursor.close()
         conn.close()
-        
-        return {
-            "success": True,
-            "message": "Pedido atualizado com sucesso!",
-            "data": {
-                "id": str(order_id),
-                "items_count": len(items)
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"💥 ERRO: {str(e)}", exc_info=True)
-        if 'conn' in locals():
-            conn.rollback()
-            cursor.close()
-            conn.close()
-        raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/orders/{order_id}/status", response_model=APIResponse)
 async def update_purchase_order_status(
@@ -768,13 +782,13 @@ async def delete_purchase_order(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/orders/{order_id}/send-email")
+@router.post("/orders/{order_id}/send-email", status_code=202)
 async def send_order_by_email(
     order_id: UUID,
     email_data: dict,
     current_user: dict = Depends(get_current_user)
 ):
-    """Enviar pedido por email"""
+    """Enfileirar o pedido para envio por email; retorna o job_id para consultar o status"""
     try:
         import logging
         logger = logging.getLogger(__name__)
@@ -807,6 +821,21 @@ async def send_order_by_email(
         logger.error(f"💥 ERRO GERAL EMAIL: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/emails/{job_id}")
+async def get_email_status(
+    job_id: UUID,
+    current_user: dict = Depends(get_current_user)
+):
+    """Status de um email da fila (pendente, enviando, enviado ou falhou)"""
+    from app.services.email_outbox_service import EmailOutboxService
+
+    result = await EmailOutboxService().get_job(job_id)
+    if not result.success:
+        raise HTTPException(status_code=500, detail=result.message)
+    if result.data is None:
+        raise HTTPException(status_code=404, detail=result.message)
+    return {"success": True, "message": result.message, "data": result.data}
+
 
 # ===== RELATÓRIOS =====
 
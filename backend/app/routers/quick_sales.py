@@ -9,6 +9,7 @@ from pydantic import BaseModel
 from app.core.database import get_db
 from app.models.sale_order import SaleOrder, SaleOrderItem, SaleOrderStatus, PaymentMethod
 from app.models.product import Product
+from app.models.base import br_day_range
 from app.models.client import Client
 from app.services.tax_calculator import TaxCalculatorService
 
@@ -298,19 +299,22 @@ async def get_daily_sales_stats(
     """Estatísticas de vendas do dia atual"""
     
     from sqlalchemy import func, and_
-    today = datetime.now().date()
+    # created_at vem do now() do banco: limites do dia no horário do Brasil com fuso,
+    # comparados por intervalo (índice ix_sale_orders_created_at_id)
+    start, end = br_day_range()
+    today = start.date()
+    today_filter = and_(
+        SaleOrder.created_at >= start,
+        SaleOrder.created_at < end,
+        SaleOrder.is_active == True,
+        SaleOrder.status != SaleOrderStatus.CANCELLED
+    )
     
     # Query para vendas do dia
     daily_sales = db.query(
         func.count(SaleOrder.id).label('count'),
         func.sum(SaleOrder.total_amount).label('total')
-    ).filter(
-        and_(
-            func.date(SaleOrder.created_at) == today,
-            SaleOrder.is_active == True,
-            SaleOrder.status != SaleOrderStatus.CANCELLED
-        )
-    ).first()
+    ).filter(today_filter).first()
     
     # Query para itens mais vendidos do dia
     top_products = db.query(
@@ -320,13 +324,7 @@ async def get_daily_sales_stats(
         SaleOrderItem, Product.id == SaleOrderItem.product_id
     ).join(
         SaleOrder, SaleOrderItem.sale_order_id == SaleOrder.id
-    ).filter(
-        and_(
-            func.date(SaleOrder.created_at) == today,
-            SaleOrder.is_active == True,
-            SaleOrder.status != SaleOrderStatus.CANCELLED
-        )
-    ).group_by(Product.name)\
+    ).filter(today_filter).group_by(Product.name)\
     .order_by(func.sum(SaleOrderItem.quantity).desc())\
     .limit(5)\
     .all()
@@ -1,30 +1,23 @@
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import date, timedelta
 from app.core.database import get_db
 from app.core.security import get_current_user
 from app.models.user import User
-import csv
-import io
+from app.database.streaming import stream_query
+from app.services.dashboard_service import DashboardService
 
 router = APIRouter()
 
 
 @router.get("/dashboard")
-def get_dashboard_data(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return {
-        "message": "Dashboard principal - implementar KPIs reais",
-        "kpis": {
-            "total_sales": 250000.00,
-            "monthly_revenue": 45000.00,
-            "active_clients": 180,
-            "pending_orders": 25
-        },
-        "charts": {
-            "sales_by_month": [10000, 15000, 20000, 25000, 30000, 45000],
-            "top_products": ["Product A", "Product B", "Product C"],
-            "sales_by_client_type": {"PF": 60, "PJ": 40}
-        }
-    }
+async def get_dashboard_data(current_user: User = Depends(get_current_user)):
+    """KPIs e gráficos do dashboard principal (tabelas de rollup)"""
+    result = await DashboardService().get_main_dashboard()
+    if not result.success:
+        raise HTTPException(status_code=500, detail=result.message)
+    return result.data
 
 
 @router.get("/sales")
@@ -33,22 +26,51 @@ def get_sales_report(db: Session = Depends(get_db), current_user: User = Depends
 
 
 @router.get("/sales/export")
-def export_sales_report(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    # Mock CSV export
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Data', 'Cliente', 'Produto', 'Quantidade', 'Valor'])
-    writer.writerow(['2024-01-15', 'Cliente A', 'Produto X', '10', 'R$ 1.000,00'])
-    writer.writerow(['2024-01-16', 'Cliente B', 'Produto Y', '5', 'R$ 500,00'])
+def export_sales_report(
+    fmt: str = Query("csv", alias="format", description="csv ou ndjson"),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    status: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Exporta os itens vendidos em streaming (uma linha por item de venda)"""
+    where_conditions = []
+    params = []
     
-    content = output.getvalue()
-    output.close()
+    if date_from:
+        where_conditions.append("s.sale_date >= %s")
+        params.append(date_from)
     
-    return Response(
-        content=content,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=vendas.csv"}
-    )
+    if date_to:
+        where_conditions.append("s.sale_date < %s")
+        params.append(date_to + timedelta(days=1))
+    
+    if status:
+        where_conditions.append("s.status = %s")
+        params.append(status)
+    
+    where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+    
+    query = f"""
+        SELECT
+            s.sale_date AS data,
+            s.number AS numero,
+            COALESCE(c.name, 'Cliente Avulso') AS cliente,
+            p.sku AS sku,
+            p.name AS produto,
+            si.quantity AS quantidade,
+            si.unit_price AS valor_unitario,
+            si.subtotal AS valor,
+            s.status AS status
+        FROM sales s
+        JOIN sale_items si ON si.sale_id = s.id
+        JOIN products p ON p.id = si.product_id
+        LEFT JOIN clients c ON c.id = s.client_id
+        {where_clause}
+        ORDER BY s.sale_date, s.number, si.id
+    """
+    
+    return stream_query(query, params, fmt=fmt, filename="vendas")
 
 
 @router.get("/financial")
@@ -14,7 +14,7 @@ from app.schemas.role import (
     UserRoleInfo
 )
 from app.core.auth import get_current_user
-from app.core.permissions import PermissionChecker, get_user_permissions
+from app.core.permissions import PermissionChecker, get_user_permissions, invalidate_role_permissions
 
 router = APIRouter(prefix="/roles", tags=["roles"])
 
@@ -187,6 +187,7 @@ async def update_role(
                 db.add(role_permission)
     
     db.commit()
+    invalidate_role_permissions(role.id)
     db.refresh(role)
     
     # Retornar com permissões
@@ -222,6 +223,7 @@ async def delete_role(
     
     role.is_active = False
     db.commit()
+    invalidate_role_permissions(role.id)
     
     return {"message": "Role inativado com sucesso"}
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from app.core.database import get_db
@@ -17,45 +17,48 @@ from app.schemas.sale_order import (
     SaleOrderStats
 )
 from app.services.sale_order_service import SaleOrderService
+from app.core.pagination import NEXT_CURSOR_HEADER
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[dict])
 def get_sale_orders(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     status: Optional[SaleOrderStatus] = Query(None),
     client_id: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
+    after: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor); substitui skip"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Lista pedidos de venda com paginação e filtros"""
     
     service = SaleOrderService(db)
-    orders = service.get_orders(
+    orders, next_cursor = service.get_order_summaries(
         skip=skip,
         limit=limit,
         status=status,
         client_id=client_id,
-        search=search
+        search=search,
+        after=after
     )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
-    # Converter para formato JSON com dados do cliente e contagem de itens
+    # Cliente e contagem de itens já vêm da mesma consulta
     result = []
-    for order in orders:
-        client = db.query(Client).filter(Client.id == order.client_id).first()
-        items_count = len(order.items)
-        
+    for order, client_name, client_document, items_count in orders:
         result.append({
             "id": str(order.id),
-            "number": order.number,
+            "number": order.order_number,
             "order_date": order.order_date.isoformat(),
             "status": order.status.value,
-            "client_id": str(order.client_id),
-            "client_name": client.name if client else "Cliente não encontrado",
-            "client_document": client.document if client else "",
+            "client_id": str(order.client_id) if order.client_id else None,
+            "client_name": client_name or "Cliente não encontrado",
+            "client_document": client_document or "",
             "total_amount": float(order.total_amount),
             "items_count": items_count,
             "payment_method": order.payment_method.value,
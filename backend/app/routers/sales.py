@@ -1,21 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime
 from app.core.database import get_db
 from app.core.security import get_current_user, require_roles
 from app.models.user import User
 from app.models.sale import Sale, SaleItem, SaleStatus
+from app.models.base import br_day_range
 from app.models.payment import Payment, PaymentMethod, PaymentStatus
 from app.models.client import Client
-from app.models.product import Product
+from app.services.numbering_service import NumberingService, DocumentType
+from app.services.cart_service import CartService
+from app.core.pagination import keyset_page
 from pydantic import BaseModel
 import uuid
 
 router = APIRouter()
 
 
+def sales_listing_query(db: Session):
+    """
+    Vendas com nome do cliente, do vendedor e quantidade de itens em uma
+    única consulta (JOINs + subconsulta agregada), sem lazy-load por linha
+    """
+    items_count = db.query(
+        SaleItem.sale_id.label("sale_id"),
+        func.count(SaleItem.id).label("items_count")
+    ).group_by(SaleItem.sale_id).subquery()
+
+    return db.query(
+        Sale,
+        Client.name.label("client_name"),
+        User.name.label("seller_name"),
+        func.coalesce(items_count.c.items_count, 0).label("items_count")
+    ).outerjoin(
+        Client, Client.id == Sale.client_id
+    ).outerjoin(
+        User, User.id == Sale.user_id
+    ).outerjoin(
+        items_count, items_count.c.sale_id == Sale.id
+    )
+
+
 class SaleItemCreate(BaseModel):
     product_id: str
     quantity: int
@@ -73,27 +100,30 @@ def get_sales(
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = None,
+    after: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Sale).order_by(desc(Sale.created_at))
+    query = sales_listing_query(db)
     
     if status:
         query = query.filter(Sale.status == status)
     
-    sales = query.offset(skip).limit(limit).all()
+    # Cursor (created_at, id): páginas profundas sem OFFSET
+    rows, next_cursor = keyset_page(query, Sale.created_at, Sale.id, True, after, limit, skip)
     
     return {
         "sales": [{
             "id": str(sale.id),
             "number": sale.number,
-            "client_name": sale.client.name if sale.client else "Cliente Avulso",
+            "client_name": client_name or "Cliente Avulso",
             "sale_date": sale.sale_date.isoformat(),
             "status": sale.status,
             "total": float(sale.total),
-            "items_count": len(sale.items)
-        } for sale in sales],
-        "total": db.query(Sale).count()
+            "items_count": items_count
+        } for sale, client_name, _, items_count in rows],
+        "total": db.query(Sale).count(),
+        "next_cursor": next_cursor
     }
 
 
@@ -112,8 +142,7 @@ def create_sale(
                 raise HTTPException(status_code=404, detail="Cliente não encontrado")
 
         # Gerar número da venda
-        sale_count = db.query(Sale).count()
-        sale_number = f"VND{sale_count + 1:06d}"
+        sale_number = NumberingService(db).next_number(DocumentType.SALE)
 
         # Criar venda
         sale = Sale(
@@ -128,30 +157,28 @@ def create_sale(
         db.add(sale)
         db.flush()  # Para obter o ID da venda
 
+        # Validar produtos e estoque com uma única consulta
+        cart = CartService(db)
+        products = cart.load_products(item.product_id for item in sale_data.items)
+        cart.check_active(products)
+        cart.check_stock(((item.product_id, item.quantity) for item in sale_data.items), products)
+
         # Adicionar itens
         subtotal = 0
+        sale_items = []
         for item_data in sale_data.items:
-            # Validar produto
-            product = db.query(Product).filter(Product.id == item_data.product_id).first()
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Produto {item_data.product_id} não encontrado")
-            
-            # Verificar estoque
-            if product.stock_quantity < item_data.quantity:
-                raise HTTPException(status_code=400, detail=f"Estoque insuficiente para {product.name}")
-            
             item_subtotal = item_data.quantity * item_data.unit_price
             
-            sale_item = SaleItem(
+            sale_items.append(SaleItem(
                 sale_id=sale.id,
                 product_id=item_data.product_id,
                 quantity=item_data.quantity,
                 unit_price=item_data.unit_price,
                 subtotal=item_subtotal
-            )
-            
-            db.add(sale_item)
+            ))
             subtotal += item_subtotal
+        
+        db.add_all(sale_items)
 
         # Atualizar totais da venda
         discount_amount = sale_data.discount or 0
@@ -241,25 +268,26 @@ def update_sale(
         
         sale.notes = sale_data.notes
 
+        # Validar produtos com uma única consulta
+        cart = CartService(db)
+        cart.check_active(cart.load_products(item.product_id for item in sale_data.items))
+
         # Adicionar novos itens
         subtotal = 0
+        sale_items = []
         for item_data in sale_data.items:
-            product = db.query(Product).filter(Product.id == item_data.product_id).first()
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Produto {item_data.product_id} não encontrado")
-            
             item_subtotal = item_data.quantity * item_data.unit_price
             
-            sale_item = SaleItem(
+            sale_items.append(SaleItem(
                 sale_id=sale.id,
                 product_id=item_data.product_id,
                 quantity=item_data.quantity,
                 unit_price=item_data.unit_price,
                 subtotal=item_subtotal
-            )
-            
-            db.add(sale_item)
+            ))
             subtotal += item_subtotal
+        
+        db.add_all(sale_items)
 
         # Atualizar totais
         discount_amount = sale_data.discount or 0
@@ -290,13 +318,10 @@ def confirm_sale(
         raise HTTPException(status_code=400, detail="Venda já foi confirmada")
 
     try:
-        # Baixar estoque
-        for item in sale.items:
-            product = item.product
-            if product.stock_quantity < item.quantity:
-                raise HTTPException(status_code=400, detail=f"Estoque insuficiente para {product.name}")
-            
-            product.stock_quantity -= item.quantity
+        # Baixar estoque (atômico: falha se algum item não tiver saldo)
+        CartService(db).decrement_stock_or_raise(
+            (item.product_id, item.quantity) for item in sale.items
+        )
 
         sale.status = SaleStatus.CONFIRMED
         db.commit()
@@ -348,8 +373,7 @@ def create_complete_sale(
                 raise HTTPException(status_code=404, detail="Cliente não encontrado")
 
         # Gerar número da venda
-        sale_count = db.query(Sale).count()
-        sale_number = f"VND{sale_count + 1:06d}"
+        sale_number = NumberingService(db).next_number(DocumentType.SALE)
 
         # Calcular valores
         subtotal = sum(item.quantity * item.unit_price for item in sale_data.items)
@@ -385,19 +409,13 @@ def create_complete_sale(
         db.add(sale)
         db.flush()  # Para obter o ID da venda
 
+        # Validar os produtos do carrinho em uma consulta
+        cart = CartService(db)
+        cart.check_active(cart.load_products(item.product_id for item in sale_data.items))
+
         # Adicionar itens
-        for item_data in sale_data.items:
-            # Validar produto
-            product = db.query(Product).filter(Product.id == item_data.product_id).first()
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Produto {item_data.product_id} não encontrado")
-            
-            # Verificar estoque
-            if product.stock_quantity < item_data.quantity:
-                raise HTTPException(status_code=400, detail=f"Estoque insuficiente para {product.name}")
-            
-            # Criar item da venda
-            sale_item = SaleItem(
+        db.add_all([
+            SaleItem(
                 sale_id=sale.id,
                 product_id=item_data.product_id,
                 quantity=item_data.quantity,
@@ -407,11 +425,11 @@ def create_complete_sale(
                 pis_amount=item_data.pis_amount,
                 cofins_amount=item_data.cofins_amount
             )
-            
-            db.add(sale_item)
-            
-            # Baixar estoque
-            product.stock_quantity -= item_data.quantity
+            for item_data in sale_data.items
+        ])
+
+        # Baixar estoque (atômico: falha se algum item não tiver saldo)
+        cart.decrement_stock_or_raise((item.product_id, item.quantity) for item in sale_data.items)
 
         # Criar pagamento
         payment = Payment(
@@ -464,8 +482,7 @@ def process_quick_sale(
             raise HTTPException(status_code=500, detail="Nenhum usuário encontrado no sistema")
         
         # Gerar número da venda
-        sale_count = db.query(Sale).count()
-        sale_number = f"QS{sale_count + 1:06d}"
+        sale_number = NumberingService(db).next_number(DocumentType.QUICK_SALE)
 
         # Criar venda principal
         new_sale = Sale()
@@ -480,29 +497,40 @@ def process_quick_sale(
         db.add(new_sale)
         db.flush()  # Para obter o ID
 
-        # Adicionar itens apenas se existirem produtos reais
+        # Itens sem id/quantidade/preço são produtos de teste - pular
+        cart_items = []
         for item in sale_data.items:
             try:
-                product_uuid = uuid.UUID(item['id'])
-                product = db.query(Product).filter(Product.id == product_uuid).first()
-                
-                if product:
-                    sale_item = SaleItem(
-                        sale_id=new_sale.id,
-                        product_id=product.id,
-                        quantity=item['quantity'],
-                        unit_price=item['price'],
-                        subtotal=item['price'] * item['quantity']
-                    )
-                    db.add(sale_item)
-                    
-                    # Atualizar estoque
-                    if product.stock_quantity >= item['quantity']:
-                        product.stock_quantity -= item['quantity']
-                        
-            except (ValueError, KeyError):
-                # Produto de teste - pular
+                cart_items.append((str(item['id']), item['quantity'], item['price']))
+            except KeyError:
+                continue
+
+        # Carregar os produtos reais em uma consulta
+        cart = CartService(db)
+        products = cart.load_products(
+            (product_id for product_id, _, _ in cart_items), skip_missing=True
+        )
+        cart.check_active(products)
+
+        # Adicionar itens apenas se existirem produtos reais
+        sale_items = []
+        for product_id, quantity, price in cart_items:
+            product = products.get(product_id)
+            if not product:
                 continue
+            
+            sale_items.append(SaleItem(
+                sale_id=new_sale.id,
+                product_id=product.id,
+                quantity=quantity,
+                unit_price=price,
+                subtotal=price * quantity
+            ))
+        
+        db.add_all(sale_items)
+        
+        # Atualizar estoque: itens sem saldo suficiente não são baixados
+        cart.decrement_stock((item.product_id, item.quantity) for item in sale_items)
 
         db.commit()
         
@@ -533,24 +561,22 @@ def get_recent_sales(
         if request and "limit" in request:
             limit = request["limit"]
             
-        recent_sales = db.query(Sale)\
+        recent_sales = sales_listing_query(db)\
             .order_by(Sale.created_at.desc())\
             .limit(limit)\
             .all()
         
         sales_data = []
-        for sale in recent_sales:
-            item_count = len(sale.items) if sale.items else 0
-            
+        for sale, client_name, seller_name, items_count in recent_sales:
             sales_data.append({
                 "id": str(sale.id),
                 "number": sale.number,
                 "total_amount": float(sale.total),
                 "status": sale.status,
                 "created_at": sale.created_at.isoformat(),
-                "seller_name": sale.user.name if sale.user else "Sistema",
-                "items_count": item_count,
-                "customer_name": sale.client.name if sale.client else "Cliente Avulso"
+                "seller_name": seller_name or "Sistema",
+                "items_count": items_count,
+                "customer_name": client_name or "Cliente Avulso"
             })
         
         return {
@@ -571,38 +597,31 @@ def get_daily_sales_stats(
 ):
     """Estatísticas de vendas do dia atual"""
     
-    from sqlalchemy import func, and_
-    today = datetime.utcnow().date()
+    from sqlalchemy import text
+    # Limites com fuso: created_at (br_now) fica gravado no TimeZone da sessão
+    start, end = br_day_range()
+    today = start.date()
     
     try:
-        # Query para vendas do dia
+        # Vendas do dia por intervalo de created_at (índice ix_sales_created_at_id)
         daily_sales = db.query(
             func.count(Sale.id).label('count'),
             func.sum(Sale.total).label('total')
         ).filter(
-            and_(
-                func.date(Sale.created_at) == today,
-                Sale.status != 'cancelled'
-            )
+            Sale.created_at >= start,
+            Sale.created_at < end,
+            Sale.status != 'cancelled'
         ).first()
         
-        # Query para itens mais vendidos do dia
-        top_products = db.query(
-            Product.name,
-            func.sum(SaleItem.quantity).label('quantity_sold')
-        ).join(
-            SaleItem, Product.id == SaleItem.product_id
-        ).join(
-            Sale, SaleItem.sale_id == Sale.id
-        ).filter(
-            and_(
-                func.date(Sale.created_at) == today,
-                Sale.status != 'cancelled'
-            )
-        ).group_by(Product.name)\
-        .order_by(func.sum(SaleItem.quantity).desc())\
-        .limit(5)\
-        .all()
+        # Mais vendidos do dia pelo rollup diário por produto (só os produtos vendidos hoje)
+        top_products = db.execute(text("""
+            SELECT p.name, r.quantity AS quantity_sold
+            FROM sales_daily_by_product r
+            JOIN products p ON p.id = r.product_id
+            WHERE r.day = :day AND r.quantity > 0
+            ORDER BY r.quantity DESC
+            LIMIT 5
+        """), {"day": today}).all()
         
         return {
             "success": True,
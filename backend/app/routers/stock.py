@@ -10,6 +10,7 @@ from pydantic import BaseModel, Field
 from app.core.auth import get_current_user
 from app.services.stock_service import StockService
 from app.schemas.response import APIResponse
+from app.database.streaming import stream_query
 
 router = APIRouter(prefix="/stock", tags=["Estoque"])
 
@@ -160,6 +161,7 @@ async def get_stock_movements(
     date_to: Optional[date] = Query(None),
     limit: int = Query(100, le=500),
     offset: int = Query(0, ge=0),
+    after: Optional[str] = Query(None, description="Cursor da próxima página (next_cursor); substitui offset"),
     current_user: dict = Depends(get_current_user)
 ):
     """Buscar histórico de movimentações"""
@@ -168,7 +170,8 @@ async def get_stock_movements(
         
         filters = {
             'limit': limit,
-            'offset': offset
+            'offset': offset,
+            'after': after
         }
         
         if product_id:
@@ -182,11 +185,37 @@ async def get_stock_movements(
         
         return await service.get_stock_movements(filters)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ===== CONSULTA DE ESTOQUE =====
 
+@router.get("/movements/export")
+def export_stock_movements(
+    product_id: Optional[UUID] = Query(None),
+    movement_type: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    fmt: str = Query("csv", alias="format", description="csv ou ndjson"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Exportar movimentações em streaming (CSV ou NDJSON), sem limite de linhas"""
+    filters = {}
+    
+    if product_id:
+        filters['product_id'] = str(product_id)
+    if movement_type:
+        filters['movement_type'] = movement_type
+    if date_from:
+        filters['date_from'] = date_from
+    if date_to:
+        filters['date_to'] = date_to
+    
+    query, params = StockService().movements_export_query(filters)
+    return stream_query(query, params, fmt=fmt, filename="movimentacoes_estoque")
+
 @router.get("/current", response_model=APIResponse)
 async def get_current_stock(
     product_id: Optional[UUID] = Query(None),
@@ -282,55 +311,17 @@ async def get_low_stock_report(
 @router.get("/reports/valuation", response_model=APIResponse)
 async def get_stock_valuation_report(
     category_id: Optional[UUID] = Query(None),
+    include_products: bool = Query(False, description="Incluir o detalhe por produto"),
     current_user: dict = Depends(get_current_user)
 ):
     """Relatório de valorização de estoque"""
     try:
         service = StockService()
         
-        filters = {'limit': 1000}
-        if category_id:
-            filters['category_id'] = str(category_id)
-        
-        stock_response = await service.get_stock_current(filters)
-        
-        if stock_response.success:
-            # Calcular totais
-            total_value = sum(item['cost']['stock_value'] for item in stock_response.data)
-            total_products = len(stock_response.data)
-            total_quantity = sum(item['stock']['total'] for item in stock_response.data)
-            
-            # Agrupar por categoria
-            categories = {}
-            for item in stock_response.data:
-                category = item.get('category', 'Sem categoria')
-                if category not in categories:
-                    categories[category] = {
-                        'category_name': category,
-                        'products_count': 0,
-                        'total_quantity': 0,
-                        'total_value': 0
-                    }
-                
-                categories[category]['products_count'] += 1
-                categories[category]['total_quantity'] += item['stock']['total']
-                categories[category]['total_value'] += item['cost']['stock_value']
-            
-            return APIResponse(
-                success=True,
-                data={
-                    'summary': {
-                        'total_products': total_products,
-                        'total_quantity': total_quantity,
-                        'total_value': total_value
-                    },
-                    'by_category': list(categories.values()),
-                    'products': stock_response.data
-                },
-                message="Relatório de valorização de estoque"
-            )
-        
-        return stock_response
+        return await service.get_stock_valuation(
+            str(category_id) if category_id else None,
+            include_products
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -339,54 +330,19 @@ async def get_stock_valuation_report(
 async def get_movements_summary(
     date_from: date = Query(...),
     date_to: date = Query(...),
+    group_by: Optional[str] = Query(None, pattern="^(day|week|month)$", description="Totais também por dia, semana ou mês"),
     current_user: dict = Depends(get_current_user)
 ):
     """Resumo de movimentações por período"""
     try:
-        service = StockService()
+        if date_to < date_from:
+            raise HTTPException(status_code=400, detail="date_to deve ser maior ou igual a date_from")
         
-        movements_response = await service.get_stock_movements({
-            'date_from': date_from,
-            'date_to': date_to,
-            'limit': 1000
-        })
+        service = StockService()
         
-        if movements_response.success:
-            movements = movements_response.data
-            
-            # Agrupar por tipo de movimentação
-            summary = {}
-            for movement in movements:
-                mov_type = movement['movement']['type']
-                quantity = abs(movement['movement']['movement_quantity'])
-                value = movement['cost']['total_value']
-                
-                if mov_type not in summary:
-                    summary[mov_type] = {
-                        'movement_type': mov_type,
-                        'count': 0,
-                        'total_quantity': 0,
-                        'total_value': 0
-                    }
-                
-                summary[mov_type]['count'] += 1
-                summary[mov_type]['total_quantity'] += quantity
-                summary[mov_type]['total_value'] += value
-            
-            return APIResponse(
-                success=True,
-                data={
-                    'period': {
-                        'from': date_from.isoformat(),
-                        'to': date_to.isoformat()
-                    },
-                    'summary_by_type': list(summary.values()),
-                    'total_movements': len(movements)
-                },
-                message="Resumo de movimentações"
-            )
-        
-        return movements_response
+        return await service.get_movements_summary(date_from, date_to, group_by)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func, or_
 from typing import Optional
 from app.core.database import get_db
@@ -24,7 +24,11 @@ def get_suppliers(
     current_user: User = Depends(get_current_user)
 ):
     """Lista fornecedores com paginação e busca"""
-    query = db.query(Supplier)
+    # Telefones e endereços em uma consulta por tabela filha para a página toda
+    query = db.query(Supplier).options(
+        selectinload(Supplier.phones),
+        selectinload(Supplier.addresses)
+    )
     
     # Filtro de status
     if status == "active":
@@ -71,9 +75,8 @@ def get_suppliers(
     # Converter para formato JSON
     result = []
     for supplier in suppliers:
-        # Buscar telefones e endereços do fornecedor
-        phones = db.query(Phone).filter(Phone.supplier_id == supplier.id).all()
-        addresses = db.query(Address).filter(Address.supplier_id == supplier.id).all()
+        phones = supplier.phones
+        addresses = supplier.addresses
         
         result.append({
             "id": str(supplier.id),
@@ -254,8 +257,8 @@ async def create_supplier(
         db.refresh(supplier)
         
         # Buscar telefones e endereços criados
-        phones = db.query(Phone).filter(Phone.supplier_id == supplier.id).all()
-        addresses = db.query(Address).filter(Address.supplier_id == supplier.id).all()
+        phones = supplier.phones
+        addresses = supplier.addresses
         
         return {
             "id": str(supplier.id),
@@ -317,8 +320,8 @@ def get_supplier(
         raise HTTPException(status_code=404, detail="Fornecedor não encontrado")
     
     # Buscar telefones e endereços do fornecedor
-    phones = db.query(Phone).filter(Phone.supplier_id == supplier.id).all()
-    addresses = db.query(Address).filter(Address.supplier_id == supplier.id).all()
+    phones = supplier.phones
+    addresses = supplier.addresses
     
     return {
         "id": str(supplier.id),
@@ -495,8 +498,8 @@ async def update_supplier(
         db.refresh(supplier)
         
         # Buscar telefones e endereços atualizados
-        phones = db.query(Phone).filter(Phone.supplier_id == supplier.id).all()
-        addresses = db.query(Address).filter(Address.supplier_id == supplier.id).all()
+        phones = supplier.phones
+        addresses = supplier.addresses
         
         return {
             "id": str(supplier.id),
@@ -9,7 +9,7 @@ from app.models.role import Role
 from app.schemas.user import UserCreate, UserUpdate, UserResponse, UserListResponse, UserProfileUpdate
 from app.core.auth import get_current_user
 from app.core.permissions import PermissionChecker, get_user_permissions
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash, verify_password, invalidate_cached_user
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -173,6 +173,7 @@ async def update_my_profile(
         setattr(current_user, field, value)
     
     db.commit()
+    invalidate_cached_user(current_user.id)
     db.refresh(current_user)
     
     return await get_user_with_details(str(current_user.id), db)
@@ -228,6 +229,7 @@ async def update_user(
             setattr(user, field, value)
     
     db.commit()
+    invalidate_cached_user(user.id)
     db.refresh(user)
     
     return await get_user_with_details(user.id, db)
@@ -253,6 +255,7 @@ async def delete_user(
     
     user.is_active = False
     db.commit()
+    invalidate_cached_user(user.id)
     
     return {"message": "Usuário inativado com sucesso"}
 
@@ -274,6 +277,7 @@ async def toggle_user_status(
     
     user.is_active = not user.is_active
     db.commit()
+    invalidate_cached_user(user.id)
     
     status = "ativado" if user.is_active else "inativado"
     return {"message": f"Usuário {status} com sucesso"}
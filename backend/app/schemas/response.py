@@ -11,6 +11,7 @@ class APIResponse(BaseModel, Generic[T]):
     success: bool
     message: Optional[str] = None
     data: Optional[T] = None
+    next_cursor: Optional[str] = None  # Cursor da próxima página (listagens paginadas)
     
     @classmethod
     def success_response(cls, data: T = None, message: str = "Sucesso"):
@@ -7,15 +7,60 @@ from uuid import UUID, uuid4
 import logging
 from decimal import Decimal
 
+from app.config import settings
+from app.core.cache import get_cache
 from app.database.connection import get_db_connection
+from app.database.executor import run_in_db_executor
 from app.models.response import APIResponse
+from app.core.pagination import keyset_sql, trim_page
 
 logger = logging.getLogger(__name__)
 
+# Resumo do dashboard de contas a pagar. Expira pelo TTL e é descartado a cada
+# conta criada ou pagamento registrado neste processo.
+dashboard_cache = get_cache(
+    "accounts_payable_dashboard",
+    ttl_seconds=settings.accounts_payable_dashboard_ttl_seconds,
+    max_size=1
+)
+
+# KPIs do dashboard em uma consulta: contas (saldo total e em atraso) e
+# parcelas em aberto que vencem nos próximos 30 dias / até o fim do mês
+DASHBOARD_SUMMARY_SQL = """
+    SELECT
+        contas.total_accounts, contas.total_balance,
+        contas.overdue_accounts, contas.overdue_balance,
+        parcelas.due_this_month, parcelas.due_this_month_balance,
+        parcelas.due_next_30_days, parcelas.due_next_30_days_balance
+    FROM (
+        SELECT
+            COUNT(*) AS total_accounts,
+            COALESCE(SUM(valor_em_aberto), 0) AS total_balance,
+            COUNT(*) FILTER (WHERE data_vencimento_original < CURRENT_DATE
+                             AND status IN ('em_aberto', 'pago_parcial')) AS overdue_accounts,
+            COALESCE(SUM(valor_em_aberto) FILTER (WHERE data_vencimento_original < CURRENT_DATE
+                                                  AND status IN ('em_aberto', 'pago_parcial')), 0) AS overdue_balance
+        FROM contas_pagar
+    ) contas
+    CROSS JOIN (
+        SELECT
+            COUNT(*) FILTER (WHERE data_vencimento < date_trunc('month', CURRENT_DATE) + INTERVAL '1 month') AS due_this_month,
+            COALESCE(SUM(valor_final - valor_pago) FILTER (
+                WHERE data_vencimento < date_trunc('month', CURRENT_DATE) + INTERVAL '1 month'
+            ), 0) AS due_this_month_balance,
+            COUNT(*) AS due_next_30_days,
+            COALESCE(SUM(valor_final - valor_pago), 0) AS due_next_30_days_balance
+        FROM contas_pagar_parcelas
+        WHERE status IN ('em_aberto', 'vencido', 'pago_parcial')
+          AND data_vencimento BETWEEN CURRENT_DATE AND CURRENT_DATE + 30
+    ) parcelas
+"""
+
 class AccountsPayableService:
     """Serviço para operações de contas a pagar"""
     
-    async def create_account_payable(self, account_data: Dict[str, Any], user_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def create_account_payable(self, account_data: Dict[str, Any], user_id: UUID) -> APIResponse:
         """Criar nova conta a pagar"""
         try:
             conn = get_db_connection()
@@ -75,6 +120,7 @@ class AccountsPayableService:
             account_number = cursor.fetchone()[0]
             
             conn.commit()
+            dashboard_cache.clear()
             
             return APIResponse(
                 success=True,
@@ -99,8 +145,14 @@ class AccountsPayableService:
             cursor.close()
             conn.close()
     
-    async def get_accounts_payable(self, filters: Dict[str, Any] = None) -> APIResponse:
+    @run_in_db_executor
+    def get_accounts_payable(self, filters: Dict[str, Any] = None) -> APIResponse:
         """Buscar contas a pagar"""
+        # Cursor (vencimento, id): páginas profundas sem OFFSET
+        after_condition, order_by, after_params = keyset_sql(
+            "cp.data_vencimento_original", "cp.id", False, (filters or {}).get('after')
+        )
+        
         try:
             conn = get_db_connection()
             cursor = conn.cursor()
@@ -133,6 +185,10 @@ class AccountsPayableService:
                 where_conditions.append("cp.categoria_conta = %s")
                 params.append(filters['category'])
             
+            if after_condition:
+                where_conditions.append(after_condition)
+                params.extend(after_params)
+            
             where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
             
             query = f"""
@@ -150,16 +206,16 @@ class AccountsPayableService:
                 FROM contas_pagar cp
                 JOIN pessoas p ON cp.pessoa_id = p.id
                 {where_clause}
-                ORDER BY cp.data_vencimento_original ASC, cp.created_at DESC
+                ORDER BY {order_by}
                 LIMIT %s OFFSET %s
             """
             
             limit = min(filters.get('limit', 100), 500)
-            offset = filters.get('offset', 0)
-            params.extend([limit, offset])
+            offset = 0 if after_condition else filters.get('offset', 0)
+            params.extend([limit + 1, offset])
             
             cursor.execute(query, params)
-            accounts = cursor.fetchall()
+            accounts, next_cursor = trim_page(cursor.fetchall(), limit, 5, 0)
             
             result = []
             for account in accounts:
@@ -193,7 +249,8 @@ class AccountsPayableService:
             return APIResponse(
                 success=True,
                 data=result,
-                message=f"{len(result)} contas encontradas"
+                message=f"{len(result)} contas encontradas",
+                next_cursor=next_cursor
             )
             
         except Exception as e:
@@ -206,7 +263,8 @@ class AccountsPayableService:
             cursor.close()
             conn.close()
     
-    async def get_account_details(self, account_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def get_account_details(self, account_id: UUID) -> APIResponse:
         """Buscar detalhes completos de uma conta a pagar"""
         try:
             conn = get_db_connection()
@@ -355,7 +413,8 @@ class AccountsPayableService:
             cursor.close()
             conn.close()
     
-    async def process_payment(self, payment_data: Dict[str, Any], user_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def process_payment(self, payment_data: Dict[str, Any], user_id: UUID) -> APIResponse:
         """Processar pagamento de parcela"""
         try:
             conn = get_db_connection()
@@ -412,6 +471,7 @@ class AccountsPayableService:
             """, (new_paid_value, new_status, new_status, new_status, user_id, installment_id))
             
             conn.commit()
+            dashboard_cache.clear()
             
             return APIResponse(
                 success=True,
@@ -436,6 +496,229 @@ class AccountsPayableService:
             cursor.close()
             conn.close()
     
+    @run_in_db_executor
+    def get_dashboard_summary(self) -> APIResponse:
+        """KPIs do dashboard (quantidades e saldos) em uma consulta, com cache curto"""
+        try:
+            summary_data = dashboard_cache.get_or_load("summary", self._load_dashboard_summary)
+            
+            return APIResponse(
+                success=True,
+                data=dict(summary_data),
+                message="Dashboard das contas a pagar"
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao montar dashboard de contas a pagar: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao montar dashboard: {str(e)}"
+            )
+    
+    def _load_dashboard_summary(self) -> Dict[str, Any]:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(DASHBOARD_SUMMARY_SQL)
+            row = cursor.fetchone()
+            conn.rollback()
+        finally:
+            cursor.close()
+            conn.close()
+        
+        return {
+            'total_accounts': row[0],
+            'total_balance': float(row[1]),
+            'overdue_accounts': row[2],
+            'overdue_balance': float(row[3]),
+            'due_this_month': row[4],
+            'due_this_month_balance': float(row[5]),
+            'due_next_30_days': row[6],
+            'due_next_30_days_balance': float(row[7])
+        }
+    
+    @run_in_db_executor
+    def get_cash_flow_projection(self, date_from: date, date_to: date,
+                                 detail_month: Optional[date] = None) -> APIResponse:
+        """
+        Projeção de pagamentos por mês agregada no banco
+        (date_trunc('month', data_vencimento)), sem limite de parcelas.
+        As parcelas só são retornadas para ``detail_month`` (drill-down).
+        """
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT 
+                    date_trunc('month', data_vencimento)::date AS mes,
+                    COUNT(*),
+                    COALESCE(SUM(valor_final - valor_pago), 0),
+                    COUNT(*) FILTER (WHERE data_vencimento < CURRENT_DATE)
+                FROM contas_pagar_parcelas
+                WHERE status IN ('em_aberto', 'vencido', 'pago_parcial')
+                  AND data_vencimento >= %s AND data_vencimento <= %s
+                GROUP BY mes
+            """, (date_from, date_to))
+            totals = {row[0]: row for row in cursor.fetchall()}
+            
+            monthly_flow = []
+            current_month = date_from.replace(day=1)
+            while current_month <= date_to:
+                row = totals.get(current_month)
+                monthly_flow.append({
+                    'month': current_month.strftime('%B %Y'),
+                    'month_start': current_month.isoformat(),
+                    'installments_count': row[1] if row else 0,
+                    'total_due': float(row[2]) if row else 0,
+                    'overdue_count': row[3] if row else 0
+                })
+                current_month = (current_month + timedelta(days=32)).replace(day=1)
+            
+            if detail_month:
+                month_start = detail_month.replace(day=1)
+                next_month = (month_start + timedelta(days=32)).replace(day=1)
+                cursor.execute("""
+                    SELECT 
+                        cpp.id, cpp.numero_parcela, cpp.data_vencimento, cpp.valor_final,
+                        cpp.valor_pago, cpp.status, cpp.dias_atraso,
+                        cp.numero_conta, cp.descricao, p.nome as supplier_name
+                    FROM contas_pagar_parcelas cpp
+                    JOIN contas_pagar cp ON cpp.conta_pagar_id = cp.id
+                    JOIN pessoas p ON cp.pessoa_id = p.id
+                    WHERE cpp.status IN ('em_aberto', 'vencido', 'pago_parcial')
+                      AND cpp.data_vencimento >= %s AND cpp.data_vencimento <= %s
+                    ORDER BY cpp.data_vencimento, p.nome
+                """, (max(date_from, month_start), min(date_to, next_month - timedelta(days=1))))
+                
+                installments = [
+                    {
+                        'installment_id': str(item[0]),
+                        'installment_number': item[1],
+                        'due_date': item[2].isoformat() if item[2] else None,
+                        'amount': float(item[3]) if item[3] else 0,
+                        'paid_amount': float(item[4]) if item[4] else 0,
+                        'balance': float(item[3] - item[4]),
+                        'status': item[5],
+                        'days_overdue': item[6],
+                        'account_number': item[7],
+                        'description': item[8],
+                        'supplier_name': item[9]
+                    }
+                    for item in cursor.fetchall()
+                ]
+                for month in monthly_flow:
+                    if month['month_start'] == month_start.isoformat():
+                        month['installments'] = installments
+            
+            return APIResponse(
+                success=True,
+                data={
+                    'period': {
+                        'from': date_from.isoformat(),
+                        'to': date_to.isoformat(),
+                        'months': len(monthly_flow)
+                    },
+                    'monthly_flow': monthly_flow,
+                    'total_projection': sum(month['total_due'] for month in monthly_flow)
+                },
+                message=f"Projeção de fluxo de caixa para {len(monthly_flow)} meses"
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao projetar fluxo de caixa: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao projetar fluxo de caixa: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
+    
+    @run_in_db_executor
+    def get_accounts_by_supplier(self, filters: Dict[str, Any] = None) -> APIResponse:
+        """
+        Contas em aberto agrupadas por fornecedor (pessoa_id) no banco, com
+        paginação por cursor (maior saldo primeiro). As contas de cada
+        fornecedor são buscadas à parte, sob demanda.
+        """
+        filters = filters or {}
+        # Cursor (saldo, pessoa_id) aplicado no HAVING sobre o agrupamento
+        after_condition, order_by, after_params = keyset_sql(
+            "COALESCE(SUM(cp.valor_em_aberto), 0)", "cp.pessoa_id", True, filters.get('after')
+        )
+        
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            having_clause = f"HAVING {after_condition}" if after_condition else ""
+            limit = min(filters.get('limit', 50), 500)
+            offset = 0 if after_condition else filters.get('offset', 0)
+            
+            cursor.execute(f"""
+                SELECT 
+                    cp.pessoa_id, MAX(p.nome), MAX(p.documento),
+                    COUNT(*),
+                    COALESCE(SUM(cp.valor_em_aberto), 0),
+                    COALESCE(SUM(cp.valor_em_aberto) FILTER (WHERE cp.data_vencimento_original < CURRENT_DATE), 0),
+                    MIN(cp.data_vencimento_original)
+                FROM contas_pagar cp
+                JOIN pessoas p ON cp.pessoa_id = p.id
+                WHERE cp.status = 'em_aberto'
+                GROUP BY cp.pessoa_id
+                {having_clause}
+                ORDER BY {order_by}
+                LIMIT %s OFFSET %s
+            """, after_params + [limit + 1, offset])
+            suppliers, next_cursor = trim_page(cursor.fetchall(), limit, 4, 0)
+            
+            # Totais gerais (todas as páginas)
+            cursor.execute("""
+                SELECT 
+                    COUNT(DISTINCT cp.pessoa_id), COUNT(*),
+                    COALESCE(SUM(cp.valor_em_aberto), 0),
+                    COALESCE(SUM(cp.valor_em_aberto) FILTER (WHERE cp.data_vencimento_original < CURRENT_DATE), 0)
+                FROM contas_pagar cp
+                JOIN pessoas p ON cp.pessoa_id = p.id
+                WHERE cp.status = 'em_aberto'
+            """)
+            totals = cursor.fetchone()
+            
+            return APIResponse(
+                success=True,
+                data={
+                    'suppliers_count': totals[0],
+                    'total_accounts': totals[1],
+                    'total_balance': float(totals[2]),
+                    'total_overdue': float(totals[3]),
+                    'by_supplier': [
+                        {
+                            'supplier_id': str(row[0]),
+                            'supplier_name': row[1],
+                            'supplier_document': row[2],
+                            'accounts_count': row[3],
+                            'total_balance': float(row[4]),
+                            'overdue_balance': float(row[5]),
+                            'oldest_due_date': row[6].isoformat() if row[6] else None
+                        }
+                        for row in suppliers
+                    ]
+                },
+                message="Relatório por fornecedor",
+                next_cursor=next_cursor
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao agrupar contas por fornecedor: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao agrupar contas por fornecedor: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
+    
     async def get_overdue_accounts(self, filters: Dict[str, Any] = None) -> APIResponse:
         """Buscar contas em atraso"""
         try:
@@ -451,7 +734,8 @@ class AccountsPayableService:
                 message=f"Erro ao buscar contas em atraso: {str(e)}"
             )
     
-    async def get_payment_schedule(self, filters: Dict[str, Any] = None) -> APIResponse:
+    @run_in_db_executor
+    def get_payment_schedule(self, filters: Dict[str, Any] = None) -> APIResponse:
         """Buscar cronograma de pagamentos"""
         try:
             conn = get_db_connection()
@@ -0,0 +1,181 @@
+"""
+Resolução do carrinho de venda: carrega todos os produtos em uma consulta
+
+Substitui o ``db.query(Product).filter(Product.id == ...).first()`` por item
+nos fluxos de venda e pedido de venda por um único ``IN (...)``; todos os
+fluxos rejeitam produtos inativos com ``check_active``.
+
+A baixa de estoque é um único ``UPDATE ... WHERE stock_quantity >= :q`` para
+todos os itens, que trava as linhas em ordem de id (mesma ordem em todos os
+checkouts, sem deadlock). Dois caixas vendendo o mesmo produto não conseguem
+vender mais do que existe (sem ler-comparar-gravar no Python).
+"""
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple, Union
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+
+
+# Trava as linhas em ordem de id (mesma ordem em todos os checkouts) e baixa
+# somente os produtos com saldo suficiente; o SELECT final enxerga o estoque
+# anterior ao UPDATE, usado para reportar as faltas item a item.
+DECREMENT_STOCK_SQL = text("""
+    WITH requested AS (
+        SELECT product_id, quantity
+        FROM unnest(CAST(:product_ids AS uuid[]), CAST(:quantities AS numeric[]))
+            AS r(product_id, quantity)
+    ),
+    locked AS MATERIALIZED (
+        SELECT p.id
+        FROM products p
+        JOIN requested r ON r.product_id = p.id
+        ORDER BY p.id
+        FOR UPDATE OF p
+    ),
+    updated AS (
+        UPDATE products p
+        SET stock_quantity = p.stock_quantity - r.quantity,
+            updated_at = now()
+        FROM requested r
+        WHERE p.id = r.product_id
+          AND p.id IN (SELECT id FROM locked)
+          AND p.stock_quantity >= r.quantity
+        RETURNING p.id, p.stock_quantity
+    )
+    SELECT r.product_id, r.quantity, p.name, p.stock_quantity AS available,
+           u.stock_quantity AS remaining
+    FROM requested r
+    LEFT JOIN products p ON p.id = r.product_id
+    LEFT JOIN updated u ON u.id = r.product_id
+""")
+
+
+class CartService:
+    """
+    Serviço para carregar e validar os produtos de um carrinho
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load_products(self, product_ids: Iterable[Union[str, UUID]],
+                      skip_missing: bool = False) -> Dict[str, Product]:
+        """
+        Busca os produtos do carrinho em uma consulta, indexados por id (str).
+        Produto inexistente gera 404, a não ser que ``skip_missing`` seja usado.
+        """
+        unique_ids: "OrderedDict[str, UUID]" = OrderedDict()
+        for product_id in product_ids:
+            try:
+                unique_ids[str(product_id)] = product_id if isinstance(product_id, UUID) else UUID(str(product_id))
+            except ValueError:
+                if skip_missing:
+                    continue
+                raise HTTPException(status_code=404, detail=f"Produto {product_id} não encontrado")
+
+        if not unique_ids:
+            return {}
+
+        found = {
+            str(product.id): product
+            for product in self.db.query(Product).filter(Product.id.in_(list(unique_ids.values())))
+        }
+
+        # Indexado pela forma como o id veio no carrinho
+        products: Dict[str, Product] = {}
+        for product_id, parsed_id in unique_ids.items():
+            product = found.get(str(parsed_id))
+            if product is None:
+                if skip_missing:
+                    continue
+                raise HTTPException(status_code=404, detail=f"Produto {product_id} não encontrado")
+            products[product_id] = product
+
+        return products
+
+    @staticmethod
+    def check_active(products: Dict[str, Product]) -> None:
+        """Produto inativo não pode ser vendido nem incluído em pedido"""
+        for product in products.values():
+            if not product.is_active:
+                raise HTTPException(status_code=400, detail=f"Produto {product.name} está inativo")
+
+    @staticmethod
+    def quantities_by_product(items: Iterable[Tuple[Union[str, UUID], Union[int, Decimal]]],
+                              products: Dict[str, Product]) -> List[Tuple[Product, Union[int, Decimal]]]:
+        """Soma as quantidades de itens repetidos do mesmo produto"""
+        totals: "OrderedDict[str, list]" = OrderedDict()
+        for product_id, quantity in items:
+            product = products.get(str(product_id))
+            if product is None:
+                continue
+            key = str(product.id)
+            if key in totals:
+                totals[key][1] += quantity
+            else:
+                totals[key] = [product, quantity]
+        return [(product, quantity) for product, quantity in totals.values()]
+
+    def check_stock(self, items: Iterable[Tuple[Union[str, UUID], Union[int, Decimal]]],
+                    products: Dict[str, Product], show_available: bool = False) -> None:
+        """Valida estoque em memória (quantidades somadas por produto)"""
+        for product, quantity in self.quantities_by_product(items, products):
+            if product.stock_quantity < quantity:
+                detail = f"Estoque insuficiente para {product.name}"
+                if show_available:
+                    detail += f". Disponível: {product.stock_quantity}"
+                raise HTTPException(status_code=400, detail=detail)
+
+    def decrement_stock(self, items: Iterable[Tuple[Union[str, UUID], Union[int, Decimal]]]) -> List[Dict[str, Any]]:
+        """
+        Baixa atômica do estoque de todos os itens em um único statement.
+        Retorna as faltas por produto (lista vazia se tudo foi baixado);
+        itens em falta não são baixados e cabe ao chamador decidir se aborta.
+        """
+        totals: "OrderedDict[str, Union[int, Decimal]]" = OrderedDict()
+        for product_id, quantity in items:
+            key = str(product_id)
+            totals[key] = totals.get(key, 0) + quantity
+
+        if not totals:
+            return []
+
+        rows = self.db.execute(DECREMENT_STOCK_SQL, {
+            "product_ids": list(totals.keys()),
+            "quantities": list(totals.values()),
+        }).mappings().all()
+
+        # Produtos já carregados na sessão ficaram com o saldo antigo
+        for obj in list(self.db.identity_map.values()):
+            if isinstance(obj, Product) and str(obj.id) in totals:
+                self.db.expire(obj, ["stock_quantity", "updated_at"])
+
+        return [
+            {
+                "product_id": str(row["product_id"]),
+                "product_name": row["name"],
+                "requested": row["quantity"],
+                "available": row["available"] or 0,
+            }
+            for row in rows
+            if row["remaining"] is None
+        ]
+
+    def decrement_stock_or_raise(self, items: Iterable[Tuple[Union[str, UUID], Union[int, Decimal]]],
+                                 show_available: bool = False) -> None:
+        """Baixa o estoque ou gera 400 listando todos os produtos em falta"""
+        shortages = self.decrement_stock(items)
+        if shortages:
+            if show_available:
+                names = "; ".join(
+                    f"{s['product_name']}. Disponível: {s['available']}" for s in shortages
+                )
+            else:
+                names = ", ".join(str(s["product_name"]) for s in shortages)
+            raise HTTPException(status_code=400, detail=f"Estoque insuficiente para {names}")
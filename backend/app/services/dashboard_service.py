@@ -0,0 +1,312 @@
+"""
+KPIs dos dashboards (principal, financeiro e estoque) a partir de tabelas de rollup
+
+As vendas são lidas de sales_daily_by_product (alembic 012, mantida por
+trigger a cada venda/item gravado) e de vw_sales_daily_by_client_type
+(alembic 013: rollup + deltas ainda não compactados), então nenhum dashboard
+varre o histórico de vendas. O valor corrente do estoque vem de
+vw_estoque_atual e o histórico diário de estoque_valor_diario, gravado só na
+reconciliação (migrations/035). reconcile_rollups() recalcula os rollups a
+partir das tabelas de origem e roda toda noite; compact_rollup_deltas()
+incorpora os deltas periodicamente (ver app.main).
+"""
+from datetime import date, timedelta
+from typing import Optional
+import logging
+
+from app.database.connection import get_db_connection
+from app.database.executor import run_in_db_executor
+from app.models.base import br_now
+from app.models.response import APIResponse
+
+logger = logging.getLogger(__name__)
+
+# Evita duas reconciliações simultâneas (um agendador por worker do uvicorn)
+RECONCILE_LOCK_KEY = "dashboard_rollups_reconcile"
+
+
+def _month_start(day: date, months_back: int = 0) -> date:
+    month_index = day.year * 12 + day.month - 1 - months_back
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class DashboardService:
+    """Serviço para os KPIs dos dashboards"""
+
+    @run_in_db_executor
+    def get_main_dashboard(self, months: int = 6, top_limit: int = 5) -> APIResponse:
+        """KPIs de vendas, clientes, pedidos, estoque e contas a pagar"""
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+
+            # Dias do rollup de vendas estão no horário do Brasil
+            today = br_now().date()
+            month_start = _month_start(today)
+            first_month = _month_start(today, months - 1)
+
+            cursor.execute("""
+                SELECT
+                    (SELECT COALESCE(SUM(revenue), 0) FROM vw_sales_daily_by_client_type),
+                    (SELECT COALESCE(SUM(sales_count), 0) FROM vw_sales_daily_by_client_type),
+                    (SELECT COALESCE(SUM(revenue), 0) FROM vw_sales_daily_by_client_type WHERE day >= %s),
+                    (SELECT COUNT(*) FROM clients WHERE is_active = true),
+                    (SELECT COUNT(*) FROM sale_orders
+                     WHERE is_active = true AND UPPER(status::text) IN ('DRAFT', 'CONFIRMED')),
+                    (SELECT COALESCE(SUM(valor_estoque), 0) FROM vw_estoque_atual),
+                    (SELECT COALESCE(SUM(valor_em_aberto), 0) FROM contas_pagar
+                     WHERE status IN ('em_aberto', 'pago_parcial'))
+            """, (month_start,))
+            kpis = cursor.fetchone()
+
+            cursor.execute("""
+                SELECT date_trunc('month', day)::date AS mes, SUM(revenue)
+                FROM vw_sales_daily_by_client_type
+                WHERE day >= %s
+                GROUP BY mes
+            """, (first_month,))
+            revenue_by_month = dict(cursor.fetchall())
+
+            cursor.execute("""
+                SELECT r.product_id, p.name, SUM(r.quantity) AS quantity, SUM(r.revenue)
+                FROM sales_daily_by_product r
+                JOIN products p ON p.id = r.product_id
+                WHERE r.day >= %s
+                GROUP BY r.product_id, p.name
+                HAVING SUM(r.quantity) > 0
+                ORDER BY quantity DESC
+                LIMIT %s
+            """, (month_start, top_limit))
+            top_products = cursor.fetchall()
+
+            cursor.execute("""
+                SELECT client_type, SUM(sales_count), SUM(revenue)
+                FROM vw_sales_daily_by_client_type
+                WHERE day >= %s
+                GROUP BY client_type
+            """, (month_start,))
+            by_client_type = cursor.fetchall()
+            month_revenue = sum(row[2] for row in by_client_type)
+
+            sales_by_month = []
+            for months_back in range(months - 1, -1, -1):
+                month = _month_start(today, months_back)
+                sales_by_month.append({
+                    'month': month.strftime('%Y-%m'),
+                    'revenue': float(revenue_by_month.get(month, 0))
+                })
+
+            return APIResponse(
+                success=True,
+                data={
+                    'kpis': {
+                        'total_sales': float(kpis[0]),
+                        'sales_count': int(kpis[1]),
+                        'monthly_revenue': float(kpis[2]),
+                        'active_clients': kpis[3],
+                        'pending_orders': kpis[4],
+                        'stock_value': float(kpis[5]),
+                        'accounts_payable': float(kpis[6])
+                    },
+                    'charts': {
+                        'sales_by_month': sales_by_month,
+                        'top_products': [
+                            {
+                                'product_id': str(row[0]),
+                                'name': row[1],
+                                'quantity_sold': float(row[2]),
+                                'revenue': float(row[3])
+                            }
+                            for row in top_products
+                        ],
+                        'sales_by_client_type': {
+                            row[0]: {
+                                'sales_count': int(row[1]),
+                                'revenue': float(row[2]),
+                                'percentage': round(float(row[2] / month_revenue * 100), 2) if month_revenue else 0
+                            }
+                            for row in by_client_type
+                        }
+                    }
+                },
+                message="Dashboard principal"
+            )
+
+        except Exception as e:
+            logger.error(f"Erro ao montar dashboard: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao montar dashboard: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
+
+    @run_in_db_executor
+    def get_financial_dashboard(self) -> APIResponse:
+        """Contas a receber, contas a pagar e receita do mês"""
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                SELECT
+                    (SELECT COALESCE(SUM(amount), 0) FROM accounts
+                     WHERE UPPER(account_type::text) = 'RECEIVABLE'
+                       AND UPPER(status::text) IN ('PENDING', 'OVERDUE')),
+                    (SELECT COALESCE(SUM(valor_em_aberto), 0) FROM contas_pagar
+                     WHERE status IN ('em_aberto', 'pago_parcial')),
+                    (SELECT COALESCE(SUM(revenue), 0) FROM vw_sales_daily_by_client_type WHERE day >= %s)
+            """, (_month_start(br_now().date()),))
+            receivable, payable, monthly_revenue = cursor.fetchone()
+
+            return APIResponse(
+                success=True,
+                data={
+                    'kpis': {
+                        'total_receivable': float(receivable),
+                        'total_payable': float(payable),
+                        'cash_flow': float(receivable - payable),
+                        'monthly_revenue': float(monthly_revenue)
+                    }
+                },
+                message="Dashboard financeiro"
+            )
+
+        except Exception as e:
+            logger.error(f"Erro ao montar dashboard financeiro: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao montar dashboard financeiro: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
+
+    @run_in_db_executor
+    def get_inventory_dashboard(self, days: int = 30) -> APIResponse:
+        """Produtos ativos, alertas de reposição e valor do estoque (com histórico diário)"""
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+
+            # Saldo efetivo (base + deltas pendentes do modo delta)
+            cursor.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM products WHERE is_active = true),
+                    COUNT(*) FILTER (WHERE precisa_reposicao),
+                    COALESCE(SUM(valor_estoque), 0),
+                    COALESCE(SUM(quantidade_total), 0),
+                    CURRENT_DATE
+                FROM vw_estoque_atual
+            """)
+            total_products, low_stock_alerts, stock_value, stock_quantity, today = cursor.fetchone()
+
+            # Dias anteriores: fotografias da reconciliação noturna; hoje: valor corrente
+            cursor.execute("""
+                SELECT dia, valor_estoque, quantidade_total
+                FROM estoque_valor_diario
+                WHERE dia >= CURRENT_DATE - %s AND dia < CURRENT_DATE
+                ORDER BY dia
+            """, (days,))
+            history = cursor.fetchall()
+            history.append((today, stock_value, stock_quantity))
+
+            return APIResponse(
+                success=True,
+                data={
+                    'kpis': {
+                        'total_products': total_products,
+                        'low_stock_alerts': low_stock_alerts,
+                        'stock_value': float(stock_value)
+                    },
+                    'charts': {
+                        'stock_value_by_day': [
+                            {
+                                'day': row[0].isoformat(),
+                                'stock_value': float(row[1]),
+                                'quantity': float(row[2])
+                            }
+                            for row in history
+                        ]
+                    }
+                },
+                message="Dashboard de estoque"
+            )
+
+        except Exception as e:
+            logger.error(f"Erro ao montar dashboard de estoque: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao montar dashboard de estoque: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
+
+    @run_in_db_executor
+    def compact_rollup_deltas(self, limit: int = 100000) -> APIResponse:
+        """Incorporar os deltas de vendas por tipo de cliente no rollup (compactação)"""
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT compact_sales_rollup_deltas(%s)", (limit,))
+            compacted = cursor.fetchone()[0]
+            conn.commit()
+
+            return APIResponse(
+                success=True,
+                data={'compacted': compacted},
+                message=f"{compacted} deltas de rollup compactados"
+            )
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Erro ao compactar deltas de rollup: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao compactar deltas de rollup: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
+
+    @run_in_db_executor
+    def reconcile_rollups(self, days: Optional[int] = 35) -> APIResponse:
+        """
+        Recalcula os rollups de vendas dos últimos ``days`` dias (None = todo
+        o histórico), corrigindo qualquer desvio dos triggers (ex.: tipo de
+        cliente alterado depois da venda), e grava o valor do estoque do dia
+        """
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (RECONCILE_LOCK_KEY,))
+            if not cursor.fetchone()[0]:
+                conn.rollback()
+                return APIResponse(success=True, data={'skipped': True},
+                                   message="Reconciliação já em andamento")
+
+            since = br_now().date() - timedelta(days=days) if days is not None else None
+            cursor.execute("SELECT reconcile_sales_rollups(%s)", (since,))
+            cursor.execute("SELECT reconciliar_estoque_valor_diario()")
+            conn.commit()
+
+            return APIResponse(
+                success=True,
+                data={'since': since.isoformat() if since else None},
+                message="Rollups dos dashboards reconciliados"
+            )
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Erro ao reconciliar rollups: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao reconciliar rollups: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
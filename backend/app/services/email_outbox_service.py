@@ -0,0 +1,355 @@
+"""
+Fila persistente de emails (outbox) e worker de envio
+
+As requisições só gravam a mensagem em fila_emails (migrations/033) e recebem
+o id para acompanhar o envio. O worker iniciado em app.main chama
+dispatch_pending() periodicamente: reserva um lote com FOR UPDATE SKIP LOCKED,
+envia tudo pela mesma conexão SMTP (mantida aberta entre lotes) e grava o
+resultado de cada mensagem. Falhas temporárias voltam para a fila com backoff
+exponencial; destinatário recusado ou tentativas esgotadas viram 'falhou'.
+
+Para testar localmente basta apontar SMTP_HOST/SMTP_PORT para um stub, ex.
+``python -m aiosmtpd -n -l localhost:8025``, com SMTP_STARTTLS=false e sem
+SMTP_USERNAME.
+"""
+import logging
+import mimetypes
+import smtplib
+import threading
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from psycopg2.extras import execute_values
+
+from app.config import settings
+from app.database.connection import get_db_connection
+from app.database.executor import run_in_db_executor
+from app.models.response import APIResponse
+
+logger = logging.getLogger(__name__)
+
+# Espera máxima entre tentativas de uma mensagem
+MAX_RETRY_DELAY_SECONDS = 3600
+
+# Erros do próprio envelope/mensagem: a conexão continua utilizável e repetir não adianta
+# para destinatário/remetente recusados
+PER_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+CLAIM_BATCH_SQL = """
+    UPDATE fila_emails f
+    SET status = 'enviando',
+        tentativas = f.tentativas + 1,
+        proxima_tentativa = CURRENT_TIMESTAMP + make_interval(secs => %s),
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT id FROM fila_emails
+        WHERE status IN ('pendente', 'enviando')
+          AND proxima_tentativa <= CURRENT_TIMESTAMP
+        ORDER BY proxima_tentativa
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ) lote
+    WHERE f.id = lote.id
+    RETURNING f.id, f.destinatario, f.assunto, f.corpo_html, f.anexo, f.anexo_nome, f.tentativas
+"""
+
+RECORD_RESULTS_SQL = """
+    UPDATE fila_emails f
+    SET status = CASE
+            WHEN r.enviado THEN 'enviado'
+            WHEN r.definitivo OR f.tentativas >= f.max_tentativas THEN 'falhou'
+            ELSE 'pendente'
+        END,
+        enviado_em = CASE WHEN r.enviado THEN CURRENT_TIMESTAMP END,
+        ultimo_erro = r.erro,
+        proxima_tentativa = CURRENT_TIMESTAMP + make_interval(secs => r.espera),
+        updated_at = CURRENT_TIMESTAMP
+    FROM (VALUES %s) AS r(id, enviado, definitivo, erro, espera)
+    WHERE f.id = r.id::uuid
+"""
+
+
+class SMTPConnection:
+    """Conexão SMTP reaproveitada entre mensagens e lotes (reaberta se cair ou ficar ociosa)"""
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _open(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(settings.smtp_host, settings.smtp_port,
+                              timeout=settings.smtp_timeout_seconds)
+        try:
+            server.ehlo()
+            if settings.smtp_starttls and server.has_extn("starttls"):
+                server.starttls()
+                server.ehlo()
+            if settings.smtp_username and settings.smtp_password:
+                server.login(settings.smtp_username, settings.smtp_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _drop(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                # Conexão já caiu: só descarta
+                self._server.close()
+            self._server = None
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+    def send(self, message: MIMEMultipart, to_email: str):
+        with self._lock:
+            if self._server is not None and \
+                    time.monotonic() - self._last_used > settings.smtp_idle_timeout_seconds:
+                self._drop()
+
+            reused = self._server is not None
+            if self._server is None:
+                self._server = self._open()
+            try:
+                self._server.sendmail(settings.smtp_from, [to_email], message.as_string())
+            except smtplib.SMTPServerDisconnected:
+                self._server = None
+                if not reused:
+                    raise
+                # O servidor fechou a conexão reaproveitada: reabre e tenta mais uma vez
+                self._server = self._open()
+                self._server.sendmail(settings.smtp_from, [to_email], message.as_string())
+            except PER_MESSAGE_ERRORS:
+                raise
+            except Exception:
+                # Estado da sessão incerto (timeout, erro de protocolo): a próxima mensagem reconecta
+                self._drop()
+                raise
+            finally:
+                self._last_used = time.monotonic()
+
+
+smtp_connection = SMTPConnection()
+
+
+def _build_message(to_email: str, subject: str, html_body: str,
+                   attachment: Optional[bytes], attachment_name: Optional[str]) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg['From'] = settings.smtp_from
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+
+    if attachment is not None:
+        name = attachment_name or 'anexo'
+        mime_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        part = MIMEApplication(bytes(attachment), _subtype=mime_type.split('/', 1)[1])
+        part.add_header('Content-Disposition', 'attachment', filename=name)
+        msg.attach(part)
+
+    return msg
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Rejeições 5xx da mensagem (exceto autenticação, que depende da configuração)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return (isinstance(error, smtplib.SMTPResponseException)
+            and not isinstance(error, smtplib.SMTPAuthenticationError)
+            and error.smtp_code >= 500)
+
+
+def _retry_delay(attempt: int) -> int:
+    return min(settings.email_outbox_retry_base_seconds * 2 ** (attempt - 1), MAX_RETRY_DELAY_SECONDS)
+
+
+def _job_dict(row) -> Dict[str, Any]:
+    return {
+        'id': str(row[0]),
+        'to': row[1],
+        'subject': row[2],
+        'status': row[3],
+        'attempts': row[4],
+        'max_attempts': row[5],
+        'next_attempt_at': row[6].isoformat() if row[6] else None,
+        'last_error': row[7],
+        'sent_at': row[8].isoformat() if row[8] else None,
+        'created_at': row[9].isoformat() if row[9] else None,
+        'reference_type': row[10],
+        'reference_id': str(row[11]) if row[11] else None
+    }
+
+
+def enqueue_email(to_email: str, subject: str, html_body: str,
+                  attachment: Optional[bytes] = None, attachment_name: Optional[str] = None,
+                  reference_type: Optional[str] = None, reference_id: Optional[UUID] = None) -> str:
+    """Grava a mensagem na fila e devolve o id para acompanhar o envio (chamada bloqueante)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO fila_emails (
+                destinatario, assunto, corpo_html, anexo, anexo_nome,
+                referencia_tipo, referencia_id, max_tentativas
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+        """, (
+            to_email, subject, html_body, attachment, attachment_name,
+            reference_type, str(reference_id) if reference_id else None,
+            settings.email_outbox_max_attempts
+        ))
+        job_id = cursor.fetchone()[0]
+        conn.commit()
+        return str(job_id)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+class EmailOutboxService:
+    """Serviço da fila de emails"""
+
+    @run_in_db_executor
+    def enqueue(self, to_email: str, subject: str, html_body: str,
+                attachment: Optional[bytes] = None, attachment_name: Optional[str] = None,
+                reference_type: Optional[str] = None, reference_id: Optional[UUID] = None) -> APIResponse:
+        """Adicionar email à fila; o envio é feito pelo worker"""
+        try:
+            job_id = enqueue_email(to_email, subject, html_body, attachment, attachment_name,
+                                   reference_type, reference_id)
+            return APIResponse(
+                success=True,
+                data={'id': job_id, 'status': 'pendente'},
+                message="Email adicionado à fila de envio"
+            )
+        except Exception as e:
+            logger.error(f"Erro ao enfileirar email: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao enfileirar email: {str(e)}"
+            )
+
+    @run_in_db_executor
+    def get_job(self, job_id: UUID) -> APIResponse:
+        """Status de uma mensagem da fila; id desconhecido volta com sucesso e ``data=None``"""
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                SELECT id, destinatario, assunto, status, tentativas, max_tentativas,
+                       proxima_tentativa, ultimo_erro, enviado_em, created_at,
+                       referencia_tipo, referencia_id
+                FROM fila_emails
+                WHERE id = %s
+            """, (str(job_id),))
+            row = cursor.fetchone()
+
+            if not row:
+                return APIResponse(success=True, data=None, message="Email não encontrado na fila")
+
+            return APIResponse(success=True, data=_job_dict(row), message="Status do email")
+
+        except Exception as e:
+            logger.error(f"Erro ao consultar fila de emails: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao consultar fila de emails: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _claim_batch(self, batch_size: int):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            # Reserva com prazo: se o processo cair no meio do lote as mensagens voltam depois disso
+            lease_seconds = settings.smtp_timeout_seconds * (batch_size + 1)
+            cursor.execute(CLAIM_BATCH_SQL, (lease_seconds, batch_size))
+            rows = cursor.fetchall()
+            conn.commit()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _record_results(self, results):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            execute_values(cursor, RECORD_RESULTS_SQL, results, page_size=len(results))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    @run_in_db_executor
+    def dispatch_pending(self, batch_size: Optional[int] = None) -> APIResponse:
+        """
+        Envia um lote de mensagens pendentes pela conexão SMTP compartilhada
+        e grava o resultado de cada uma
+        """
+        batch_size = batch_size or settings.email_outbox_batch_size
+        try:
+            batch = self._claim_batch(batch_size)
+            if not batch:
+                return APIResponse(success=True, data={'claimed': 0, 'sent': 0, 'failed': 0},
+                                   message="Nenhum email pendente")
+
+            # (id, enviado, definitivo, erro, espera em segundos)
+            results = []
+            connection_error = None
+            for job_id, to_email, subject, html_body, attachment, attachment_name, attempt in batch:
+                if connection_error is not None:
+                    # Servidor inacessível: o resto do lote volta para a fila sem nova conexão
+                    results.append((str(job_id), False, False, connection_error, _retry_delay(attempt)))
+                    continue
+                try:
+                    message = _build_message(to_email, subject, html_body, attachment, attachment_name)
+                except Exception as e:
+                    # Mensagem inválida: não adianta tentar de novo
+                    results.append((str(job_id), False, True, f"{type(e).__name__}: {e}", 0))
+                    continue
+                try:
+                    smtp_connection.send(message, to_email)
+                    results.append((str(job_id), True, False, None, 0))
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    logger.error(f"Erro ao enviar email {job_id} para {to_email}: {error}")
+                    results.append((str(job_id), False, _is_permanent(e), error, _retry_delay(attempt)))
+                    if not isinstance(e, PER_MESSAGE_ERRORS):
+                        connection_error = error
+
+            self._record_results(results)
+
+            sent = sum(1 for result in results if result[1])
+            return APIResponse(
+                success=True,
+                data={'claimed': len(batch), 'sent': sent, 'failed': len(batch) - sent},
+                message=f"{sent} de {len(batch)} emails enviados"
+            )
+
+        except Exception as e:
+            logger.error(f"Erro ao processar fila de emails: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao processar fila de emails: {str(e)}"
+            )
@@ -1,8 +1,9 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import List
+import logging
+from typing import List, Optional
 from app.config import settings
+from app.services.email_outbox_service import enqueue_email
+
+logger = logging.getLogger(__name__)
 
 
 class EmailService:
@@ -13,41 +14,22 @@ class EmailService:
         self.smtp_password = settings.smtp_password
         self.smtp_from = settings.smtp_from
 
-    def send_email(self, to_email: str, subject: str, html_content: str) -> bool:
-        """Send email via SMTP"""
+    def send_email(self, to_email: str, subject: str, html_content: str,
+                   reference_type: Optional[str] = None) -> bool:
+        """Adicionar email à fila de envio (ver app.services.email_outbox_service)"""
         
-        # Verificar se todas as configurações SMTP estão disponíveis
-        if not all([self.smtp_host, self.smtp_port, self.smtp_username, self.smtp_password]):
-            print("Erro: Configurações SMTP incompletas")
-            print(f"SMTP_HOST: {self.smtp_host}")
-            print(f"SMTP_PORT: {self.smtp_port}")
-            print(f"SMTP_USERNAME: {self.smtp_username}")
-            print(f"SMTP_PASSWORD: {'*' * len(self.smtp_password) if self.smtp_password else 'None'}")
+        # Sem servidor SMTP o worker da fila não roda
+        if not self.smtp_host:
+            logger.error("SMTP_HOST não configurado")
             return False
         
         try:
-            print(f"Enviando email para: {to_email}")
-            print(f"Usando SMTP: {self.smtp_host}:{self.smtp_port}")
-            
-            msg = MIMEMultipart()
-            msg['From'] = self.smtp_from
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(html_content, 'html'))
-            
-            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
-            server.starttls()
-            server.login(self.smtp_username, self.smtp_password)
-            server.sendmail(self.smtp_from, [to_email], msg.as_string())
-            server.quit()
-            
-            print(f"Email enviado com sucesso para: {to_email}")
+            job_id = enqueue_email(to_email, subject, html_content, reference_type=reference_type)
+            logger.info(f"Email para {to_email} adicionado à fila: {job_id}")
             return True
             
         except Exception as e:
-            print(f"Erro ao enviar email: {str(e)}")
-            print(f"Tipo do erro: {type(e).__name__}")
+            logger.error(f"Erro ao enfileirar email ({type(e).__name__}): {e}")
             return False
 
     def send_password_reset_email(self, to_email: str, reset_link: str) -> bool:
@@ -130,7 +112,7 @@ class EmailService:
         </html>
         """
         
-        return self.send_email(to_email, subject, html_content)
+        return self.send_email(to_email, subject, html_content, reference_type='password_reset')
 
 
 email_service = EmailService()
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+Serviço de numeração de documentos baseado em sequences do PostgreSQL
+
+Cada tipo de documento tem sua própria sequence (criada em
+migrations/027_create_document_sequences.sql), então gerar o próximo número
+é O(1) e não colide entre vendas concorrentes.
+"""
+from enum import Enum
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+class DocumentType(str, Enum):
+    SALE = "sale"
+    QUICK_SALE = "quick_sale"
+    SALE_ORDER = "sale_order"
+    PURCHASE_ORDER = "purchase_order"
+    STOCK_ENTRY = "stock_entry"
+    ACCOUNT_PAYABLE = "account_payable"
+
+
+# tipo de documento -> (sequence, prefixo)
+DOCUMENT_SEQUENCES = {
+    DocumentType.SALE: ("seq_numero_venda", "VND"),
+    DocumentType.QUICK_SALE: ("seq_numero_venda_rapida", "QS"),
+    DocumentType.SALE_ORDER: ("seq_numero_pedido_venda", "PV"),
+    DocumentType.PURCHASE_ORDER: ("seq_numero_pedido_compra", "PED"),
+    DocumentType.STOCK_ENTRY: ("seq_numero_entrada", "ENT"),
+    DocumentType.ACCOUNT_PAYABLE: ("seq_numero_conta", "CP"),
+}
+
+NUMBER_DIGITS = 6
+
+
+class NumberingService:
+    """
+    Serviço para gerar números sequenciais de documentos
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def next_number(self, document_type: DocumentType) -> str:
+        """Reserva o próximo número do documento (ex.: VND000123)"""
+        sequence, prefix = DOCUMENT_SEQUENCES[document_type]
+        value = self.db.execute(text(f"SELECT nextval('{sequence}')")).scalar()
+        return format_document_number(prefix, value)
+
+
+def format_document_number(prefix: str, value: int) -> str:
+    """Formata o número com zeros à esquerda (PV000001, PV000002, etc.)"""
+    return f"{prefix}{value:0{NUMBER_DIGITS}d}"
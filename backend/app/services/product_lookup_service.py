@@ -0,0 +1,115 @@
+"""
+Índice em memória de produtos ativos por EAN/GTIN e SKU para leitura de código de barras
+
+O índice guarda o payload de venda já montado, então uma leitura no caixa é
+só um acesso a dict. O router de produtos atualiza o índice a cada criação,
+edição ou troca de status; uma tarefa em segundo plano (app.main) recarrega
+o índice completo a cada ``max_age_seconds`` fora do event loop, cobrindo
+alterações feitas por outros processos/workers. O estoque muda a cada venda,
+então não é servido do índice: o router lê o saldo atual na hora da leitura.
+"""
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session, joinedload
+
+from app.models.product import Product
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_code(code: Optional[str]) -> Optional[str]:
+    """Códigos são comparados sem espaços e sem diferenciar maiúsculas"""
+    if code is None:
+        return None
+    code = code.strip().lower()
+    return code or None
+
+
+class ProductLookupIndex:
+    """Índice código -> payload de venda, seguro entre threads"""
+
+    def __init__(self, payload_builder: Callable[[Product], Dict[str, Any]],
+                 max_age_seconds: float = 300):
+        self.payload_builder = payload_builder
+        self.max_age_seconds = max_age_seconds
+        self._by_code: Dict[str, Dict[str, Any]] = {}
+        self._codes_by_product: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def load(self, db: Session) -> int:
+        """Recarrega o índice completo com uma única consulta"""
+        products = db.query(Product).options(joinedload(Product.category)).filter(
+            Product.is_active == True
+        ).all()
+
+        by_code: Dict[str, Dict[str, Any]] = {}
+        codes_by_product: Dict[str, List[str]] = {}
+        for product in products:
+            payload = self.payload_builder(product)
+            codes = self._codes_for(product)
+            for code in codes:
+                by_code[code] = payload
+            codes_by_product[str(product.id)] = codes
+
+        with self._lock:
+            self._by_code = by_code
+            self._codes_by_product = codes_by_product
+            self._loaded_at = time.monotonic()
+
+        logger.info(f"Índice de códigos de barras carregado: {len(products)} produtos")
+        return len(products)
+
+    def ensure_loaded(self, db: Session) -> None:
+        """Carga inicial sob demanda (se o startup não conseguiu carregar)"""
+        if not self.is_loaded:
+            self.load(db)
+
+    def refresh_product(self, product: Product) -> None:
+        """Atualiza (ou remove, se inativo) as entradas de um produto"""
+        payload = self.payload_builder(product) if product.is_active else None
+        codes = self._codes_for(product) if payload else []
+        product_id = str(product.id)
+
+        with self._lock:
+            for code in self._codes_by_product.pop(product_id, []):
+                if self._by_code.get(code, {}).get("id") == product_id:
+                    del self._by_code[code]
+            for code in codes:
+                self._by_code[code] = payload
+            if codes:
+                self._codes_by_product[product_id] = codes
+
+    def remove_product(self, product_id) -> None:
+        product_id = str(product_id)
+        with self._lock:
+            for code in self._codes_by_product.pop(product_id, []):
+                if self._by_code.get(code, {}).get("id") == product_id:
+                    del self._by_code[code]
+
+    def lookup(self, code: str) -> Optional[Dict[str, Any]]:
+        return self._by_code.get(normalize_code(code))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "products": len(self._codes_by_product),
+                "codes": len(self._by_code),
+                "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            }
+
+    @staticmethod
+    def _codes_for(product: Product) -> List[str]:
+        codes = []
+        for code in (product.ean_gtin, product.sku):
+            normalized = normalize_code(code)
+            if normalized and normalized not in codes:
+                codes.append(normalized)
+        return codes
@@ -0,0 +1,98 @@
+"""
+Busca de produtos para o modal F2 usando índices trigram (pg_trgm) e unaccent
+
+As expressões f_unaccent(lower(coluna)) são as mesmas dos índices GIN criados
+na migration 010_add_product_search_indexes, então as buscas por substring
+usam índice em vez de varrer a tabela de produtos.
+"""
+from typing import List, Dict, Any
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+
+
+def escape_like(term: str) -> str:
+    """Escapa curingas do LIKE digitados pelo usuário"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def normalized(expression):
+    """Expressão normalizada (minúsculas, sem acento) igual à dos índices trigram"""
+    return func.f_unaccent(func.lower(expression))
+
+
+def product_text_filter(search: str):
+    """Filtro ORM por nome, SKU ou descrição que aproveita os índices trigram"""
+    raw_pattern = f"%{escape_like(search.strip())}%"
+    pattern = normalized(raw_pattern)
+    return or_(
+        normalized(Product.name).like(pattern, escape='\\'),
+        func.lower(Product.sku).like(func.lower(raw_pattern), escape='\\'),
+        normalized(Product.description).like(pattern, escape='\\')
+    )
+
+
+# Padrões derivados só dos parâmetros, para o planner usar os índices GIN
+PRODUCT_SEARCH_SQL = text("""
+    SELECT
+        p.id, p.sku, p.ean_gtin, p.name, p.sale_price,
+        p.stock_quantity, p.min_stock, p.unit,
+        c.name AS category_name,
+        (lower(p.sku) = lower(:term) OR p.ean_gtin = :term) AS exact_match,
+        similarity(f_unaccent(lower(p.name)), f_unaccent(lower(:term))) AS score
+    FROM products p
+    LEFT JOIN categories c ON c.id = p.category_id
+    WHERE p.is_active = true
+      AND (
+            lower(p.sku) = lower(:term)
+         OR p.ean_gtin = :term
+         OR f_unaccent(lower(p.name)) LIKE '%' || f_unaccent(lower(:pattern)) || '%' ESCAPE '\\'
+         OR f_unaccent(lower(p.name)) % f_unaccent(lower(:term))
+         OR lower(p.sku) LIKE '%' || lower(:pattern) || '%' ESCAPE '\\'
+         OR f_unaccent(lower(p.description)) LIKE '%' || f_unaccent(lower(:pattern)) || '%' ESCAPE '\\'
+      )
+    ORDER BY
+        exact_match DESC,
+        (f_unaccent(lower(p.name)) LIKE f_unaccent(lower(:pattern)) || '%' ESCAPE '\\') DESC,
+        score DESC,
+        p.name
+    LIMIT :limit
+""")
+
+
+class ProductSearchService:
+    """
+    Serviço de busca textual de produtos com ranking por similaridade
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def search(self, term: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """SKU/EAN exatos primeiro, depois prefixo do nome e similaridade trigram"""
+        term = term.strip()
+        if not term:
+            return []
+
+        rows = self.db.execute(
+            PRODUCT_SEARCH_SQL,
+            {"term": term, "pattern": escape_like(term), "limit": limit}
+        ).mappings().all()
+
+        return [
+            {
+                "id": str(row["id"]),
+                "sku": row["sku"],
+                "barcode": row["ean_gtin"],
+                "name": row["name"],
+                "sale_price": float(row["sale_price"]) if row["sale_price"] else 0,
+                "stock_quantity": row["stock_quantity"] or 0,
+                "min_stock": row["min_stock"] or 0,
+                "unit": row["unit"] or "UN",
+                "category_name": row["category_name"],
+                "exact_match": row["exact_match"],
+                "score": round(float(row["score"] or 0), 4),
+            }
+            for row in rows
+        ]
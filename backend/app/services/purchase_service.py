@@ -10,20 +10,11 @@ import json
 import base64
 
 from app.database.connection import get_db_connection
+from app.database.executor import run_in_db_executor, run_in_thread
 from app.models.response import APIResponse
+from app.core.pagination import keyset_sql, trim_page
 from app.config import settings
 
-# Imports para email - usando smtplib síncrono que funciona melhor no FastAPI
-try:
-    import smtplib
-    import threading
-    from email.mime.text import MIMEText
-    from email.mime.multipart import MIMEMultipart
-    from email.mime.application import MIMEApplication
-    EMAIL_AVAILABLE = True
-except ImportError:
-    EMAIL_AVAILABLE = False
-
 # Importações para PDF
 REPORTLAB_AVAILABLE = True  # Assumir que está disponível
 
@@ -55,7 +46,8 @@ class PurchaseService:
     
     # ===== FORNECEDORES =====
     
-    async def get_suppliers(self, filters: Dict[str, Any] = None) -> APIResponse:
+    @run_in_db_executor
+    def get_suppliers(self, filters: Dict[str, Any] = None) -> APIResponse:
         """Buscar lista de fornecedores do sistema unificado"""
         try:
             conn = get_db_connection()
@@ -127,7 +119,8 @@ class PurchaseService:
             if 'conn' in locals():
                 conn.close()
     
-    async def update_supplier_data(self, supplier_id: UUID, supplier_data: Dict[str, Any]) -> APIResponse:
+    @run_in_db_executor
+    def update_supplier_data(self, supplier_id: UUID, supplier_data: Dict[str, Any]) -> APIResponse:
         """Atualizar dados específicos do fornecedor no sistema unificado"""
         try:
             conn = get_db_connection()
@@ -198,7 +191,8 @@ class PurchaseService:
     
     # ===== PEDIDOS DE COMPRA =====
     
-    async def create_purchase_order(self, order_data: Dict[str, Any], user_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def create_purchase_order(self, order_data: Dict[str, Any], user_id: UUID) -> APIResponse:
         """Criar novo pedido de compra"""
         try:
             logger.info(f"Dados do pedido recebidos: {order_data}")
@@ -303,8 +297,14 @@ class PurchaseService:
             cursor.close()
             conn.close()
     
-    async def get_purchase_orders(self, filters: Dict[str, Any] = None) -> APIResponse:
+    @run_in_db_executor
+    def get_purchase_orders(self, filters: Dict[str, Any] = None) -> APIResponse:
         """Buscar pedidos de compra"""
+        # Cursor (data do pedido, id): páginas profundas sem OFFSET
+        after_condition, order_by, after_params = keyset_sql(
+            "pc.data_pedido", "pc.id", True, (filters or {}).get('after')
+        )
+        
         try:
             conn = get_db_connection()
             cursor = conn.cursor()
@@ -331,6 +331,10 @@ class PurchaseService:
                 where_conditions.append("pc.data_pedido <= %s")
                 params.append(filters['date_to'])
             
+            if after_condition:
+                where_conditions.append(after_condition)
+                params.extend(after_params)
+            
             where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
             
             query = f"""
@@ -344,16 +348,16 @@ class PurchaseService:
                 JOIN pessoas p ON pc.supplier_id = p.id
                 LEFT JOIN users u ON pc.user_id = u.id
                 {where_clause}
-                ORDER BY pc.data_pedido DESC
+                ORDER BY {order_by}
                 LIMIT %s OFFSET %s
             """
             
             limit = min(filters.get('limit', 50), 200)
-            offset = filters.get('offset', 0)
-            params.extend([limit, offset])
+            offset = 0 if after_condition else filters.get('offset', 0)
+            params.extend([limit + 1, offset])
             
             cursor.execute(query, params)
-            orders = cursor.fetchall()
+            orders, next_cursor = trim_page(cursor.fetchall(), limit, 4, 0)
             
             result = []
             for order in orders:
@@ -373,7 +377,8 @@ class PurchaseService:
             return APIResponse(
                 success=True,
                 data=result,
-                message=f"{len(result)} pedidos encontrados"
+                message=f"{len(result)} pedidos encontrados",
+                next_cursor=next_cursor
             )
             
         except Exception as e:
@@ -386,7 +391,8 @@ class PurchaseService:
             cursor.close()
             conn.close()
     
-    async def get_purchase_order_details(self, order_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def get_purchase_order_details(self, order_id: UUID) -> APIResponse:
         """Buscar detalhes completos de um pedido"""
         try:
             conn = get_db_connection()
@@ -502,7 +508,8 @@ class PurchaseService:
             cursor.close()
             conn.close()
     
-    async def update_purchase_order(self, order_id: UUID, order_data: Dict[str, Any], user_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def update_purchase_order(self, order_id: UUID, order_data: Dict[str, Any], user_id: UUID) -> APIResponse:
         """Atualizar pedido de compra"""
         try:
             logger.error(f"=== SERVICE: INICIANDO ATUALIZAÇÃO DO PEDIDO {order_id} ===")
@@ -626,7 +633,8 @@ class PurchaseService:
             cursor.close()
             conn.close()
 
-    async def update_purchase_order_status(self, order_id: UUID, new_status: str, user_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def update_purchase_order_status(self, order_id: UUID, new_status: str, user_id: UUID) -> APIResponse:
         """Atualizar status do pedido de compra"""
         try:
             import logging
@@ -671,7 +679,8 @@ class PurchaseService:
             cursor.close()
             conn.close()
 
-    async def delete_purchase_order(self, order_id: UUID, user_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def delete_purchase_order(self, order_id: UUID, user_id: UUID) -> APIResponse:
         """Excluir pedido de compra"""
         try:
             conn = get_db_connection()
@@ -715,7 +724,8 @@ class PurchaseService:
             cursor.close()
             conn.close()
 
-    async def generate_purchase_order_pdf(self, order_data: Dict[str, Any]) -> bytes:
+    @run_in_thread
+    def generate_purchase_order_pdf(self, order_data: Dict[str, Any]) -> bytes:
         """Gerar PDF do pedido de compra"""
         try:
             logger.error(f"🔥 GERANDO PDF - DADOS: {order_data.get('order_number', 'N/A')}")
@@ -817,21 +827,75 @@ class PurchaseService:
             logger.warning(f"Erro ao formatar data '{date_str}': {e}")
             return str(date_str) if date_str else 'N/A'
     
-    async def send_order_by_email(self, order_id: UUID, email: str) -> APIResponse:
-        """Enviar pedido por email usando SMTP síncrono em thread"""
-        from app.config import settings
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
+    def _build_order_email_html(self, order_number: str, supplier_name: str, items: List[Dict[str, Any]]) -> str:
+        """Corpo HTML da solicitação de cotação enviada ao fornecedor"""
+        items_html = ""
+        for item in items:
+            product_name = item.get('product', {}).get('name', 'Item')
+            quantity = item.get('quantities', {}).get('ordered', 0)
+            notes = item.get('notes', '-')
+            
+            items_html += f"""
+            <tr style="border: 1px solid #ddd;">
+                <td style="padding: 8px;">{product_name}</td>
+                <td style="padding: 8px; text-align: center;">{quantity}</td>
+                <td style="padding: 8px;">{notes}</td>
+            </tr>
+            """
         
-        logger.error(f"📧 INICIANDO ENVIO EMAIL para {email}")
+        # Corpo HTML do email
+        html_body = f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; margin: 20px;">
+            <h2 style="color: #2196F3;">Pedido de Compra #{order_number}</h2>
+            
+            <p>Prezado(a) <strong>{supplier_name}</strong>,</p>
+            
+            <p>Solicitamos cotação para os itens relacionados abaixo. Por favor, nos informe preços, prazos de entrega e condições de pagamento.</p>
+            
+            <h3>Itens para Cotação:</h3>
+            <table style="border-collapse: collapse; width: 100%; margin: 20px 0; border: 1px solid #ddd;">
+                <thead>
+                    <tr style="background-color: #f5f5f5;">
+                        <th style="padding: 12px; border: 1px solid #ddd;">Produto</th>
+                        <th style="padding: 12px; border: 1px solid #ddd;">Quantidade</th>
+                        <th style="padding: 12px; border: 1px solid #ddd;">Observações</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {items_html}
+                </tbody>
+            </table>
+            
+            <p><strong>Aguardamos sua cotação com:</strong></p>
+            <ul>
+                <li>Preços unitários para cada item</li>
+                <li>Prazo de entrega</li>
+                <li>Condições de pagamento</li>
+                <li>Validade da proposta</li>
+            </ul>
+            
+            <hr style="margin: 30px 0;">
+            <p style="font-size: 12px; color: #666;">
+                Este email foi enviado automaticamente pelo Sistema ERP.<br>
+                Em caso de dúvidas, entre em contato conosco.
+            </p>
+        </body>
+        </html>
+        """
         
-        if not EMAIL_AVAILABLE:
-            logger.error("❌ Bibliotecas de email não disponíveis")
-            return APIResponse(
-                success=True,
-                message=f"Email simulado (bibliotecas não disponíveis): {email}",
-                data={"email": email, "simulated": True}
-            )
+        return html_body
+    
+    async def send_order_by_email(self, order_id: UUID, email: str) -> APIResponse:
+        """
+        Enfileirar o pedido para envio por email e retornar o id do envio.
+        O envio (com retentativas) é feito pelo worker da fila de emails;
+        o status pode ser consultado com EmailOutboxService.get_job.
+        """
+        from app.services.email_outbox_service import EmailOutboxService
+        
+        if not settings.smtp_host:
+            return APIResponse(success=False, message="⚠️ SMTP não configurado no .env")
         
         try:
             # Buscar dados do pedido
@@ -843,313 +907,45 @@ class PurchaseService:
             order_number = order_data.get('order_number', 'N/A')
             supplier_info = order_data.get('supplier', {})
             supplier_name = supplier_info.get('name', 'N/A')
-            values = order_data.get('values', {})
-            total = values.get('total', 0)
             items = order_data.get('items', [])
             
             # Gerar PDF primeiro
             pdf_content = None
             try:
                 pdf_content = await self._generate_order_pdf(order_data)
-                if pdf_content:
-                    logger.error("📎 PDF gerado com sucesso!")
             except Exception as pdf_error:
                 logger.error(f"⚠️ Erro ao gerar PDF: {pdf_error}")
             
-            # Função síncrona para enviar email em thread separada
-            def send_email_sync():
-                try:
-                    # Usar configurações do .env via settings
-                    smtp_host = settings.smtp_host
-                    smtp_port = settings.smtp_port
-                    smtp_username = settings.smtp_username
-                    smtp_password = settings.smtp_password
-                    smtp_from = settings.smtp_from
-                    
-                    # Verificar se as credenciais estão configuradas
-                    if not smtp_host or not smtp_username or not smtp_password:
-                        return False, "⚠️ SMTP não configurado no .env"
-                    
-                    # Criar conteúdo do email
-                    items_html = ""
-                    for item in items:
-                        product_name = item.get('product', {}).get('name', 'Item')
-                        quantity = item.get('quantities', {}).get('ordered', 0)
-                        notes = item.get('notes', '-')
-                        
-                        items_html += f"""
-                        <tr style="border: 1px solid #ddd;">
-                            <td style="padding: 8px;">{product_name}</td>
-                            <td style="padding: 8px; text-align: center;">{quantity}</td>
-                            <td style="padding: 8px;">{notes}</td>
-                        </tr>
-                        """
-                    
-                    # Corpo HTML do email
-                    html_body = f"""
-                    <html>
-                    <body style="font-family: Arial, sans-serif; margin: 20px;">
-                        <h2 style="color: #2196F3;">Pedido de Compra #{order_number}</h2>
-                        
-                        <p>Prezado(a) <strong>{supplier_name}</strong>,</p>
-                        
-                        <p>Solicitamos cotação para os itens relacionados abaixo. Por favor, nos informe preços, prazos de entrega e condições de pagamento.</p>
-                        
-                        <h3>Itens para Cotação:</h3>
-                        <table style="border-collapse: collapse; width: 100%; margin: 20px 0; border: 1px solid #ddd;">
-                            <thead>
-                                <tr style="background-color: #f5f5f5;">
-                                    <th style="padding: 12px; border: 1px solid #ddd;">Produto</th>
-                                    <th style="padding: 12px; border: 1px solid #ddd;">Quantidade</th>
-                                    <th style="padding: 12px; border: 1px solid #ddd;">Observações</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-                                {items_html}
-                            </tbody>
-                        </table>
-                        
-                        <p><strong>Aguardamos sua cotação com:</strong></p>
-                        <ul>
-                            <li>Preços unitários para cada item</li>
-                            <li>Prazo de entrega</li>
-                            <li>Condições de pagamento</li>
-                            <li>Validade da proposta</li>
-                        </ul>
-                        
-                        <hr style="margin: 30px 0;">
-                        <p style="font-size: 12px; color: #666;">
-                            Este email foi enviado automaticamente pelo Sistema ERP.<br>
-                            Em caso de dúvidas, entre em contato conosco.
-                        </p>
-                    </body>
-                    </html>
-                    """
-                    
-                    # Criar mensagem
-                    msg = MIMEMultipart()
-                    msg['From'] = smtp_from
-                    msg['To'] = email
-                    msg['Subject'] = f"Solicitação de Cotação #{order_number} - {supplier_name}"
-                    
-                    # Anexar corpo HTML
-                    msg.attach(MIMEText(html_body, 'html', 'utf-8'))
-                    
-                    # Anexar PDF se disponível
-                    if pdf_content:
-                        pdf_attachment = MIMEApplication(pdf_content, _subtype='pdf')
-                        pdf_attachment.add_header(
-                            'Content-Disposition', 
-                            'attachment', 
-                            filename=f'solicitacao-cotacao-{order_number}.pdf'
-                        )
-                        msg.attach(pdf_attachment)
-                    
-                    # Enviar usando smtplib síncrono
-                    server = smtplib.SMTP(smtp_host, smtp_port)
-                    server.starttls()
-                    server.login(smtp_username, smtp_password)
-                    
-                    text = msg.as_string()
-                    server.sendmail(smtp_from, [email], text)
-                    server.quit()
-                    
-                    return True, "Email enviado com sucesso!"
-                    
-                except Exception as e:
-                    error_msg = str(e)
-                    logger.error(f"💥 Erro no envio síncrono: {e}")
-                    
-                    # Mensagens específicas para erros comuns
-                    if "Username and Password not accepted" in error_msg:
-                        return False, "❌ Credenciais Gmail inválidas! Para corrigir:\n1. Acesse https://myaccount.google.com/security\n2. Ative 'Verificação em 2 etapas'\n3. Vá em 'Senhas de app'\n4. Gere nova senha para 'Mail'\n5. Substitua SMTP_PASSWORD no .env pela nova senha"
-                    elif "Connection timed out" in error_msg:
-                        return False, "⏰ Timeout na conexão SMTP. Verifique firewall/proxy."
-                    else:
-                        return False, f"Erro SMTP: {error_msg}"
-            
-            # Executar envio em thread para não bloquear o FastAPI
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                success, message = await loop.run_in_executor(executor, send_email_sync)
-            
-            if success:
-                logger.error(f"✅ EMAIL enviado com sucesso para {email}")
-                return APIResponse(
-                    success=True, 
-                    message=f"Email enviado com sucesso para {email}",
-                    data={
-                        "email": email, 
-                        "order_number": order_number,
-                        "pdf_attached": bool(pdf_content),
-                        "real_email": True
-                    }
-                )
-            else:
-                logger.error(f"❌ Erro no envio: {message}")
-                return APIResponse(success=False, message=f"Erro no envio: {message}")
-            
-        except Exception as e:
-            logger.error(f"💥 ERRO geral no envio de email: {str(e)}", exc_info=True)
-            return APIResponse(success=False, message=f"Erro no serviço de email: {str(e)}")
-    
-    async def _send_real_email_OLD(self, order_id: UUID, email: str, settings) -> APIResponse:
-        """Enviar email real usando aiosmtplib"""
-        try:
-            import aiosmtplib
-            from email.mime.text import MIMEText
-            from email.mime.multipart import MIMEMultipart
-            from email.mime.application import MIMEApplication
-            
-            logger.error(f"📧 ENVIANDO EMAIL REAL para {email}")
-            
-            # Buscar dados do pedido
-            order_response = await self.get_purchase_order_details(order_id)
-            if not order_response.success:
-                return APIResponse(success=False, message="Pedido não encontrado")
-            
-            order_data = order_response.data
-            order_number = order_data.get('order_number', 'N/A')
-            supplier_info = order_data.get('supplier', {})
-            supplier_name = supplier_info.get('name', 'N/A')
-            values = order_data.get('values', {})
-            total = values.get('total', 0)
-            items = order_data.get('items', [])
-            
-            # Criar conteúdo HTML do email
-            items_html = ""
-            for item in items:
-                product_name = item.get('product', {}).get('name', 'Item')
-                quantity = item.get('quantities', {}).get('ordered', 0)
-                notes = item.get('notes', '-')
-                
-                items_html += f"""
-                <tr>
-                    <td style="padding: 8px; border: 1px solid #ddd;">{product_name}</td>
-                    <td style="padding: 8px; border: 1px solid #ddd; text-align: center;">{quantity}</td>
-                    <td style="padding: 8px; border: 1px solid #ddd;">{notes}</td>
-                </tr>
-                """
-            
-            html_body = f"""
-            <html>
-            <body style="font-family: Arial, sans-serif; margin: 20px;">
-                <h2 style="color: #2196F3;">Solicitação de Cotação #{order_number}</h2>
-                
-                <p>Prezado(a) <strong>{supplier_name}</strong>,</p>
-                
-                <p>Segue anexo nossa solicitação de cotação para os itens relacionados abaixo.</p>
-                
-                <h3>Itens para Cotação:</h3>
-                <table style="border-collapse: collapse; width: 100%; margin: 20px 0;">
-                    <thead>
-                        <tr style="background-color: #f5f5f5;">
-                            <th style="padding: 12px; border: 1px solid #ddd; text-align: left;">Produto</th>
-                            <th style="padding: 12px; border: 1px solid #ddd; text-align: center;">Quantidade</th>
-                            <th style="padding: 12px; border: 1px solid #ddd; text-align: left;">Observações</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        {items_html}
-                    </tbody>
-                </table>
-                
-                <p><strong>Por favor, nos envie sua cotação com:</strong></p>
-                <ul>
-                    <li>Preços unitários para cada item</li>
-                    <li>Prazos de entrega</li>
-                    <li>Condições de pagamento</li>
-                    <li>Validade da proposta</li>
-                </ul>
-                
-                <hr style="margin: 30px 0;">
-                <p style="font-size: 12px; color: #666;">
-                    Este email foi enviado automaticamente pelo Sistema ERP.<br>
-                    Em caso de dúvidas, entre em contato conosco.
-                </p>
-            </body>
-            </html>
-            """
-            
-            # Criar mensagem
-            msg = MIMEMultipart()
-            msg['From'] = settings.smtp_from
-            msg['To'] = email
-            msg['Subject'] = f"Solicitação de Cotação #{order_number} - {supplier_name}"
-            
-            # Anexar corpo HTML
-            msg.attach(MIMEText(html_body, 'html', 'utf-8'))
-            
-            # Gerar e anexar PDF
-            try:
-                pdf_content = await self._generate_order_pdf(order_data)
-                if pdf_content:
-                    pdf_attachment = MIMEApplication(pdf_content, _subtype='pdf')
-                    pdf_attachment.add_header(
-                        'Content-Disposition', 
-                        'attachment', 
-                        filename=f'solicitacao-cotacao-{order_number}.pdf'
-                    )
-                    msg.attach(pdf_attachment)
-                    logger.error("📎 PDF anexado ao email!")
-            except Exception as pdf_error:
-                logger.error(f"⚠️ Erro ao anexar PDF: {pdf_error}")
-            
-            # Configurações SMTP
-            smtp_kwargs = {
-                'hostname': settings.smtp_host,
-                'port': settings.smtp_port,
-                'start_tls': True,
-                'username': settings.smtp_username,
-                'password': settings.smtp_password,
-                'timeout': 30
-            }
-            
-            logger.error(f"📤 Enviando email via SMTP: {settings.smtp_host}:{settings.smtp_port}")
-            
-            # Enviar email
-            await aiosmtplib.send(msg, **smtp_kwargs)
+            result = await EmailOutboxService().enqueue(
+                to_email=email,
+                subject=f"Solicitação de Cotação #{order_number} - {supplier_name}",
+                html_body=self._build_order_email_html(order_number, supplier_name, items),
+                attachment=pdf_content or None,
+                attachment_name=f'solicitacao-cotacao-{order_number}.pdf' if pdf_content else None,
+                reference_type='purchase_order',
+                reference_id=order_id
+            )
+            if not result.success:
+                return result
             
-            logger.error(f"✅ EMAIL REAL enviado com sucesso para {email}")
             return APIResponse(
-                success=True, 
-                message=f"Email enviado com sucesso para {email}",
+                success=True,
+                message=f"Email para {email} adicionado à fila de envio",
                 data={
-                    "email": email, 
+                    "job_id": result.data['id'],
+                    "status": result.data['status'],
+                    "email": email,
                     "order_number": order_number,
-                    "pdf_attached": True,
-                    "real_email": True
+                    "pdf_attached": bool(pdf_content)
                 }
             )
             
         except Exception as e:
-            logger.error(f"💥 ERRO ao enviar email real: {str(e)}", exc_info=True)
-            # Se falhar, usar fallback simulado
-            logger.error("⚠️ Fallback para simulação...")
-            
-            order_response = await self.get_purchase_order_details(order_id)
-            if order_response.success:
-                order_data = order_response.data
-                order_number = order_data.get('order_number', 'N/A')
-                pdf_content = await self._generate_order_pdf(order_data)
-                pdf_size = len(pdf_content) if pdf_content else 0
-                
-                return APIResponse(
-                    success=True,
-                    message=f"Email simulado (erro SMTP): {str(e)[:100]}... - Pedido #{order_number}",
-                    data={
-                        "email": email,
-                        "order_number": order_number,
-                        "pdf_size": pdf_size,
-                        "simulated": True,
-                        "smtp_error": str(e)
-                    }
-                )
-            else:
-                return APIResponse(success=False, message=f"Erro SMTP e pedido não encontrado: {str(e)}")
-    
+            logger.error(f"💥 ERRO geral no envio de email: {str(e)}", exc_info=True)
+            return APIResponse(success=False, message=f"Erro no serviço de email: {str(e)}")
     
-    async def _generate_order_pdf(self, order_data: dict) -> bytes:
+    @run_in_thread
+    def _generate_order_pdf(self, order_data: dict) -> bytes:
         """Gerar PDF do pedido de compra"""
         try:
             import logging
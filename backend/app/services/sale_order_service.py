@@ -1,14 +1,23 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from decimal import Decimal
 from datetime import datetime
 from app.models.sale_order import SaleOrder, SaleOrderItem, SaleOrderStatus
-from app.models.product import Product
 from app.models.client import Client
 from app.schemas.sale_order import SaleOrderCreate, SaleOrderUpdate, SaleOrderStatusUpdate
 from app.services.tax_calculator import TaxCalculatorService
+from app.services.numbering_service import NumberingService, DocumentType
+from app.services.cart_service import CartService
+from app.core.pagination import keyset_page
 from fastapi import HTTPException
+from app.core.cache import get_cache
+from app.config import settings
+
+
+# Estatísticas de /sale-orders/stats/summary (consultadas pelo dashboard em polling).
+# Expiram pelo TTL e são descartadas a cada pedido criado, alterado ou excluído neste processo.
+order_stats_cache = get_cache("sale_order_stats", ttl_seconds=settings.sale_order_stats_ttl_seconds, max_size=1)
 
 
 class SaleOrderService:
@@ -55,21 +64,18 @@ class SaleOrderService:
         total_pis = Decimal('0')
         total_cofins = Decimal('0')
         
+        # Verificar existência, status e estoque de todos os produtos com uma consulta
+        cart = CartService(self.db)
+        products = cart.load_products(item.product_id for item in order_data.items)
+        cart.check_active(products)
+        cart.check_stock(
+            ((item.product_id, item.quantity) for item in order_data.items),
+            products, show_available=True
+        )
+        
+        order_items = []
         for item_data in order_data.items:
-            # Verificar se produto existe e tem estoque
-            product = self.db.query(Product).filter(Product.id == item_data.product_id).first()
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Produto {item_data.product_id} não encontrado")
-            
-            if not product.is_active:
-                raise HTTPException(status_code=400, detail=f"Produto {product.name} está inativo")
-            
-            # Verificar estoque disponível
-            if product.stock_quantity < item_data.quantity:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Estoque insuficiente para {product.name}. Disponível: {product.stock_quantity}"
-                )
+            product = products[item_data.product_id]
             
             # Calcular valores do item
             gross_total = item_data.quantity * item_data.unit_price
@@ -86,7 +92,7 @@ class SaleOrderService:
             )
             
             # Criar item do pedido
-            order_item = SaleOrderItem(
+            order_items.append(SaleOrderItem(
                 sale_order_id=sale_order.id,
                 product_id=item_data.product_id,
                 quantity=item_data.quantity,
@@ -101,9 +107,7 @@ class SaleOrderService:
                 icms_amount=tax_calc.icms_amount,
                 pis_amount=tax_calc.pis_amount,
                 cofins_amount=tax_calc.cofins_amount
-            )
-            
-            self.db.add(order_item)
+            ))
             
             # Somar aos totais
             subtotal += net_total
@@ -111,6 +115,8 @@ class SaleOrderService:
             total_pis += tax_calc.pis_amount
             total_cofins += tax_calc.cofins_amount
         
+        self.db.add_all(order_items)
+        
         # Aplicar desconto geral se houver
         if order_data.discount_percent and order_data.discount_percent > 0:
             additional_discount = subtotal * (order_data.discount_percent / Decimal('100'))
@@ -128,6 +134,7 @@ class SaleOrderService:
         sale_order.total_amount = total_amount
         
         self.db.commit()
+        order_stats_cache.clear()
         self.db.refresh(sale_order)
         
         return sale_order
@@ -148,7 +155,45 @@ class SaleOrderService:
     ) -> List[SaleOrder]:
         """Lista pedidos com filtros"""
         
-        query = self.db.query(SaleOrder).filter(SaleOrder.is_active == True)
+        query = self._filter_orders(self.db.query(SaleOrder), status, client_id, search)
+        return query.order_by(SaleOrder.created_at.desc()).offset(skip).limit(limit).all()
+    
+    def get_order_summaries(
+        self, 
+        skip: int = 0, 
+        limit: int = 100,
+        status: Optional[SaleOrderStatus] = None,
+        client_id: Optional[str] = None,
+        search: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Tuple[List[tuple], Optional[str]]:
+        """
+        Lista pedidos para a listagem em uma única consulta:
+        (pedido, nome do cliente, documento do cliente, quantidade de itens),
+        junto com o cursor da próxima página
+        """
+        
+        items_count = self.db.query(
+            SaleOrderItem.sale_order_id.label("sale_order_id"),
+            func.count(SaleOrderItem.id).label("items_count")
+        ).group_by(SaleOrderItem.sale_order_id).subquery()
+        
+        query = self.db.query(
+            SaleOrder,
+            Client.name.label("client_name"),
+            Client.document.label("client_document"),
+            func.coalesce(items_count.c.items_count, 0).label("items_count")
+        ).outerjoin(
+            Client, Client.id == SaleOrder.client_id
+        ).outerjoin(
+            items_count, items_count.c.sale_order_id == SaleOrder.id
+        )
+        
+        query = self._filter_orders(query, status, client_id, search, client_joined=True)
+        return keyset_page(query, SaleOrder.created_at, SaleOrder.id, True, after, limit, skip)
+    
+    def _filter_orders(self, query, status, client_id, search, client_joined: bool = False):
+        query = query.filter(SaleOrder.is_active == True)
         
         if status:
             query = query.filter(SaleOrder.status == status)
@@ -158,13 +203,15 @@ class SaleOrderService:
         
         if search:
             search_filter = f"%{search}%"
-            query = query.join(Client).filter(
-                SaleOrder.number.ilike(search_filter) |
+            if not client_joined:
+                query = query.join(Client, Client.id == SaleOrder.client_id)
+            query = query.filter(
+                SaleOrder.order_number.ilike(search_filter) |
                 Client.name.ilike(search_filter) |
                 Client.document.ilike(search_filter)
             )
         
-        return query.order_by(SaleOrder.created_at.desc()).offset(skip).limit(limit).all()
+        return query
     
     def update_order(self, order_id: str, order_data: SaleOrderUpdate) -> SaleOrder:
         """Atualiza pedido (apenas se estiver em rascunho)"""
@@ -220,16 +267,17 @@ class SaleOrderService:
             total_pis = Decimal('0')
             total_cofins = Decimal('0')
             
+            cart = CartService(self.db)
+            products = cart.load_products(item.product_id for item in order_data.items)
+            cart.check_active(products)
+            cart.check_stock(
+                ((item.product_id, item.quantity) for item in order_data.items),
+                products, show_available=True
+            )
+            
+            order_items = []
             for item_data in order_data.items:
-                product = self.db.query(Product).filter(Product.id == item_data.product_id).first()
-                if not product:
-                    raise HTTPException(status_code=404, detail=f"Produto {item_data.product_id} não encontrado")
-                
-                if product.stock_quantity < item_data.quantity:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Estoque insuficiente para {product.name}. Disponível: {product.stock_quantity}"
-                    )
+                product = products[item_data.product_id]
                 
                 # Calcular valores e impostos (mesmo código do create)
                 gross_total = item_data.quantity * item_data.unit_price
@@ -244,7 +292,7 @@ class SaleOrderService:
                     client=client
                 )
                 
-                order_item = SaleOrderItem(
+                order_items.append(SaleOrderItem(
                     sale_order_id=order.id,
                     product_id=item_data.product_id,
                     quantity=item_data.quantity,
@@ -259,15 +307,15 @@ class SaleOrderService:
                     icms_amount=tax_calc.icms_amount,
                     pis_amount=tax_calc.pis_amount,
                     cofins_amount=tax_calc.cofins_amount
-                )
-                
-                self.db.add(order_item)
+                ))
                 
                 subtotal += net_total
                 total_icms += tax_calc.icms_amount
                 total_pis += tax_calc.pis_amount
                 total_cofins += tax_calc.cofins_amount
             
+            self.db.add_all(order_items)
+            
             # Aplicar desconto geral
             if order.discount_percent and order.discount_percent > 0:
                 additional_discount = subtotal * (order.discount_percent / Decimal('100'))
@@ -283,6 +331,7 @@ class SaleOrderService:
             order.total_amount = subtotal + tax_total
         
         self.db.commit()
+        order_stats_cache.clear()
         self.db.refresh(order)
         
         return order
@@ -316,6 +365,7 @@ class SaleOrderService:
                 self._release_stock_reservation(order)
         
         self.db.commit()
+        order_stats_cache.clear()
         self.db.refresh(order)
         
         return order
@@ -332,25 +382,13 @@ class SaleOrderService:
         
         order.is_active = False
         self.db.commit()
+        order_stats_cache.clear()
         
         return True
     
     def _generate_order_number(self) -> str:
-        """Gera número sequencial do pedido"""
-        
-        # Obter o maior número atual
-        last_order = self.db.query(SaleOrder).order_by(SaleOrder.created_at.desc()).first()
-        
-        if last_order and last_order.number.startswith('PV'):
-            try:
-                last_number = int(last_order.number[2:])  # Remove 'PV' do início
-                next_number = last_number + 1
-            except ValueError:
-                next_number = 1
-        else:
-            next_number = 1
-        
-        return f"PV{next_number:06d}"  # PV000001, PV000002, etc.
+        """Gera número sequencial do pedido (PV000001, PV000002, etc.)"""
+        return NumberingService(self.db).next_number(DocumentType.SALE_ORDER)
     
     def _is_valid_status_transition(self, current: SaleOrderStatus, new: SaleOrderStatus) -> bool:
         """Valida se a transição de status é permitida"""
@@ -373,27 +411,20 @@ class SaleOrderService:
     def _process_stock_movement(self, order: SaleOrder):
         """Processa baixa no estoque quando pedido é faturado"""
         
-        for item in order.items:
-            product = self.db.query(Product).filter(Product.id == item.product_id).first()
-            if product:
-                # Verificar se ainda tem estoque suficiente
-                if product.stock_quantity < item.quantity:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Estoque insuficiente para {product.name}. Disponível: {product.stock_quantity}"
-                    )
-                
-                # Baixar estoque
-                product.stock_quantity -= int(item.quantity)
-                
-                # TODO: Criar movimentação de estoque para auditoria
-                # stock_movement = StockMovement(
-                #     product_id=product.id,
-                #     movement_type="sale",
-                #     quantity=-item.quantity,
-                #     reference_id=order.id,
-                #     notes=f"Venda - Pedido {order.number}"
-                # )
+        # Baixa atômica de todos os itens; falha se algum não tiver saldo
+        CartService(self.db).decrement_stock_or_raise(
+            ((item.product_id, int(item.quantity)) for item in order.items if item.product_id),
+            show_available=True
+        )
+        
+        # TODO: Criar movimentação de estoque para auditoria
+        # stock_movement = StockMovement(
+        #     product_id=product.id,
+        #     movement_type="sale",
+        #     quantity=-item.quantity,
+        #     reference_id=order.id,
+        #     notes=f"Venda - Pedido {order.number}"
+        # )
         
         self.db.commit()
     
@@ -403,42 +434,43 @@ class SaleOrderService:
         pass
     
     def get_order_stats(self) -> Dict:
-        """Retorna estatísticas dos pedidos"""
-        
-        total_orders = self.db.query(func.count(SaleOrder.id)).filter(SaleOrder.is_active == True).scalar()
-        
-        total_value = self.db.query(func.sum(SaleOrder.total_amount)).filter(
-            and_(SaleOrder.is_active == True, SaleOrder.status != SaleOrderStatus.CANCELLED)
-        ).scalar() or Decimal('0')
+        """Retorna estatísticas dos pedidos (em cache por alguns segundos)"""
+        return dict(order_stats_cache.get_or_load("summary", self._load_order_stats))
+    
+    def _load_order_stats(self) -> Dict:
+        """Todas as estatísticas em uma consulta: GROUP BY status com agregados do mês via FILTER"""
         
-        # Pedidos por status
-        orders_by_status = {}
-        for status in SaleOrderStatus:
-            count = self.db.query(func.count(SaleOrder.id)).filter(
-                and_(SaleOrder.status == status, SaleOrder.is_active == True)
-            ).scalar()
+        current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        this_month = SaleOrder.created_at >= current_month
+        
+        rows = self.db.query(
+            SaleOrder.status,
+            func.count(SaleOrder.id),
+            func.sum(SaleOrder.total_amount),
+            func.count(SaleOrder.id).filter(this_month),
+            func.sum(SaleOrder.total_amount).filter(this_month)
+        ).filter(
+            SaleOrder.is_active == True
+        ).group_by(SaleOrder.status).all()
+        
+        orders_by_status = {status.value: 0 for status in SaleOrderStatus}
+        total_orders = 0
+        total_value = Decimal('0')
+        orders_this_month = 0
+        value_this_month = Decimal('0')
+        
+        for status, count, value, month_count, month_value in rows:
             orders_by_status[status.value] = count
+            total_orders += count
+            orders_this_month += month_count
+            # Valores não somam pedidos cancelados
+            if status != SaleOrderStatus.CANCELLED:
+                total_value += value or Decimal('0')
+                value_this_month += month_value or Decimal('0')
         
         # Média do valor dos pedidos
         avg_order_value = total_value / total_orders if total_orders > 0 else Decimal('0')
         
-        # Pedidos este mês
-        current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        orders_this_month = self.db.query(func.count(SaleOrder.id)).filter(
-            and_(
-                SaleOrder.created_at >= current_month,
-                SaleOrder.is_active == True
-            )
-        ).scalar()
-        
-        value_this_month = self.db.query(func.sum(SaleOrder.total_amount)).filter(
-            and_(
-                SaleOrder.created_at >= current_month,
-                SaleOrder.is_active == True,
-                SaleOrder.status != SaleOrderStatus.CANCELLED
-            )
-        ).scalar() or Decimal('0')
-        
         return {
             'total_orders': total_orders,
             'total_value': total_value,
@@ -2,23 +2,106 @@
 Serviço para gestão de estoque e movimentações
 """
 from typing import List, Optional, Dict, Any, Tuple
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from uuid import UUID, uuid4
 import logging
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 import xml.etree.ElementTree as ET
 
+from psycopg2.extras import execute_values
+
+from app.config import settings
 from app.database.connection import get_db_connection
+from app.database.executor import run_in_db_executor
 from app.models.response import APIResponse
+from app.core.pagination import keyset_sql, trim_page
 
 logger = logging.getLogger(__name__)
 
+# Insert multi-linha das movimentações de uma entrada (psycopg2 execute_values)
+ENTRY_MOVEMENTS_INSERT_SQL = """
+    INSERT INTO movimentacoes_estoque (
+        product_id, tipo_movimentacao, quantidade_anterior,
+        quantidade_movimentada, quantidade_atual,
+        custo_unitario, custo_medio_anterior, custo_medio_atual,
+        valor_total_movimentacao, entrada_estoque_id, user_id,
+        lote, data_validade, observacoes
+    ) VALUES %s
+"""
+
 class StockService:
     """Serviço para operações de estoque"""
     
+    # ===== MODO DELTA =====
+    
+    @staticmethod
+    def _stock_balance_source() -> str:
+        """
+        Origem do saldo para lançar movimentações. No modo delta o saldo é
+        base + deltas pendentes (vw_estoque_atual), lido sem travar a linha do
+        produto; fora dele, o próprio estoque_atual.
+        """
+        if settings.stock_delta_mode:
+            return "vw_estoque_atual"
+        return "estoque_atual"
+    
+    @staticmethod
+    def _lock_product_exits(cursor, product_id) -> None:
+        """
+        No modo delta, trava as saídas do produto até o fim da transação
+        (advisory lock). Sem a linha travada, duas saídas concorrentes leriam
+        o mesmo saldo da view e poderiam deixá-lo negativo; entradas não
+        travam, pois só aumentam o saldo.
+        """
+        if settings.stock_delta_mode:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(hashtext('estoque_saida:' || %s))",
+                (str(product_id),)
+            )
+    
+    @staticmethod
+    def _enable_delta_mode(cursor) -> None:
+        """Liga o modo delta do trigger até o fim da transação"""
+        if settings.stock_delta_mode:
+            cursor.execute("SELECT set_config('app.estoque_modo_delta', 'on', true)")
+    
+    @run_in_db_executor
+    def compact_stock_deltas(self, limit: int = 100000) -> APIResponse:
+        """Incorporar os deltas pendentes em estoque_atual (compactação)"""
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT compactar_estoque_deltas(%s)", (limit,))
+            compacted = cursor.fetchone()[0]
+            conn.commit()
+            
+            # Produtos que ficariam negativos continuam pendentes (migrations/034)
+            for notice in conn.notices:
+                logger.warning(notice.strip())
+            del conn.notices[:]
+            
+            return APIResponse(
+                success=True,
+                data={'compacted': compacted},
+                message=f"{compacted} deltas de estoque compactados"
+            )
+            
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Erro ao compactar deltas de estoque: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao compactar deltas de estoque: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
+    
     # ===== ENTRADAS DE ESTOQUE =====
     
-    async def create_stock_entry(self, entry_data: Dict[str, Any], user_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def create_stock_entry(self, entry_data: Dict[str, Any], user_id: UUID) -> APIResponse:
         """Criar nova entrada de estoque"""
         try:
             conn = get_db_connection()
@@ -126,7 +209,8 @@ class StockService:
             cursor.close()
             conn.close()
     
-    async def process_stock_entry(self, entry_id: UUID, user_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def process_stock_entry(self, entry_id: UUID, user_id: UUID) -> APIResponse:
         """Processar entrada de estoque (dar baixa efetiva no estoque)"""
         try:
             conn = get_db_connection()
@@ -136,6 +220,7 @@ class StockService:
             cursor.execute("""
                 SELECT id, numero_entrada, status FROM entradas_estoque 
                 WHERE id = %s
+                FOR UPDATE
             """, (entry_id,))
             
             entry = cursor.fetchone()
@@ -152,51 +237,13 @@ class StockService:
                     lote, data_validade, numero_item
                 FROM entradas_estoque_itens 
                 WHERE entrada_id = %s
+                ORDER BY numero_item
             """, (entry_id,))
             
-            items = cursor.fetchall()
+            items = [item for item in cursor.fetchall() if (item[1] or 0) > 0]
             
-            for item in items:
-                product_id = item[0]
-                quantity = item[1] or 0
-                unit_cost = item[2] or 0
-                batch = item[3]
-                expiration_date = item[4]
-                
-                if quantity <= 0:
-                    continue
-                
-                # Buscar estoque atual
-                cursor.execute("""
-                    SELECT quantidade_disponivel, custo_medio FROM estoque_atual 
-                    WHERE product_id = %s
-                """, (product_id,))
-                
-                current_stock = cursor.fetchone()
-                current_qty = current_stock[0] if current_stock else Decimal('0')
-                current_cost = current_stock[1] if current_stock else Decimal('0')
-                
-                # Calcular novo custo médio
-                new_cost = self._calculate_average_cost(
-                    current_qty, current_cost, quantity, unit_cost
-                )
-                new_quantity = current_qty + quantity
-                
-                # Criar movimentação
-                cursor.execute("""
-                    INSERT INTO movimentacoes_estoque (
-                        product_id, tipo_movimentacao, quantidade_anterior,
-                        quantidade_movimentada, quantidade_atual,
-                        custo_unitario, custo_medio_anterior, custo_medio_atual,
-                        valor_total_movimentacao, entrada_estoque_id, user_id,
-                        lote, data_validade, observacoes
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    product_id, 'entrada_compra', current_qty, quantity, new_quantity,
-                    unit_cost, current_cost, new_cost, quantity * unit_cost,
-                    entry_id, user_id, batch, expiration_date,
-                    f"Entrada {entry[1]} - Item {item[5]}"
-                ))
+            if items:
+                self._insert_entry_movements(cursor, entry, items, user_id)
             
             # Atualizar status da entrada
             cursor.execute("""
@@ -224,6 +271,69 @@ class StockService:
             cursor.close()
             conn.close()
     
+    def _insert_entry_movements(self, cursor, entry, items: List[tuple], user_id: UUID) -> None:
+        """
+        Lança as movimentações de todos os itens da entrada em lote.
+        
+        O saldo de todos os produtos é lido (e travado) em uma consulta e o
+        encadeamento item a item (quantidade anterior/atual, custo médio
+        arredondado como na coluna) é feito em memória, com os mesmos valores
+        do processamento item a item. As movimentações intermediárias de cada
+        produto são inseridas com o trigger de estoque_atual desligado e a
+        última de cada produto com ele ligado, então o snapshot é gravado uma
+        vez por produto (migrations/029_estoque_atual_batch_flag.sql).
+        No modo delta todas as movimentações viram deltas, inclusive as intermediárias.
+        """
+        product_ids = list(dict.fromkeys(str(item[0]) for item in items))
+        
+        lock_clause = "" if settings.stock_delta_mode else "FOR UPDATE"
+        cursor.execute(f"""
+            SELECT product_id, quantidade_disponivel, custo_medio FROM {self._stock_balance_source()} 
+            WHERE product_id = ANY(%s::uuid[])
+            ORDER BY product_id
+            {lock_clause}
+        """, (product_ids,))
+        
+        balances = {
+            str(row[0]): (row[1] or Decimal('0'), row[2] or Decimal('0'))
+            for row in cursor.fetchall()
+        }
+        
+        movements = []
+        last_index_by_product = {}
+        for item in items:
+            product_id = str(item[0])
+            quantity = item[1]
+            unit_cost = item[2] or 0
+            current_qty, current_cost = balances.get(product_id, (Decimal('0'), Decimal('0')))
+            
+            new_cost = self._calculate_average_cost(current_qty, current_cost, quantity, unit_cost)
+            new_quantity = current_qty + quantity
+            
+            movements.append((
+                product_id, 'entrada_compra', current_qty, quantity, new_quantity,
+                unit_cost, current_cost, new_cost, quantity * unit_cost,
+                str(entry[0]), str(user_id), item[3], item[4],
+                f"Entrada {entry[1]} - Item {item[5]}"
+            ))
+            
+            # Próximo item do mesmo produto lê o saldo gravado (custo com 2 casas)
+            balances[product_id] = (new_quantity, Decimal(new_cost).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+            last_index_by_product[product_id] = len(movements) - 1
+        
+        self._enable_delta_mode(cursor)
+        
+        last_indexes = set(last_index_by_product.values())
+        intermediate = [m for i, m in enumerate(movements) if i not in last_indexes]
+        final = [m for i, m in enumerate(movements) if i in last_indexes]
+        
+        if intermediate:
+            cursor.execute("SELECT set_config('app.estoque_atual_batch', 'on', true)")
+            execute_values(cursor, ENTRY_MOVEMENTS_INSERT_SQL, intermediate, page_size=len(intermediate))
+            cursor.execute("SELECT set_config('app.estoque_atual_batch', 'off', true)")
+        
+        execute_values(cursor, ENTRY_MOVEMENTS_INSERT_SQL, final, page_size=len(final))
+    
     def _calculate_average_cost(self, current_qty: Decimal, current_cost: Decimal, 
                               new_qty: Decimal, new_cost: Decimal) -> Decimal:
         """Calcular custo médio ponderado"""
@@ -240,7 +350,8 @@ class StockService:
     
     # ===== MOVIMENTAÇÕES =====
     
-    async def create_stock_movement(self, movement_data: Dict[str, Any], user_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def create_stock_movement(self, movement_data: Dict[str, Any], user_id: UUID) -> APIResponse:
         """Criar movimentação de estoque manual"""
         try:
             conn = get_db_connection()
@@ -265,9 +376,16 @@ class StockService:
             if not product:
                 return APIResponse(success=False, message="Produto não encontrado")
             
+            # Determinar se é entrada ou saída
+            is_entry = movement_type.startswith('entrada_')
+            
+            # Modo delta: saídas do mesmo produto em fila até o commit
+            if not is_entry:
+                self._lock_product_exits(cursor, product_id)
+            
             # Buscar estoque atual
-            cursor.execute("""
-                SELECT quantidade_disponivel, custo_medio FROM estoque_atual 
+            cursor.execute(f"""
+                SELECT quantidade_disponivel, custo_medio FROM {self._stock_balance_source()} 
                 WHERE product_id = %s
             """, (product_id,))
             
@@ -275,13 +393,16 @@ class StockService:
             current_qty = current_stock[0] if current_stock else Decimal('0')
             current_cost = current_stock[1] if current_stock else Decimal('0')
             
-            # Determinar se é entrada ou saída
-            is_entry = movement_type.startswith('entrada_')
             movement_qty = quantity if is_entry else -quantity
             new_quantity = current_qty + movement_qty
             
-            # Validar estoque não negativo (exceto para ajustes)
-            if new_quantity < 0 and movement_type not in ['entrada_ajuste', 'saida_ajuste']:
+            # Validar estoque não negativo (exceto para ajustes). No modo delta
+            # nem ajustes: o saldo negativo só estouraria na compactação
+            negative_allowed = (
+                movement_type in ['entrada_ajuste', 'saida_ajuste']
+                and not settings.stock_delta_mode
+            )
+            if new_quantity < 0 and not negative_allowed:
                 return APIResponse(success=False, message="Estoque insuficiente")
             
             # Calcular novo custo médio
@@ -293,6 +414,7 @@ class StockService:
                 new_cost = current_cost
             
             # Criar movimentação
+            self._enable_delta_mode(cursor)
             cursor.execute("""
                 INSERT INTO movimentacoes_estoque (
                     product_id, tipo_movimentacao, quantidade_anterior,
@@ -335,7 +457,8 @@ class StockService:
     
     # ===== CONSULTAS =====
     
-    async def get_stock_current(self, filters: Dict[str, Any] = None) -> APIResponse:
+    @run_in_db_executor
+    def get_stock_current(self, filters: Dict[str, Any] = None) -> APIResponse:
         """Buscar situação atual do estoque"""
         try:
             conn = get_db_connection()
@@ -374,7 +497,7 @@ class StockService:
                     ea.precisa_reposicao, ea.estoque_zerado, ea.estoque_negativo,
                     ea.ultima_entrada, ea.ultima_saida,
                     pc.name as category_name
-                FROM estoque_atual ea
+                FROM vw_estoque_atual ea
                 JOIN products p ON ea.product_id = p.id
                 LEFT JOIN product_categories pc ON p.category_id = pc.id
                 {where_clause}
@@ -443,8 +566,14 @@ class StockService:
             cursor.close()
             conn.close()
     
-    async def get_stock_movements(self, filters: Dict[str, Any] = None) -> APIResponse:
+    @run_in_db_executor
+    def get_stock_movements(self, filters: Dict[str, Any] = None) -> APIResponse:
         """Buscar histórico de movimentações"""
+        # Cursor (data, id): páginas profundas sem OFFSET
+        after_condition, order_by, after_params = keyset_sql(
+            "me.data_movimentacao", "me.id", True, (filters or {}).get('after')
+        )
+        
         try:
             conn = get_db_connection()
             cursor = conn.cursor()
@@ -470,6 +599,10 @@ class StockService:
                 where_conditions.append("me.data_movimentacao <= %s")
                 params.append(filters['date_to'])
             
+            if after_condition:
+                where_conditions.append(after_condition)
+                params.extend(after_params)
+            
             where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
             
             query = f"""
@@ -486,16 +619,16 @@ class StockService:
                 LEFT JOIN auth.users u ON me.user_id = u.id
                 LEFT JOIN entradas_estoque ee ON me.entrada_estoque_id = ee.id
                 {where_clause}
-                ORDER BY me.data_movimentacao DESC
+                ORDER BY {order_by}
                 LIMIT %s OFFSET %s
             """
             
             limit = min(filters.get('limit', 100), 500)
-            offset = filters.get('offset', 0)
-            params.extend([limit, offset])
+            offset = 0 if after_condition else filters.get('offset', 0)
+            params.extend([limit + 1, offset])
             
             cursor.execute(query, params)
-            movements = cursor.fetchall()
+            movements, next_cursor = trim_page(cursor.fetchall(), limit, 10, 0)
             
             result = []
             for mov in movements:
@@ -528,7 +661,8 @@ class StockService:
             return APIResponse(
                 success=True,
                 data=result,
-                message=f"{len(result)} movimentações encontradas"
+                message=f"{len(result)} movimentações encontradas",
+                next_cursor=next_cursor
             )
             
         except Exception as e:
@@ -541,9 +675,254 @@ class StockService:
             cursor.close()
             conn.close()
     
+    def movements_export_query(self, filters: Dict[str, Any] = None) -> Tuple[str, list]:
+        """SQL e parâmetros da exportação de movimentações (lida em streaming)"""
+        where_conditions = []
+        params = []
+        
+        filters = filters or {}
+        
+        if filters.get('product_id'):
+            where_conditions.append("me.product_id = %s")
+            params.append(filters['product_id'])
+        
+        if filters.get('movement_type'):
+            where_conditions.append("me.tipo_movimentacao = %s")
+            params.append(filters['movement_type'])
+        
+        if filters.get('date_from'):
+            where_conditions.append("me.data_movimentacao >= %s")
+            params.append(filters['date_from'])
+        
+        if filters.get('date_to'):
+            # Intervalo semiaberto, como get_movements_summary: o dia final inteiro entra
+            where_conditions.append("me.data_movimentacao < %s")
+            params.append(filters['date_to'] + timedelta(days=1))
+        
+        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        
+        query = f"""
+            SELECT 
+                me.data_movimentacao AS data,
+                me.tipo_movimentacao AS tipo,
+                p.sku AS sku,
+                p.name AS produto,
+                me.quantidade_anterior AS quantidade_anterior,
+                me.quantidade_movimentada AS quantidade_movimentada,
+                me.quantidade_atual AS quantidade_atual,
+                me.custo_unitario AS custo_unitario,
+                me.valor_total_movimentacao AS valor_total,
+                me.lote AS lote,
+                me.data_validade AS data_validade,
+                me.motivo AS motivo,
+                me.observacoes AS observacoes,
+                ee.numero_entrada AS numero_entrada,
+                u.email AS usuario
+            FROM movimentacoes_estoque me
+            JOIN products p ON me.product_id = p.id
+            LEFT JOIN users u ON me.user_id = u.id
+            LEFT JOIN entradas_estoque ee ON me.entrada_estoque_id = ee.id
+            {where_clause}
+            ORDER BY me.data_movimentacao, me.id
+        """
+        
+        return query, params
+    
+    # ===== RELATÓRIOS =====
+    
+    @run_in_db_executor
+    def get_stock_valuation(self, category_id: Optional[str] = None,
+                            include_products: bool = False) -> APIResponse:
+        """
+        Valorização do estoque agregada no banco: total geral e por categoria
+        em uma única consulta (GROUPING SETS), sem limite de produtos.
+        Com ``include_products`` a mesma consulta traz também uma linha por produto.
+        """
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            where_clause = ""
+            params = []
+            if category_id:
+                where_clause = "WHERE p.category_id = %s"
+                params.append(category_id)
+            
+            # Sem o detalhe, ea.product_id não participa do agrupamento
+            if include_products:
+                product_columns = "GROUPING(ea.product_id), ea.product_id"
+                product_set = "(pc.id, pc.name, ea.product_id),"
+            else:
+                product_columns = "1, NULL"
+                product_set = ""
+            
+            cursor.execute(f"""
+                SELECT 
+                    GROUPING(pc.id) AS is_total,
+                    pc.id, COALESCE(pc.name, 'Sem categoria') AS category_name,
+                    {product_columns}, MAX(p.name), MAX(p.barcode),
+                    COUNT(*) AS products_count,
+                    COALESCE(SUM(ea.quantidade_total), 0) AS total_quantity,
+                    COALESCE(SUM(ea.valor_estoque), 0) AS total_value,
+                    MAX(ea.custo_medio) AS average_cost
+                FROM vw_estoque_atual ea
+                JOIN products p ON ea.product_id = p.id
+                LEFT JOIN product_categories pc ON p.category_id = pc.id
+                {where_clause}
+                GROUP BY GROUPING SETS ({product_set} (pc.id, pc.name), ())
+                ORDER BY is_total DESC, total_value DESC, category_name
+            """, params)
+            rows = cursor.fetchall()
+            
+            summary = {'total_products': 0, 'total_quantity': 0, 'total_value': 0}
+            by_category = []
+            products = []
+            for row in rows:
+                if row[0]:
+                    summary = {
+                        'total_products': row[7],
+                        'total_quantity': float(row[8]),
+                        'total_value': float(row[9])
+                    }
+                elif row[3]:
+                    by_category.append({
+                        'category_id': str(row[1]) if row[1] else None,
+                        'category_name': row[2],
+                        'products_count': row[7],
+                        'total_quantity': float(row[8]),
+                        'total_value': float(row[9])
+                    })
+                else:
+                    products.append({
+                        'product_id': str(row[4]),
+                        'product_name': row[5],
+                        'barcode': row[6],
+                        'category_id': str(row[1]) if row[1] else None,
+                        'category_name': row[2],
+                        'quantity': float(row[8]),
+                        'average_cost': float(row[10]) if row[10] else 0,
+                        'stock_value': float(row[9])
+                    })
+            
+            data = {'summary': summary, 'by_category': by_category}
+            if include_products:
+                data['products'] = products
+            
+            return APIResponse(
+                success=True,
+                data=data,
+                message="Relatório de valorização de estoque"
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao gerar valorização de estoque: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao gerar valorização de estoque: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
+    
+    @run_in_db_executor
+    def get_movements_summary(self, date_from: date, date_to: date,
+                              group_by: Optional[str] = None) -> APIResponse:
+        """
+        Resumo de movimentações por tipo agregado no banco, sem limite de
+        linhas. Com ``group_by`` (day, week ou month) a mesma consulta traz
+        também os totais por período (GROUPING SETS). O período é fechado nas
+        duas pontas por data: [date_from, date_to + 1 dia), o que usa o índice
+        (data_movimentacao, tipo_movimentacao) da migration 031.
+        """
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            params = []
+            if group_by:
+                bucket_column = "date_trunc(%s, me.data_movimentacao)"
+                params.append(group_by)
+                grouping = "GROUPING SETS ((tipo_movimentacao), (bucket, tipo_movimentacao))"
+                bucket_flag = "GROUPING(bucket)"
+            else:
+                bucket_column = "NULL::timestamp"
+                grouping = "tipo_movimentacao"
+                bucket_flag = "1"
+            
+            params.extend([date_from, date_to + timedelta(days=1)])
+            
+            cursor.execute(f"""
+                SELECT 
+                    {bucket_flag} AS is_total,
+                    bucket,
+                    tipo_movimentacao,
+                    COUNT(*),
+                    COALESCE(SUM(ABS(quantidade_movimentada)), 0),
+                    COALESCE(SUM(valor_total_movimentacao), 0)
+                FROM (
+                    SELECT {bucket_column} AS bucket, me.tipo_movimentacao,
+                           me.quantidade_movimentada, me.valor_total_movimentacao
+                    FROM movimentacoes_estoque me
+                    WHERE me.data_movimentacao >= %s AND me.data_movimentacao < %s
+                ) m
+                GROUP BY {grouping}
+                ORDER BY is_total DESC, bucket, tipo_movimentacao
+            """, params)
+            rows = cursor.fetchall()
+            
+            summary_by_type = []
+            periods = {}
+            for row in rows:
+                item = {
+                    'movement_type': row[2],
+                    'count': row[3],
+                    'total_quantity': float(row[4]),
+                    'total_value': float(row[5])
+                }
+                if row[0]:
+                    summary_by_type.append(item)
+                    continue
+                
+                period = periods.setdefault(row[1], {
+                    'period_start': row[1].date().isoformat(),
+                    'summary_by_type': [],
+                    'total_movements': 0
+                })
+                period['summary_by_type'].append(item)
+                period['total_movements'] += row[3]
+            
+            data = {
+                'period': {
+                    'from': date_from.isoformat(),
+                    'to': date_to.isoformat()
+                },
+                'summary_by_type': summary_by_type,
+                'total_movements': sum(item['count'] for item in summary_by_type)
+            }
+            if group_by:
+                data['group_by'] = group_by
+                data['by_period'] = list(periods.values())
+            
+            return APIResponse(
+                success=True,
+                data=data,
+                message="Resumo de movimentações"
+            )
+            
+        except Exception as e:
+            logger.error(f"Erro ao gerar resumo de movimentações: {e}")
+            return APIResponse(
+                success=False,
+                message=f"Erro ao gerar resumo de movimentações: {str(e)}"
+            )
+        finally:
+            cursor.close()
+            conn.close()
+    
     # ===== IMPORTAÇÃO NFE =====
     
-    async def import_nfe_xml(self, xml_content: str, supplier_id: UUID, user_id: UUID) -> APIResponse:
+    @run_in_db_executor
+    def import_nfe_xml(self, xml_content: str, supplier_id: UUID, user_id: UUID) -> APIResponse:
         """Importar dados de NFe a partir do XML"""
         try:
             # Parsear XML
@@ -0,0 +1,101 @@
+"""
+Configuração dos testes
+
+Testes que usam PostgreSQL dependem da fixture ``database_url`` e são
+pulados quando TEST_DATABASE_URL não está definida. O banco indicado deve
+ter o schema da aplicação (models + migrations); cada teste cria os próprios
+dados e os remove no final.
+"""
+import os
+import uuid
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    # app.config lê DATABASE_URL na importação
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+
+@pytest.fixture(scope="session")
+def database_url():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL não definida")
+    return TEST_DATABASE_URL
+
+
+@pytest.fixture
+def pg_conn(database_url):
+    """Conexão psycopg2 avulsa (fora do pool) para preparar e conferir dados"""
+    import psycopg2
+    from app.database.connection import parse_database_url
+
+    conn = psycopg2.connect(**parse_database_url(database_url))
+    conn.autocommit = True
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def db_session(database_url):
+    """Sessão SQLAlchemy da aplicação"""
+    from app.core.database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.close()
+
+
+@pytest.fixture
+def make_product(pg_conn):
+    """Cria produtos de teste (removidos no final, junto com o que referencia cada um)"""
+    created = []
+
+    def factory(stock_quantity=0, is_active=True, sale_price=10, **extra):
+        product_id = uuid.uuid4()
+        columns = {
+            'id': str(product_id),
+            'name': f"Produto teste {product_id.hex[:8]}",
+            'sku': f"T-{product_id.hex[:12]}",
+            'sale_price': sale_price,
+            'cost_price': 5,
+            'stock_quantity': stock_quantity,
+            'is_active': is_active,
+        }
+        columns.update(extra)
+        with pg_conn.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO products ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))})",
+                list(columns.values())
+            )
+        created.append(str(product_id))
+        return product_id
+
+    yield factory
+
+    with pg_conn.cursor() as cursor:
+        for table in ('estoque_atual_deltas', 'estoque_atual', 'movimentacoes_estoque'):
+            cursor.execute("SELECT to_regclass(%s)", (table,))
+            if cursor.fetchone()[0]:
+                cursor.execute(f"DELETE FROM {table} WHERE product_id = ANY(%s::uuid[])", (created,))
+        cursor.execute("DELETE FROM products WHERE id = ANY(%s::uuid[])", (created,))
+
+
+@pytest.fixture
+def test_user(pg_conn):
+    """Usuário de teste (vendas exigem user_id); removido no final junto com as vendas dele"""
+    user_id = str(uuid.uuid4())
+    with pg_conn.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO users (id, email, password_hash, name) VALUES (%s, %s, 'x', 'Teste')",
+            (user_id, f"teste-{user_id[:8]}@teste.com")
+        )
+
+    yield user_id
+
+    with pg_conn.cursor() as cursor:
+        cursor.execute("DELETE FROM sale_items WHERE sale_id IN (SELECT id FROM sales WHERE user_id = %s)", (user_id,))
+        cursor.execute("DELETE FROM sales WHERE user_id = %s", (user_id,))
+        cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
@@ -0,0 +1,29 @@
+"""
+Pool de conexões psycopg2 (app.database.connection)
+"""
+import gc
+import time
+
+from app.database.connection import ConnectionPool, parse_database_url
+
+
+def test_leaked_connection_returns_to_pool(database_url):
+    pool = ConnectionPool(parse_database_url(database_url), min_size=1, max_size=1, timeout=1)
+    try:
+        def leak():
+            conn = pool.acquire()
+            conn.cursor().execute("SELECT 1")
+            # sem conn.close()
+
+        leak()
+        gc.collect()
+
+        started = time.monotonic()
+        conn = pool.acquire()
+        conn.close()
+
+        assert time.monotonic() - started < 0.5
+        assert pool.stats()['leaked_total'] == 1
+        assert pool.stats()['in_use'] == 0
+    finally:
+        pool.close_all()
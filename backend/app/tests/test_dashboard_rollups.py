@@ -0,0 +1,156 @@
+"""
+Rollups dos dashboards sem linha global disputada: vendas por tipo de cliente
+viram deltas (alembic 013) e o valor diário do estoque só é gravado na
+reconciliação (migrations/035), então gravações concorrentes não se esperam.
+O KPI de contas a pagar só soma contas em aberto ou pagas em parte
+"""
+import uuid
+from datetime import date, datetime
+
+import psycopg2
+import pytest
+
+from app.database.connection import parse_database_url
+from app.services.dashboard_service import DashboardService
+
+# Dia isolado para não misturar com outras vendas do banco de teste
+ROLLUP_DAY = date(2001, 1, 15)
+
+
+@pytest.fixture
+def open_transaction(database_url):
+    """Conexões em transação aberta (rollback no final)"""
+    connections = []
+
+    def factory():
+        conn = psycopg2.connect(**parse_database_url(database_url))
+        with conn.cursor() as cursor:
+            cursor.execute("SET lock_timeout = '2s'")
+        connections.append(conn)
+        return conn
+
+    yield factory
+
+    for conn in connections:
+        conn.rollback()
+        conn.close()
+
+
+@pytest.fixture
+def rollup_day(pg_conn):
+    yield ROLLUP_DAY
+    with pg_conn.cursor() as cursor:
+        # Remove as vendas antes de compactar, para os deltas de estorno entrarem juntos
+        cursor.execute("DELETE FROM sales WHERE number LIKE 'RT-%%' AND sale_date::date = %s", (ROLLUP_DAY,))
+        cursor.execute("SELECT compact_sales_rollup_deltas(NULL)")
+        cursor.execute("DELETE FROM sales_daily_by_client_type WHERE day = %s", (ROLLUP_DAY,))
+
+
+@pytest.fixture
+def supplier(pg_conn):
+    supplier_id = str(uuid.uuid4())
+    with pg_conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO suppliers (id, name, person_type, document)
+            VALUES (%s, 'Fornecedor Dashboard', 'PJ', %s)
+        """, (supplier_id, uuid.uuid4().hex[:14]))
+    yield supplier_id
+    with pg_conn.cursor() as cursor:
+        cursor.execute("DELETE FROM contas_pagar WHERE supplier_id = %s", (supplier_id,))
+        cursor.execute("DELETE FROM suppliers WHERE id = %s", (supplier_id,))
+
+
+def _insert_sale(cursor, user_id, total):
+    cursor.execute("""
+        INSERT INTO sales (id, number, user_id, status, total, created_at, sale_date)
+        VALUES (%s, %s, %s, 'completed', %s, %s, %s)
+    """, (str(uuid.uuid4()), f"RT-{uuid.uuid4().hex[:12]}", user_id, total,
+          datetime(2001, 1, 15, 12), datetime(2001, 1, 15, 12)))
+
+
+def _client_type_totals(pg_conn, source):
+    with pg_conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT COALESCE(SUM(sales_count), 0), COALESCE(SUM(revenue), 0) FROM {source} WHERE day = %s",
+            (ROLLUP_DAY,)
+        )
+        return cursor.fetchone()
+
+
+def test_concurrent_sales_do_not_wait_on_the_client_type_rollup(open_transaction, test_user,
+                                                                rollup_day, pg_conn):
+    first, second = open_transaction(), open_transaction()
+
+    # Com o upsert na linha (dia, AVULSO), a segunda venda esperaria a primeira
+    _insert_sale(first.cursor(), test_user, 30)
+    _insert_sale(second.cursor(), test_user, 20)
+    first.commit()
+    second.commit()
+
+    assert _client_type_totals(pg_conn, 'vw_sales_daily_by_client_type') == (2, 50)
+
+    result = DashboardService.compact_rollup_deltas.sync(DashboardService())
+    assert result.success, result.message
+    assert result.data['compacted'] >= 2
+    assert _client_type_totals(pg_conn, 'sales_daily_by_client_type') == (2, 50)
+    assert _client_type_totals(pg_conn, 'vw_sales_daily_by_client_type') == (2, 50)
+
+
+def test_stock_writes_do_not_share_a_daily_row(open_transaction, make_product):
+    first_product, second_product = make_product(), make_product()
+    first, second = open_transaction(), open_transaction()
+
+    # Com o trigger da 032, a segunda esperaria a linha do dia (lock_timeout)
+    for conn, product_id in ((first, first_product), (second, second_product)):
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO estoque_atual (product_id, quantidade_disponivel, custo_medio)
+                VALUES (%s, 10, 5)
+            """, (str(product_id),))
+    first.commit()
+    second.commit()
+
+
+def test_inventory_dashboard_reads_effective_balance(make_product, pg_conn):
+    product_id = make_product()
+    with pg_conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO estoque_atual (product_id, quantidade_disponivel, custo_medio, ponto_reposicao)
+            VALUES (%s, 1, 5, 2)
+        """, (str(product_id),))
+        cursor.execute("SELECT COUNT(*) FILTER (WHERE precisa_reposicao), SUM(valor_estoque) FROM vw_estoque_atual")
+        low_stock, stock_value = cursor.fetchone()
+
+    result = DashboardService.get_inventory_dashboard.sync(DashboardService())
+
+    assert result.success, result.message
+    assert result.data['kpis']['low_stock_alerts'] == low_stock
+    assert result.data['kpis']['stock_value'] == float(stock_value)
+    assert result.data['charts']['stock_value_by_day'][-1]['stock_value'] == float(stock_value)
+
+
+def _insert_bill(cursor, supplier_id, amount, status):
+    cursor.execute("""
+        INSERT INTO contas_pagar (supplier_id, documento_numero, data_emissao, data_vencimento_original,
+                                  valor_original, status, descricao)
+        VALUES (%s, %s, %s, %s, %s, %s, 'Conta do teste')
+    """, (supplier_id, uuid.uuid4().hex[:12], ROLLUP_DAY, ROLLUP_DAY, amount, status))
+
+
+def _payables():
+    main = DashboardService.get_main_dashboard.sync(DashboardService())
+    financial = DashboardService.get_financial_dashboard.sync(DashboardService())
+    assert main.success, main.message
+    assert financial.success, financial.message
+    return main.data['kpis']['accounts_payable'], financial.data['kpis']['total_payable']
+
+
+def test_payables_kpi_skips_cancelled_and_paid_bills(supplier, pg_conn):
+    before = _payables()
+    with pg_conn.cursor() as cursor:
+        _insert_bill(cursor, supplier, 100, 'em_aberto')
+        _insert_bill(cursor, supplier, 1000, 'cancelado')
+        _insert_bill(cursor, supplier, 10000, 'pago')
+
+    # Só a conta em aberto entra nos dois dashboards
+    assert _payables() == (before[0] + 100, before[1] + 100)
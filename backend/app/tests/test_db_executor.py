@@ -0,0 +1,134 @@
+"""
+Executor do banco (app.database.executor): chamadas psycopg2 bloqueantes
+rodam em threads e o event loop continua atendendo as outras requisições
+"""
+import asyncio
+import statistics
+import threading
+import time
+
+from app.database.connection import get_db_connection
+from app.database.executor import run_in_db_executor, run_in_thread
+
+
+class SlowService:
+    @run_in_db_executor
+    def long_report(self, seconds: float) -> float:
+        # Simula uma consulta pesada do psycopg2 (bloqueia a thread)
+        time.sleep(seconds)
+        return seconds
+
+    @run_in_db_executor
+    def long_report_query(self, seconds: float) -> float:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(%s)", (seconds,))
+            return seconds
+        finally:
+            conn.close()
+
+    @run_in_db_executor
+    def quick_query(self) -> int:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                return cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+
+async def _tick_latencies(stop: asyncio.Event, interval: float = 0.01):
+    """Atraso do loop: quanto cada sleep(interval) demorou além do pedido"""
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+    return lags
+
+
+def test_event_loop_stays_responsive_during_blocking_calls():
+    async def scenario():
+        service = SlowService()
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(_tick_latencies(stop))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(service.long_report(0.3) for _ in range(4)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        return results, elapsed, await ticker
+
+    results, elapsed, lags = asyncio.run(scenario())
+
+    assert results == [0.3] * 4
+    # As quatro chamadas correram em paralelo, não em fila no loop
+    assert elapsed < 0.6
+    assert max(lags) < 0.1
+
+
+def test_blocking_call_on_the_loop_stalls_it():
+    """Referência: o mesmo corpo chamado direto (.sync) trava o loop"""
+    async def scenario():
+        service = SlowService()
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(_tick_latencies(stop))
+        await asyncio.sleep(0)
+        SlowService.long_report.sync(service, 0.3)
+        await asyncio.sleep(0.02)
+        stop.set()
+        return await ticker
+
+    lags = asyncio.run(scenario())
+    assert max(lags) >= 0.25
+
+
+def test_quick_queries_latency_flat_while_long_report_runs(database_url):
+    async def scenario():
+        service = SlowService()
+
+        async def quick_latencies(count: int):
+            latencies = []
+            for _ in range(count):
+                started = time.perf_counter()
+                assert await service.quick_query() == 1
+                latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+            return latencies
+
+        baseline = await quick_latencies(20)
+        report = asyncio.create_task(service.long_report_query(1.0))
+        await asyncio.sleep(0.05)
+        during = await quick_latencies(20)
+        assert not report.done()
+        await report
+        return baseline, during
+
+    baseline, during = asyncio.run(scenario())
+
+    # Enquanto o relatório de 1s roda, as consultas rápidas continuam rápidas
+    assert max(during) < 0.2
+    assert statistics.median(during) < statistics.median(baseline) + 0.05
+
+
+class PdfService:
+    @run_in_db_executor
+    def db_thread(self) -> str:
+        return threading.current_thread().name
+
+    @run_in_thread
+    def render(self) -> str:
+        # Trabalho de CPU sem banco (ex.: ReportLab)
+        return threading.current_thread().name
+
+
+def test_work_without_database_stays_off_the_db_executor():
+    async def scenario():
+        service = PdfService()
+        return await service.db_thread(), await service.render()
+
+    db_thread, render_thread = asyncio.run(scenario())
+
+    assert db_thread.startswith("db-executor")
+    assert not render_thread.startswith("db-executor")
@@ -0,0 +1,206 @@
+"""
+Fila de emails (app.services.email_outbox_service) contra um servidor SMTP
+local (aiosmtpd): envio em lote pela mesma conexão, retentativa com backoff,
+falha definitiva e retomada de reservas vencidas
+"""
+import asyncio
+import email
+import socket
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers.purchase import get_email_status
+from app.services import email_outbox_service
+from app.services.email_outbox_service import EmailOutboxService, enqueue_email
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+RETRY_BASE_SECONDS = 30
+
+
+class StubHandler:
+    """Aceita tudo, exceto destinatários 'recusado@...' (550) e DATA enquanto ``busy`` (451)"""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+        self.busy = False
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("recusado@"):
+            return "550 5.1.1 Destinatário não existe"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.busy:
+            return "451 4.3.0 Tente mais tarde"
+        self.sessions.add(id(session))
+        self.messages.append(email.message_from_bytes(envelope.content))
+        return "250 Message accepted for delivery"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_stub(monkeypatch, database_url):
+    handler = StubHandler()
+    port = _free_port()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+
+    settings = email_outbox_service.settings
+    monkeypatch.setattr(settings, "smtp_host", "127.0.0.1")
+    monkeypatch.setattr(settings, "smtp_port", port)
+    monkeypatch.setattr(settings, "smtp_starttls", False)
+    monkeypatch.setattr(settings, "smtp_username", None)
+    monkeypatch.setattr(settings, "smtp_from", "erp@teste.local")
+    monkeypatch.setattr(settings, "email_outbox_retry_base_seconds", RETRY_BASE_SECONDS)
+    email_outbox_service.smtp_connection.close()
+
+    yield handler
+
+    email_outbox_service.smtp_connection.close()
+    controller.stop()
+
+
+@pytest.fixture
+def domain(pg_conn):
+    """Domínio único dos destinatários do teste; a fila é limpa no final"""
+    tag = f"t{uuid.uuid4().hex[:8]}.teste"
+    yield tag
+    with pg_conn.cursor() as cursor:
+        cursor.execute("DELETE FROM fila_emails WHERE destinatario LIKE %s", (f"%@{tag}",))
+
+
+def _dispatch():
+    result = EmailOutboxService.dispatch_pending.sync(EmailOutboxService())
+    assert result.success, result.message
+    return result.data
+
+
+def _job(pg_conn, job_id):
+    with pg_conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT status, tentativas, ultimo_erro, enviado_em,
+                   EXTRACT(EPOCH FROM proxima_tentativa - LOCALTIMESTAMP)
+            FROM fila_emails WHERE id = %s
+        """, (job_id,))
+        return dict(zip(("status", "attempts", "error", "sent_at", "wait"), cursor.fetchone()))
+
+
+def _make_due(pg_conn, job_id):
+    with pg_conn.cursor() as cursor:
+        cursor.execute("UPDATE fila_emails SET proxima_tentativa = LOCALTIMESTAMP - interval '1 second' "
+                       "WHERE id = %s", (job_id,))
+
+
+def test_batch_is_sent_over_one_connection(smtp_stub, domain, pg_conn):
+    job_ids = [
+        enqueue_email(f"fornecedor{i}@{domain}", f"Pedido {i}", f"<p>Pedido {i}</p>")
+        for i in range(3)
+    ]
+    with_pdf = enqueue_email(f"pdf@{domain}", "Pedido com PDF", "<p>PDF</p>",
+                             attachment=b"%PDF-1.4 teste", attachment_name="pedido.pdf")
+
+    data = _dispatch()
+
+    assert data == {"claimed": 4, "sent": 4, "failed": 0}
+    assert len(smtp_stub.sessions) == 1
+    for job_id in job_ids + [with_pdf]:
+        job = _job(pg_conn, job_id)
+        assert job["status"] == "enviado"
+        assert job["attempts"] == 1
+        assert job["sent_at"] is not None
+
+    pdf_message = next(m for m in smtp_stub.messages if m["To"] == f"pdf@{domain}")
+    attachment = [part for part in pdf_message.walk() if part.get_filename() == "pedido.pdf"]
+    assert attachment[0].get_payload(decode=True) == b"%PDF-1.4 teste"
+
+    # Nada mais pendente: o próximo ciclo não reenvia
+    assert _dispatch()["claimed"] == 0
+
+
+def test_temporary_failure_retries_with_backoff_until_max_attempts(smtp_stub, domain, pg_conn, monkeypatch):
+    monkeypatch.setattr(email_outbox_service.settings, "email_outbox_max_attempts", 3)
+    job_id = enqueue_email(f"ocupado@{domain}", "Pedido", "<p>Pedido</p>")
+    smtp_stub.busy = True
+
+    for attempt in (1, 2):
+        assert _dispatch() == {"claimed": 1, "sent": 0, "failed": 1}
+        job = _job(pg_conn, job_id)
+        assert job["status"] == "pendente"
+        assert job["attempts"] == attempt
+        assert "451" in job["error"]
+        # Backoff exponencial: 30s, 60s
+        expected_wait = RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+        assert expected_wait - 5 < job["wait"] <= expected_wait
+        # Ainda não venceu: não é reservada de novo
+        assert _dispatch()["claimed"] == 0
+        _make_due(pg_conn, job_id)
+
+    assert _dispatch()["failed"] == 1
+    job = _job(pg_conn, job_id)
+    assert job["status"] == "falhou"
+    assert job["attempts"] == 3
+
+    # Falha esgotada não volta para a fila
+    smtp_stub.busy = False
+    _make_due(pg_conn, job_id)
+    assert _dispatch()["claimed"] == 0
+
+
+def test_refused_recipient_fails_at_once_without_breaking_the_batch(smtp_stub, domain, pg_conn):
+    refused = enqueue_email(f"recusado@{domain}", "Pedido", "<p>Pedido</p>")
+    accepted = enqueue_email(f"aceito@{domain}", "Pedido", "<p>Pedido</p>")
+
+    assert _dispatch() == {"claimed": 2, "sent": 1, "failed": 1}
+
+    job = _job(pg_conn, refused)
+    assert job["status"] == "falhou"
+    assert job["attempts"] == 1
+    assert "550" in job["error"]
+    assert _job(pg_conn, accepted)["status"] == "enviado"
+
+
+def test_expired_lease_is_reclaimed(smtp_stub, domain, pg_conn):
+    expired = enqueue_email(f"travado@{domain}", "Pedido", "<p>Pedido</p>")
+    leased = enqueue_email(f"reservado@{domain}", "Pedido", "<p>Pedido</p>")
+    with pg_conn.cursor() as cursor:
+        # Worker caiu no meio do lote: uma reserva já venceu, a outra ainda não
+        cursor.execute("""
+            UPDATE fila_emails SET status = 'enviando', tentativas = 1,
+                proxima_tentativa = LOCALTIMESTAMP + CASE WHEN id = %s
+                    THEN interval '-1 minute' ELSE interval '10 minutes' END
+            WHERE id IN (%s, %s)
+        """, (expired, expired, leased))
+
+    assert _dispatch() == {"claimed": 1, "sent": 1, "failed": 0}
+
+    job = _job(pg_conn, expired)
+    assert job["status"] == "enviado"
+    assert job["attempts"] == 2
+    assert _job(pg_conn, leased)["status"] == "enviando"
+    assert [m["To"] for m in smtp_stub.messages] == [f"travado@{domain}"]
+
+
+def test_get_job_signals_unknown_id_with_empty_data(domain):
+    job_id = enqueue_email(f"consulta@{domain}", "Pedido", "<p>Pedido</p>")
+
+    found = EmailOutboxService.get_job.sync(EmailOutboxService(), job_id)
+    assert found.success
+    assert found.data["status"] == "pendente"
+
+    missing = EmailOutboxService.get_job.sync(EmailOutboxService(), uuid.uuid4())
+    assert missing.success
+    assert missing.data is None
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_email_status(uuid.uuid4(), current_user={}))
+    assert error.value.status_code == 404
@@ -0,0 +1,30 @@
+"""
+Endpoints de diagnóstico (/health/db-pool, /internal/metrics) só para admin
+"""
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.main import app
+
+PROTECTED_PATHS = ("/health/db-pool", "/internal/metrics")
+
+
+def _role_checker(path):
+    route = next(r for r in app.routes if getattr(r, "path", None) == path)
+    checkers = [d.dependency for d in route.dependencies if d.dependency.__name__ == "role_checker"]
+    assert len(checkers) == 1, f"{path} sem require_roles"
+    return checkers[0]
+
+
+@pytest.mark.parametrize("path", PROTECTED_PATHS)
+def test_diagnostic_endpoints_require_admin(path):
+    role_checker = _role_checker(path)
+
+    with pytest.raises(HTTPException) as denied:
+        role_checker(current_user=SimpleNamespace(role="vendas"))
+    assert denied.value.status_code == 403
+
+    admin = SimpleNamespace(role="admin")
+    assert role_checker(current_user=admin) is admin
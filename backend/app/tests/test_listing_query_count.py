@@ -0,0 +1,93 @@
+"""
+Regressão de N+1 nas listagens de clientes e fornecedores: uma página custa
+sempre 3 statements (entidades + telefones + endereços), qualquer que seja
+o número de linhas
+"""
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.core.database import SessionLocal, engine
+from app.models.client import Client, PersonType
+from app.models.contact import Address, Phone
+from app.models.supplier import Supplier
+from app.routers.clients import get_clients
+from app.routers.suppliers import get_suppliers
+
+PAGE_STATEMENTS = 3
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _contacts():
+    return {
+        "phones": [Phone(number="11999990000", is_primary=True), Phone(number="1133330000")],
+        "addresses": [Address(street="Rua Teste", number="1", city="São Paulo",
+                              state="SP", zip_code="01000-000", is_primary=True)],
+    }
+
+
+@pytest.fixture
+def tagged_rows(db_session):
+    """Cria clientes e fornecedores com um marcador único no nome"""
+    tag = f"qc{uuid.uuid4().hex[:10]}"
+    created = []
+
+    def create(model, count):
+        for i in range(count):
+            row = model(name=f"{tag} {i}", person_type=PersonType.PF,
+                        document=f"{i:011d}", **_contacts())
+            db_session.add(row)
+            created.append(row)
+        db_session.commit()
+
+    yield tag, create
+
+    for row in created:
+        db_session.delete(row)
+    db_session.commit()
+
+
+def _list_clients(db, tag, limit):
+    return get_clients(skip=0, limit=limit, search=tag, personType=None, status=None,
+                       sortBy="created_at", sortOrder="desc", db=db)
+
+
+def _list_suppliers(db, tag, limit):
+    return get_suppliers(skip=0, limit=limit, search=tag, personType=None, status=None,
+                         sortBy="created_at", sortOrder="desc", db=db, current_user=None)
+
+
+@pytest.mark.parametrize("model, list_page", [
+    (Client, _list_clients),
+    (Supplier, _list_suppliers),
+])
+@pytest.mark.parametrize("rows", [1, 40])
+def test_listing_page_statement_count_is_constant(tagged_rows, model, list_page, rows):
+    tag, create = tagged_rows
+    create(model, rows)
+
+    db = SessionLocal()
+    try:
+        with count_statements() as statements:
+            page = list_page(db, tag, 100)
+    finally:
+        db.close()
+
+    assert len(page) == rows
+    assert all(len(item["phones"]) == 2 and len(item["addresses"]) == 1 for item in page)
+    assert len(statements) == PAGE_STATEMENTS, statements
@@ -0,0 +1,27 @@
+"""
+Contagem das listagens (app.core.pagination.count_rows)
+"""
+from sqlalchemy import text
+
+from app.core.pagination import _planner_estimate, count_rows
+from app.models.pessoa import Pessoa
+
+
+def test_failed_explain_does_not_abort_the_transaction(db_session):
+    # Constante inválida: o erro acontece no servidor, durante o EXPLAIN
+    broken = db_session.query(Pessoa).filter(text("CAST('x' AS integer) = 1"))
+
+    assert _planner_estimate(db_session, broken) is None
+
+    # A transação da sessão continua utilizável para o COUNT exato
+    query = db_session.query(Pessoa)
+    assert count_rows(db_session, query, "exact") == db_session.execute(
+        text("SELECT COUNT(*) FROM pessoas")
+    ).scalar()
+
+
+def test_estimated_mode_confirms_small_tables_with_exact_count(db_session):
+    query = db_session.query(Pessoa).filter(Pessoa.nome == "nenhuma pessoa com este nome")
+
+    assert count_rows(db_session, query, "estimated") == 0
+    assert count_rows(db_session, query, "none") is None
@@ -0,0 +1,145 @@
+"""
+Benchmark da listagem de pessoas com 500 mil registros: antes x depois
+
+Antes: COUNT(*) de diagnóstico + COUNT da consulta filtrada + joinedload em
+seis relacionamentos com OFFSET. Depois: listar_pessoas com contagem
+estimada (ou nenhuma), selectinload e cursor. Cada pessoa tem um papel,
+dois telefones e um endereço.
+
+Pesado (alguns minutos): só roda com RUN_BENCHMARKS=1. Os tempos saem no
+terminal com ``pytest -s``; ``BENCHMARK_PESSOAS_ROWS`` muda o volume.
+"""
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+
+from app.core.database import SessionLocal
+from app.core.pagination import encode_cursor
+from app.models.pessoa import Pessoa
+from app.routers.pessoas import listar_pessoas
+
+ROWS = int(os.getenv("BENCHMARK_PESSOAS_ROWS", "500000"))
+LIMIT = 100
+REPEAT = 5
+
+pytestmark = pytest.mark.skipif(
+    os.getenv("RUN_BENCHMARKS") != "1", reason="benchmark: defina RUN_BENCHMARKS=1"
+)
+
+
+@pytest.fixture(scope="module")
+def seeded_pessoas(database_url):
+    import psycopg2
+    from app.database.connection import parse_database_url
+
+    tag = f"b{uuid.uuid4().hex[:6]}"
+    conn = psycopg2.connect(**parse_database_url(database_url))
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO pessoas (id, nome, pessoa_tipo, documento, email, is_active, created_at, updated_at)
+        SELECT gen_random_uuid(), 'Pessoa ' || md5(g::text) || ' ' || %(tag)s, 'PF',
+               %(tag)s || g, 'p' || g || '@teste.com', true, now(), now()
+        FROM generate_series(1, %(rows)s) g
+    """, {'tag': tag, 'rows': ROWS})
+    like = f"{tag}%"
+    cursor.execute("""
+        INSERT INTO pessoa_papeis (id, pessoa_id, papel, is_active)
+        SELECT gen_random_uuid(), id, 'CLIENTE', true FROM pessoas WHERE documento LIKE %s
+    """, (like,))
+    cursor.execute("""
+        INSERT INTO phones (id, pessoa_id, number, type, is_whatsapp, is_primary)
+        SELECT gen_random_uuid(), p.id, '1199999' || n, 'mobile', false, n = 1
+        FROM pessoas p, generate_series(1, 2) n
+        WHERE p.documento LIKE %s
+    """, (like,))
+    cursor.execute("""
+        INSERT INTO addresses (id, pessoa_id, type, is_primary, street, city, state, zip_code)
+        SELECT gen_random_uuid(), id, 'main', true, 'Rua Teste', 'São Paulo', 'SP', '01000-000'
+        FROM pessoas WHERE documento LIKE %s
+    """, (like,))
+    cursor.execute("ANALYZE pessoas, pessoa_papeis, phones, addresses")
+
+    yield tag
+
+    for table in ('pessoa_papeis', 'phones', 'addresses'):
+        cursor.execute(
+            f"DELETE FROM {table} WHERE pessoa_id IN (SELECT id FROM pessoas WHERE documento LIKE %s)",
+            (like,)
+        )
+    # Sem VACUUM, a checagem de FK de cada pessoa varre as linhas mortas dos filhos
+    cursor.execute("VACUUM pessoa_papeis, phones, addresses")
+    cursor.execute("DELETE FROM pessoas WHERE documento LIKE %s", (like,))
+    conn.close()
+
+
+def listar_antes(db, skip):
+    """Reprodução da listagem anterior (status=ativos, sem filtros)"""
+    db.execute(text("SELECT COUNT(*) FROM pessoas")).fetchone()
+    query = db.query(Pessoa).filter(Pessoa.is_active == True)
+    total = query.count()
+    pessoas = query.options(
+        joinedload(Pessoa.papeis),
+        joinedload(Pessoa.telefones),
+        joinedload(Pessoa.enderecos),
+        joinedload(Pessoa.dados_cliente),
+        joinedload(Pessoa.dados_funcionario),
+        joinedload(Pessoa.dados_fornecedor)
+    ).order_by(Pessoa.nome).offset(skip).limit(LIMIT).all()
+    return total, pessoas
+
+
+def listar_depois(db, count, after=None):
+    return asyncio.run(listar_pessoas(
+        skip=0, limit=LIMIT, search=None, papel=None, pessoa_tipo=None, status="ativos",
+        after=after, count=count, db=db
+    ))
+
+
+def median_ms(call):
+    timings = []
+    for _ in range(REPEAT):
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            call(db)
+            timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            db.close()
+    return statistics.median(timings)
+
+
+def test_pessoas_listing_latency_before_and_after(seeded_pessoas):
+    deep = ROWS // 2
+
+    db = SessionLocal()
+    try:
+        nome, pessoa_id = db.query(Pessoa.nome, Pessoa.id).filter(
+            Pessoa.is_active == True
+        ).order_by(Pessoa.nome, Pessoa.id).offset(deep - 1).first()
+    finally:
+        db.close()
+    deep_cursor = encode_cursor([nome, pessoa_id])
+
+    results = {
+        "antes, 1a página": median_ms(lambda db: listar_antes(db, 0)),
+        "depois, 1a página, count=estimated": median_ms(lambda db: listar_depois(db, "estimated")),
+        "depois, 1a página, count=none": median_ms(lambda db: listar_depois(db, "none")),
+        "antes, página profunda (OFFSET)": median_ms(lambda db: listar_antes(db, deep)),
+        "depois, página profunda (cursor)": median_ms(
+            lambda db: listar_depois(db, "none", after=deep_cursor)
+        ),
+    }
+
+    print(f"\nListagem de pessoas, {ROWS} registros, {LIMIT} por página (mediana de {REPEAT}):")
+    for name, elapsed in results.items():
+        print(f"  {name:<40} {elapsed:10.1f} ms")
+
+    assert results["depois, 1a página, count=estimated"] < results["antes, 1a página"]
+    assert results["depois, página profunda (cursor)"] < results["antes, página profunda (OFFSET)"]
@@ -0,0 +1,14 @@
+"""
+Rotas de busca de produto chamadas a cada tecla/leitura do PDV: consultas
+SQLAlchemy síncronas, então as rotas são ``def`` (threadpool), não ``async def``
+"""
+import inspect
+
+import pytest
+
+from app.routers.products import quick_search_products, search_product_by_barcode
+
+
+@pytest.mark.parametrize("endpoint", [quick_search_products, search_product_by_barcode])
+def test_search_routes_do_not_run_on_the_event_loop(endpoint):
+    assert not inspect.iscoroutinefunction(endpoint)
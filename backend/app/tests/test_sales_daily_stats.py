@@ -0,0 +1,68 @@
+"""
+Estatísticas do dia (/sales/stats/today) e dia do rollup de vendas no horário
+do Brasil: created_at recebe br_now() (com fuso) e o PostgreSQL grava na
+coluna sem fuso o horário do TimeZone da sessão
+"""
+from datetime import date, datetime
+from decimal import Decimal
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from app.models import base
+from app.models.base import BR_TIMEZONE
+from app.models.sale import Sale, SaleItem
+from app.routers.sales import get_daily_sales_stats
+
+DAY = date(2001, 2, 10)
+
+
+@pytest.fixture
+def brazil_evening(monkeypatch, make_product, test_user, pg_conn):
+    """Relógio parado às 23h de DAY (Brasil); remove as vendas e os rollups no final"""
+    monkeypatch.setattr(base, "br_now", lambda: datetime(2001, 2, 10, 23, 0, tzinfo=BR_TIMEZONE))
+
+    yield make_product(), test_user
+
+    with pg_conn.cursor() as cursor:
+        cursor.execute("DELETE FROM sale_items WHERE sale_id IN (SELECT id FROM sales WHERE user_id = %s)", (test_user,))
+        cursor.execute("DELETE FROM sales WHERE user_id = %s", (test_user,))
+        cursor.execute("SELECT compact_sales_rollup_deltas(NULL)")
+        days = ('2001-02-09', '2001-02-10', '2001-02-11')
+        cursor.execute("DELETE FROM sales_daily_by_product WHERE day::text IN %s", (days,))
+        cursor.execute("DELETE FROM sales_daily_by_client_type WHERE day::text IN %s", (days,))
+
+
+def _sale(db, user_id, product_id, created_at, quantity):
+    sale = Sale(number=f"ST-{uuid.uuid4().hex[:12]}", user_id=user_id, status="completed",
+                total=Decimal(10 * quantity), created_at=created_at, sale_date=created_at)
+    sale.items = [SaleItem(product_id=product_id, quantity=quantity,
+                           unit_price=Decimal(10), subtotal=Decimal(10 * quantity))]
+    db.add(sale)
+    return sale
+
+
+def test_today_stats_and_rollup_use_the_brazil_day(brazil_evening, db_session):
+    product_id, user_id = brazil_evening
+    # 00h30 e 22h30 de DAY contam; 22h30 da véspera e 00h30 do dia seguinte não
+    sales = [
+        _sale(db_session, user_id, product_id, datetime(2001, 2, 10, 0, 30, tzinfo=BR_TIMEZONE), 1),
+        _sale(db_session, user_id, product_id, datetime(2001, 2, 10, 22, 30, tzinfo=BR_TIMEZONE), 2),
+        _sale(db_session, user_id, product_id, datetime(2001, 2, 9, 22, 30, tzinfo=BR_TIMEZONE), 4),
+        _sale(db_session, user_id, product_id, datetime(2001, 2, 11, 0, 30, tzinfo=BR_TIMEZONE), 8),
+    ]
+    db_session.commit()
+
+    stats = get_daily_sales_stats(db=db_session)["data"]
+
+    assert stats["today"] == DAY.isoformat()
+    assert stats["sales_count"] == 2
+    assert stats["sales_total"] == 30
+    assert [p["quantity_sold"] for p in stats["top_products"]] == [3]
+
+    days = db_session.execute(
+        text("SELECT sales_rollup_day(created_at, sale_date) FROM sales WHERE id = ANY(:ids) ORDER BY total"),
+        {"ids": [sale.id for sale in sales]}
+    ).scalars().all()
+    assert days == [date(2001, 2, 10), date(2001, 2, 10), date(2001, 2, 9), date(2001, 2, 11)]
@@ -0,0 +1,82 @@
+"""
+Baixa atômica de estoque (CartService.decrement_stock / DECREMENT_STOCK_SQL)
+sob checkouts concorrentes: nenhum produto pode ser vendido além do saldo
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.core.database import SessionLocal
+from app.services.cart_service import CartService
+
+
+def _stock(pg_conn, product_id):
+    with pg_conn.cursor() as cursor:
+        cursor.execute("SELECT stock_quantity FROM products WHERE id = %s", (str(product_id),))
+        return cursor.fetchone()[0]
+
+
+def _run_checkouts(carts):
+    """Cada carrinho é um checkout em sessão própria; retorna quantos venderam"""
+    barrier = threading.Barrier(len(carts))
+
+    def checkout(items):
+        db = SessionLocal()
+        try:
+            barrier.wait()
+            CartService(db).decrement_stock_or_raise(items)
+            db.commit()
+            return True
+        except HTTPException:
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=len(carts)) as executor:
+        return sum(executor.map(checkout, carts))
+
+
+def test_concurrent_checkouts_never_oversell(make_product, pg_conn):
+    product_id = make_product(stock_quantity=10)
+
+    sold = _run_checkouts([[(product_id, 1)] for _ in range(30)])
+
+    assert sold == 10
+    assert _stock(pg_conn, product_id) == 0
+
+
+def test_multi_item_carts_in_any_order_do_not_deadlock_or_oversell(make_product, pg_conn):
+    first = make_product(stock_quantity=15)
+    second = make_product(stock_quantity=15)
+
+    # Metade dos carrinhos lista os produtos em ordem inversa
+    carts = [
+        [(first, 2), (second, 1)] if i % 2 == 0 else [(second, 1), (first, 2)]
+        for i in range(24)
+    ]
+    sold = _run_checkouts(carts)
+
+    # first limita: 15 // 2 = 7 carrinhos completos
+    assert sold == 7
+    assert _stock(pg_conn, first) == 15 - 2 * sold
+    assert _stock(pg_conn, second) == 15 - sold
+
+
+def test_shortages_are_reported_per_item(make_product, db_session):
+    in_stock = make_product(stock_quantity=5)
+    short = make_product(stock_quantity=1)
+
+    shortages = CartService(db_session).decrement_stock([(in_stock, 2), (short, 3), (short, 1)])
+    db_session.rollback()
+
+    assert len(shortages) == 1
+    assert shortages[0]["product_id"] == str(short)
+    assert shortages[0]["requested"] == 4
+    assert shortages[0]["available"] == 1
+    remaining = db_session.execute(
+        text("SELECT stock_quantity FROM products WHERE id = :id"), {"id": str(in_stock)}
+    ).scalar()
+    assert remaining == 5
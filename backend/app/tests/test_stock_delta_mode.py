@@ -0,0 +1,135 @@
+"""
+Estoque em modo delta (migrations/030 e 034): saídas concorrentes não deixam
+o saldo negativo e a compactação não trava por causa de um produto.
+
+O benchmark de disputa (várias transações lançando no mesmo produto, modo
+normal x delta) só roda com RUN_BENCHMARKS=1; os números saem com ``pytest -s``.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+
+from app.services import stock_service
+from app.services.stock_service import StockService
+
+
+@pytest.fixture
+def delta_mode(monkeypatch):
+    monkeypatch.setattr(stock_service.settings, "stock_delta_mode", True)
+
+
+def _move(product_id, movement_type, quantity):
+    return StockService.create_stock_movement.sync(
+        StockService(),
+        {'product_id': str(product_id), 'movement_type': movement_type,
+         'quantity': quantity, 'unit_cost': 5},
+        str(uuid.uuid4())
+    )
+
+
+def _compact():
+    result = StockService.compact_stock_deltas.sync(StockService())
+    assert result.success, result.message
+    return result.data['compacted']
+
+
+def _concurrently(calls):
+    barrier = threading.Barrier(len(calls))
+
+    def run(call):
+        barrier.wait()
+        return call()
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        return list(executor.map(run, calls))
+
+
+def _balance(pg_conn, table, product_id):
+    with pg_conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT quantidade_disponivel FROM {table} WHERE product_id = %s", (str(product_id),)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+
+def _pending(pg_conn, product_id):
+    with pg_conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM estoque_atual_deltas WHERE product_id = %s", (str(product_id),))
+        return cursor.fetchone()[0]
+
+
+def test_concurrent_exits_in_delta_mode_never_go_negative(delta_mode, make_product, pg_conn):
+    product_id = make_product()
+    assert _move(product_id, 'entrada_ajuste', 10).success
+    _compact()
+
+    results = _concurrently([lambda: _move(product_id, 'saida_perda', 1) for _ in range(30)])
+
+    assert sum(r.success for r in results) == 10
+    assert _balance(pg_conn, 'vw_estoque_atual', product_id) == 0
+
+    # Ajuste também não passa do saldo no modo delta
+    rejected = _move(product_id, 'saida_ajuste', 1)
+    assert not rejected.success
+    assert rejected.message == "Estoque insuficiente"
+
+    _compact()
+    assert _balance(pg_conn, 'estoque_atual', product_id) == 0
+    assert _pending(pg_conn, product_id) == 0
+
+
+def test_compaction_retains_only_products_that_would_go_negative(delta_mode, make_product, pg_conn):
+    broken = make_product()
+    healthy = make_product()
+    with pg_conn.cursor() as cursor:
+        # Delta gravado fora da validação (ex.: versão antiga da aplicação)
+        cursor.execute("""
+            INSERT INTO estoque_atual_deltas (product_id, quantidade_delta, custo_medio, entrada)
+            VALUES (%s, -5, 5, false), (%s, 3, 5, true)
+        """, (str(broken), str(healthy)))
+
+    assert _compact() >= 1
+
+    assert _balance(pg_conn, 'estoque_atual', healthy) == 3
+    assert _pending(pg_conn, healthy) == 0
+    assert _balance(pg_conn, 'estoque_atual', broken) is None
+    assert _pending(pg_conn, broken) == 1
+    assert _balance(pg_conn, 'vw_estoque_atual', broken) == -5
+
+
+@pytest.mark.skipif(os.getenv("RUN_BENCHMARKS") != "1", reason="benchmark: defina RUN_BENCHMARKS=1")
+@pytest.mark.parametrize("workers, per_worker", [(16, 25)])
+def test_hot_product_contention_benchmark(monkeypatch, make_product, pg_conn, workers, per_worker):
+    timings = {}
+    for mode in (False, True):
+        monkeypatch.setattr(stock_service.settings, "stock_delta_mode", mode)
+        product_id = make_product()
+        assert _move(product_id, 'entrada_ajuste', 1000).success
+
+        def worker():
+            # Entradas e saídas intercaladas no mesmo produto
+            for i in range(per_worker):
+                movement_type = 'entrada_ajuste' if i % 2 == 0 else 'saida_perda'
+                assert _move(product_id, movement_type, 1).success
+
+        started = time.perf_counter()
+        _concurrently([worker] * workers)
+        elapsed = time.perf_counter() - started
+        timings["delta" if mode else "normal"] = elapsed
+
+        if mode:
+            _compact()
+            expected = 1000 + workers * ((per_worker + 1) // 2 - per_worker // 2)
+            assert _balance(pg_conn, 'estoque_atual', product_id) == Decimal(expected)
+            assert _pending(pg_conn, product_id) == 0
+
+    total = workers * per_worker
+    print(f"\nProduto disputado: {workers} transações concorrentes x {per_worker} movimentações")
+    for mode, elapsed in timings.items():
+        print(f"  modo {mode:<7} {elapsed * 1000:9.1f} ms  {total / elapsed:8.1f} mov/s")
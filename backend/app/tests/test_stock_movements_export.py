@@ -0,0 +1,38 @@
+"""
+Exportação de movimentações (StockService.movements_export_query): o filtro
+por data cobre o dia final inteiro, como get_movements_summary
+"""
+from datetime import date, datetime
+
+from app.services.stock_service import StockService
+
+DATE_TO = date(2001, 3, 10)
+
+
+def _insert_movement(cursor, product_id, moved_at, quantity):
+    cursor.execute("""
+        INSERT INTO movimentacoes_estoque
+            (product_id, tipo_movimentacao, quantidade_anterior, quantidade_movimentada,
+             quantidade_atual, custo_unitario, data_movimentacao)
+        VALUES (%s, 'entrada_ajuste', 0, %s, %s, 5, %s)
+    """, (str(product_id), quantity, quantity, moved_at))
+
+
+def test_export_includes_the_whole_final_day(make_product, pg_conn):
+    product_id = make_product()
+    with pg_conn.cursor() as cursor:
+        _insert_movement(cursor, product_id, datetime(2001, 3, 9, 0, 0), 1)
+        _insert_movement(cursor, product_id, datetime(2001, 3, 10, 15, 0), 2)
+        _insert_movement(cursor, product_id, datetime(2001, 3, 11, 0, 0), 4)
+
+        query, params = StockService().movements_export_query({
+            'product_id': str(product_id),
+            'date_from': date(2001, 3, 9),
+            'date_to': DATE_TO,
+        })
+        cursor.execute(query, params)
+        columns = [column.name for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    # 15h do dia final entra; 0h do dia seguinte não
+    assert sorted(row['quantidade_movimentada'] for row in rows) == [1, 2]
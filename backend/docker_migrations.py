@@ -26,7 +26,16 @@ def main():
             "023_create_stock_entries_fixed.sql", 
             "024_create_stock_movements_fixed.sql",
             "025_create_product_costs_fixed.sql",
-            "026_create_accounts_payable_fixed.sql"
+            "026_create_accounts_payable_fixed.sql",
+            "027_create_document_sequences.sql",
+            "028_create_keyset_pagination_indexes.sql",
+            "029_estoque_atual_batch_flag.sql",
+            "030_estoque_atual_delta_ledger.sql",
+            "031_create_movimentacoes_summary_index.sql",
+            "032_create_estoque_valor_diario.sql",
+            "033_create_fila_emails.sql",
+            "034_compactar_estoque_deltas_retem_negativos.sql",
+            "035_estoque_valor_diario_sem_trigger.sql"
         ]
         
         success_count = 0
@@ -0,0 +1,78 @@
+-- Migration: Sequences para numeração de documentos
+-- Substitui COUNT(*) + 1 / MAX(CAST(SUBSTRING(...))) por nextval(), O(1) e sem colisões
+-- Prefixos: VND (vendas), QS (vendas rápidas), PV (pedidos de venda),
+--           PED (pedidos de compra), ENT (entradas de estoque), CP (contas a pagar)
+
+CREATE SEQUENCE IF NOT EXISTS seq_numero_venda START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_numero_venda_rapida START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_numero_pedido_venda START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_numero_pedido_compra START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_numero_entrada START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_numero_conta START 1;
+
+-- Posiciona a sequence após o maior número já emitido com o prefixo informado
+CREATE OR REPLACE FUNCTION seed_document_sequence(
+    p_sequence TEXT, p_table TEXT, p_column TEXT, p_prefix TEXT
+) RETURNS BIGINT AS $$
+DECLARE
+    max_number BIGINT;
+BEGIN
+    IF to_regclass(p_table) IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    EXECUTE format(
+        'SELECT COALESCE(MAX(CAST(SUBSTRING(%1$I FROM %2$s) AS BIGINT)), 0) FROM %3$s WHERE %1$I ~ %4$L',
+        p_column, length(p_prefix) + 1, p_table, '^' || p_prefix || '[0-9]+$'
+    ) INTO max_number;
+
+    IF max_number > 0 THEN
+        PERFORM setval(p_sequence, max_number, true);
+    ELSE
+        PERFORM setval(p_sequence, 1, false);
+    END IF;
+
+    RETURN max_number;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT seed_document_sequence('seq_numero_venda', 'sales', 'number', 'VND');
+SELECT seed_document_sequence('seq_numero_venda_rapida', 'sales', 'number', 'QS');
+SELECT seed_document_sequence('seq_numero_pedido_venda', 'sale_orders', 'number', 'PV');
+SELECT seed_document_sequence('seq_numero_pedido_compra', 'pedidos_compra', 'numero_pedido', 'PED');
+SELECT seed_document_sequence('seq_numero_entrada', 'entradas_estoque', 'numero_entrada', 'ENT');
+SELECT seed_document_sequence('seq_numero_conta', 'contas_pagar', 'numero_conta', 'CP');
+
+-- Triggers passam a usar as sequences em vez de varrer a tabela
+CREATE OR REPLACE FUNCTION generate_numero_pedido()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.numero_pedido IS NULL THEN
+        NEW.numero_pedido := 'PED' || LPAD(nextval('seq_numero_pedido_compra')::TEXT, 6, '0');
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION generate_numero_entrada()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.numero_entrada IS NULL THEN
+        NEW.numero_entrada := 'ENT' || LPAD(nextval('seq_numero_entrada')::TEXT, 6, '0');
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION generate_numero_conta()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.numero_conta IS NULL THEN
+        NEW.numero_conta := 'CP' || LPAD(nextval('seq_numero_conta')::TEXT, 6, '0');
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,7 @@
+-- Migration: Índices compostos para paginação por cursor (keyset)
+-- Cada listagem ordena por (chave, id) e o cursor filtra por (chave, id) < / > (valor, id),
+-- então o índice composto permite começar a página direto na posição certa, sem OFFSET
+
+CREATE INDEX IF NOT EXISTS idx_movimentacoes_data_id ON movimentacoes_estoque(data_movimentacao, id);
+CREATE INDEX IF NOT EXISTS idx_pedidos_compra_data_id ON pedidos_compra(data_pedido, id);
+CREATE INDEX IF NOT EXISTS idx_contas_pagar_vencimento_id ON contas_pagar(data_vencimento_original, id);
@@ -0,0 +1,118 @@
+-- Migration: Permite que processamentos em lote atualizem estoque_atual uma vez por produto
+-- Com set_config('app.estoque_atual_batch', 'on', true) o trigger por linha de
+-- movimentacoes_estoque não atualiza estoque_atual. O lote insere com o flag ligado as
+-- movimentações intermediárias de cada produto e, com o flag desligado, só a última, que
+-- grava o snapshot final (mesmos valores da última execução do trigger). Fora disso nada muda.
+-- Cobre as duas versões do trigger: update_estoque_atual (024) e atualizar_estoque_atual (018).
+
+CREATE OR REPLACE FUNCTION update_estoque_atual()
+RETURNS TRIGGER AS $$
+DECLARE
+    entrada_flag BOOLEAN;
+BEGIN
+    -- Lote em andamento: snapshot gravado pelo chamador no final
+    IF current_setting('app.estoque_atual_batch', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    
+    -- Determinar se é entrada ou saída
+    entrada_flag := NEW.tipo_movimentacao LIKE 'entrada_%';
+    
+    -- Inserir ou atualizar registro no estoque atual
+    INSERT INTO estoque_atual (
+        product_id, 
+        quantidade_disponivel, 
+        custo_medio,
+        ultima_entrada,
+        ultima_saida,
+        ultima_movimentacao
+    ) VALUES (
+        NEW.product_id,
+        NEW.quantidade_atual,
+        NEW.custo_medio_atual,
+        CASE WHEN entrada_flag THEN NEW.data_movimentacao ELSE NULL END,
+        CASE WHEN NOT entrada_flag THEN NEW.data_movimentacao ELSE NULL END,
+        NEW.data_movimentacao
+    )
+    ON CONFLICT (product_id) DO UPDATE SET
+        quantidade_disponivel = NEW.quantidade_atual,
+        custo_medio = NEW.custo_medio_atual,
+        ultima_entrada = CASE 
+            WHEN entrada_flag THEN NEW.data_movimentacao 
+            ELSE estoque_atual.ultima_entrada 
+        END,
+        ultima_saida = CASE 
+            WHEN NOT entrada_flag THEN NEW.data_movimentacao 
+            ELSE estoque_atual.ultima_saida 
+        END,
+        ultima_movimentacao = NEW.data_movimentacao,
+        updated_at = CURRENT_TIMESTAMP;
+    
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Versão da migration 018, redefinida apenas se existir nesta base
+DO $migration$
+BEGIN
+    IF to_regproc('atualizar_estoque_atual') IS NULL THEN
+        RETURN;
+    END IF;
+    
+    EXECUTE $fn$
+    CREATE OR REPLACE FUNCTION atualizar_estoque_atual()
+    RETURNS TRIGGER AS $body$
+    DECLARE
+        estoque_row estoque_atual%ROWTYPE;
+    BEGIN
+        -- Lote em andamento: snapshot gravado pela última movimentação do produto
+        IF current_setting('app.estoque_atual_batch', true) = 'on' THEN
+            RETURN NEW;
+        END IF;
+        
+        -- Buscar registro do estoque atual
+        SELECT * INTO estoque_row FROM estoque_atual WHERE product_id = NEW.product_id;
+        
+        -- Se não existe, criar
+        IF NOT FOUND THEN
+            INSERT INTO estoque_atual (
+                product_id, 
+                quantidade_disponivel, 
+                quantidade_total,
+                custo_medio,
+                valor_estoque,
+                ultima_movimentacao
+            ) VALUES (
+                NEW.product_id,
+                NEW.quantidade_atual,
+                NEW.quantidade_atual,
+                NEW.custo_medio_atual,
+                NEW.quantidade_atual * NEW.custo_medio_atual,
+                NEW.data_movimentacao
+            );
+        ELSE
+            -- Atualizar estoque existente
+            UPDATE estoque_atual SET
+                quantidade_disponivel = NEW.quantidade_atual,
+                quantidade_total = NEW.quantidade_atual + COALESCE(quantidade_reservada, 0),
+                custo_medio = NEW.custo_medio_atual,
+                valor_estoque = (NEW.quantidade_atual + COALESCE(quantidade_reservada, 0)) * NEW.custo_medio_atual,
+                ultima_movimentacao = NEW.data_movimentacao,
+                ultima_entrada = CASE 
+                    WHEN NEW.quantidade_movimentada > 0 THEN NEW.data_movimentacao 
+                    ELSE ultima_entrada 
+                END,
+                ultima_saida = CASE 
+                    WHEN NEW.quantidade_movimentada < 0 THEN NEW.data_movimentacao 
+                    ELSE ultima_saida 
+                END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE product_id = NEW.product_id;
+        END IF;
+        
+        RETURN NEW;
+    END;
+    $body$ LANGUAGE plpgsql;
+    $fn$;
+END
+$migration$;
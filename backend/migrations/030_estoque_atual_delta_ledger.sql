@@ -0,0 +1,192 @@
+-- Migration: Modo opcional de razão de deltas (delta ledger) para estoque_atual
+-- Com set_config('app.estoque_modo_delta', 'on', true) o trigger de movimentacoes_estoque não
+-- faz o upsert na linha do produto em estoque_atual (ponto de disputa entre transações
+-- concorrentes do mesmo produto): apenas acrescenta uma linha em estoque_atual_deltas.
+-- Leituras usam vw_estoque_atual (base + deltas pendentes) e compactar_estoque_deltas()
+-- incorpora periodicamente os deltas em estoque_atual. Sem o flag nada muda.
+-- Escrito para a versão do estoque da migration 024 (update_estoque_atual, colunas geradas).
+
+CREATE TABLE IF NOT EXISTS estoque_atual_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    product_id UUID NOT NULL REFERENCES products(id),
+    quantidade_delta DECIMAL(15,3) NOT NULL,
+    custo_medio DECIMAL(15,2),
+    entrada BOOLEAN NOT NULL,
+    data_movimentacao TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_estoque_atual_deltas_product ON estoque_atual_deltas(product_id, id);
+
+CREATE OR REPLACE FUNCTION update_estoque_atual()
+RETURNS TRIGGER AS $$
+DECLARE
+    entrada_flag BOOLEAN;
+BEGIN
+    -- Determinar se é entrada ou saída
+    entrada_flag := NEW.tipo_movimentacao LIKE 'entrada_%';
+
+    -- Modo delta: só acrescenta, a compactação grava o snapshot depois
+    IF current_setting('app.estoque_modo_delta', true) = 'on' THEN
+        INSERT INTO estoque_atual_deltas (
+            product_id, quantidade_delta, custo_medio, entrada, data_movimentacao
+        ) VALUES (
+            NEW.product_id,
+            NEW.quantidade_movimentada,
+            NEW.custo_medio_atual,
+            entrada_flag,
+            COALESCE(NEW.data_movimentacao, CURRENT_TIMESTAMP)
+        );
+        RETURN NEW;
+    END IF;
+
+    -- Lote em andamento: snapshot gravado pelo chamador no final
+    IF current_setting('app.estoque_atual_batch', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+
+    -- Inserir ou atualizar registro no estoque atual
+    INSERT INTO estoque_atual (
+        product_id,
+        quantidade_disponivel,
+        custo_medio,
+        ultima_entrada,
+        ultima_saida,
+        ultima_movimentacao
+    ) VALUES (
+        NEW.product_id,
+        NEW.quantidade_atual,
+        NEW.custo_medio_atual,
+        CASE WHEN entrada_flag THEN NEW.data_movimentacao ELSE NULL END,
+        CASE WHEN NOT entrada_flag THEN NEW.data_movimentacao ELSE NULL END,
+        NEW.data_movimentacao
+    )
+    ON CONFLICT (product_id) DO UPDATE SET
+        quantidade_disponivel = NEW.quantidade_atual,
+        custo_medio = NEW.custo_medio_atual,
+        ultima_entrada = CASE
+            WHEN entrada_flag THEN NEW.data_movimentacao
+            ELSE estoque_atual.ultima_entrada
+        END,
+        ultima_saida = CASE
+            WHEN NOT entrada_flag THEN NEW.data_movimentacao
+            ELSE estoque_atual.ultima_saida
+        END,
+        ultima_movimentacao = NEW.data_movimentacao,
+        updated_at = CURRENT_TIMESTAMP;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Saldo efetivo: estoque_atual + deltas ainda não compactados.
+-- A tabela de deltas fica pequena (compactada a cada poucos segundos), então a agregação é barata.
+CREATE OR REPLACE VIEW vw_estoque_atual AS
+WITH pendentes AS (
+    SELECT
+        product_id,
+        SUM(quantidade_delta) AS quantidade_delta,
+        (ARRAY_AGG(custo_medio ORDER BY id DESC) FILTER (WHERE custo_medio IS NOT NULL))[1] AS custo_medio,
+        MAX(data_movimentacao) FILTER (WHERE entrada) AS ultima_entrada,
+        MAX(data_movimentacao) FILTER (WHERE NOT entrada) AS ultima_saida,
+        MAX(data_movimentacao) AS ultima_movimentacao
+    FROM estoque_atual_deltas
+    GROUP BY product_id
+),
+saldo AS (
+    SELECT
+        COALESCE(ea.product_id, d.product_id) AS product_id,
+        COALESCE(ea.quantidade_disponivel, 0) + COALESCE(d.quantidade_delta, 0) AS quantidade_disponivel,
+        COALESCE(ea.quantidade_reservada, 0) AS quantidade_reservada,
+        COALESCE(d.custo_medio, ea.custo_medio, 0) AS custo_medio,
+        COALESCE(ea.estoque_minimo, 0) AS estoque_minimo,
+        COALESCE(ea.estoque_maximo, 0) AS estoque_maximo,
+        COALESCE(ea.ponto_reposicao, 0) AS ponto_reposicao,
+        GREATEST(ea.ultima_entrada, d.ultima_entrada) AS ultima_entrada,
+        GREATEST(ea.ultima_saida, d.ultima_saida) AS ultima_saida,
+        GREATEST(ea.ultima_movimentacao, d.ultima_movimentacao) AS ultima_movimentacao,
+        ea.updated_at
+    FROM estoque_atual ea
+    FULL JOIN pendentes d ON d.product_id = ea.product_id
+)
+SELECT
+    product_id,
+    quantidade_disponivel,
+    quantidade_reservada,
+    quantidade_disponivel + quantidade_reservada AS quantidade_total,
+    custo_medio,
+    ROUND((quantidade_disponivel + quantidade_reservada) * custo_medio, 2) AS valor_estoque,
+    estoque_minimo,
+    estoque_maximo,
+    ponto_reposicao,
+    quantidade_disponivel <= ponto_reposicao AS precisa_reposicao,
+    quantidade_disponivel = 0 AS estoque_zerado,
+    quantidade_disponivel < 0 AS estoque_negativo,
+    ultima_entrada,
+    ultima_saida,
+    ultima_movimentacao,
+    updated_at
+FROM saldo;
+
+-- Incorpora até p_limite deltas (os mais antigos) em estoque_atual; retorna quantos foram consumidos.
+-- Remoção e upsert na mesma transação: leitores da view nunca contam um delta duas vezes.
+CREATE OR REPLACE FUNCTION compactar_estoque_deltas(p_limite INTEGER DEFAULT 100000)
+RETURNS INTEGER AS $$
+DECLARE
+    consumidos INTEGER;
+BEGIN
+    WITH lote AS (
+        SELECT id FROM estoque_atual_deltas
+        ORDER BY id
+        LIMIT p_limite
+        FOR UPDATE SKIP LOCKED
+    ),
+    removidos AS (
+        DELETE FROM estoque_atual_deltas d
+        USING lote
+        WHERE d.id = lote.id
+        RETURNING d.*
+    ),
+    por_produto AS (
+        SELECT
+            product_id,
+            SUM(quantidade_delta) AS quantidade_delta,
+            (ARRAY_AGG(custo_medio ORDER BY id DESC) FILTER (WHERE custo_medio IS NOT NULL))[1] AS custo_medio,
+            MAX(data_movimentacao) FILTER (WHERE entrada) AS ultima_entrada,
+            MAX(data_movimentacao) FILTER (WHERE NOT entrada) AS ultima_saida,
+            MAX(data_movimentacao) AS ultima_movimentacao,
+            COUNT(*) AS total
+        FROM removidos
+        GROUP BY product_id
+    ),
+    aplicados AS (
+        INSERT INTO estoque_atual (
+            product_id,
+            quantidade_disponivel,
+            custo_medio,
+            ultima_entrada,
+            ultima_saida,
+            ultima_movimentacao
+        )
+        SELECT
+            product_id,
+            quantidade_delta,
+            custo_medio,
+            ultima_entrada,
+            ultima_saida,
+            ultima_movimentacao
+        FROM por_produto
+        ORDER BY product_id
+        ON CONFLICT (product_id) DO UPDATE SET
+            quantidade_disponivel = estoque_atual.quantidade_disponivel + EXCLUDED.quantidade_disponivel,
+            custo_medio = COALESCE(EXCLUDED.custo_medio, estoque_atual.custo_medio),
+            ultima_entrada = GREATEST(estoque_atual.ultima_entrada, EXCLUDED.ultima_entrada),
+            ultima_saida = GREATEST(estoque_atual.ultima_saida, EXCLUDED.ultima_saida),
+            ultima_movimentacao = GREATEST(estoque_atual.ultima_movimentacao, EXCLUDED.ultima_movimentacao),
+            updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT COALESCE(SUM(total), 0) INTO consumidos
+    FROM por_produto;
+
+    RETURN consumidos;
+END;
+$$ LANGUAGE plpgsql;
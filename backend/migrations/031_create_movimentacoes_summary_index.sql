@@ -0,0 +1,7 @@
+-- Migration: Índice para o resumo de movimentações por período (/stock/reports/movements-summary)
+-- A consulta filtra por intervalo de data_movimentacao e agrupa por tipo_movimentacao; com as
+-- colunas somadas no INCLUDE o resumo é respondido só pelo índice (index-only scan)
+
+CREATE INDEX IF NOT EXISTS idx_movimentacoes_data_tipo
+    ON movimentacoes_estoque(data_movimentacao, tipo_movimentacao)
+    INCLUDE (quantidade_movimentada, valor_total_movimentacao);
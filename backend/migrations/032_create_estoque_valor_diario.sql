@@ -0,0 +1,75 @@
+-- Migration: Valor do estoque por dia, mantido incrementalmente a cada alteração de estoque_atual
+-- O trigger soma a variação de valor_estoque na linha do dia (a primeira alteração do dia parte
+-- do último valor conhecido). reconciliar_estoque_valor_diario() regrava o dia com a soma real de
+-- estoque_atual; roda na carga inicial e na reconciliação noturna.
+
+CREATE TABLE IF NOT EXISTS estoque_valor_diario (
+    dia DATE PRIMARY KEY,
+    valor_estoque DECIMAL(15,2) NOT NULL DEFAULT 0,
+    quantidade_total DECIMAL(15,3) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION atualizar_estoque_valor_diario()
+RETURNS TRIGGER AS $$
+DECLARE
+    delta_valor DECIMAL(15,2) := 0;
+    delta_quantidade DECIMAL(15,3) := 0;
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        delta_valor := COALESCE(NEW.valor_estoque, 0);
+        delta_quantidade := COALESCE(NEW.quantidade_total, 0);
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        delta_valor := delta_valor - COALESCE(OLD.valor_estoque, 0);
+        delta_quantidade := delta_quantidade - COALESCE(OLD.quantidade_total, 0);
+    END IF;
+
+    IF delta_valor = 0 AND delta_quantidade = 0 THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO estoque_valor_diario AS v (dia, valor_estoque, quantidade_total)
+    SELECT CURRENT_DATE,
+           COALESCE(ultimo.valor_estoque, 0) + delta_valor,
+           COALESCE(ultimo.quantidade_total, 0) + delta_quantidade
+    FROM (SELECT NULL) base
+    LEFT JOIN LATERAL (
+        SELECT valor_estoque, quantidade_total FROM estoque_valor_diario
+        WHERE dia < CURRENT_DATE
+        ORDER BY dia DESC
+        LIMIT 1
+    ) ultimo ON true
+    ON CONFLICT (dia) DO UPDATE SET
+        valor_estoque = v.valor_estoque + delta_valor,
+        quantidade_total = v.quantidade_total + delta_quantidade,
+        updated_at = CURRENT_TIMESTAMP;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_estoque_valor_diario ON estoque_atual;
+CREATE TRIGGER trigger_estoque_valor_diario
+    AFTER INSERT OR UPDATE OR DELETE ON estoque_atual
+    FOR EACH ROW
+    EXECUTE FUNCTION atualizar_estoque_valor_diario();
+
+CREATE OR REPLACE FUNCTION reconciliar_estoque_valor_diario()
+RETURNS VOID AS $$
+BEGIN
+    -- Segura os triggers enquanto o valor do dia é recalculado
+    LOCK TABLE estoque_valor_diario IN SHARE ROW EXCLUSIVE MODE;
+
+    INSERT INTO estoque_valor_diario (dia, valor_estoque, quantidade_total)
+    SELECT CURRENT_DATE, COALESCE(SUM(valor_estoque), 0), COALESCE(SUM(quantidade_total), 0)
+    FROM estoque_atual
+    ON CONFLICT (dia) DO UPDATE SET
+        valor_estoque = EXCLUDED.valor_estoque,
+        quantidade_total = EXCLUDED.quantidade_total,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carga inicial
+SELECT reconciliar_estoque_valor_diario();
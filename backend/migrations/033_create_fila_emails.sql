@@ -0,0 +1,34 @@
+-- Migration: Fila persistente de emails (outbox)
+-- As requisições só gravam a mensagem aqui e devolvem o id; o worker do processo
+-- (app.services.email_outbox_service) reserva lotes com FOR UPDATE SKIP LOCKED, envia pela
+-- mesma conexão SMTP e grava o resultado de cada mensagem. Falhas voltam para 'pendente' com
+-- proxima_tentativa calculada por backoff exponencial até max_tentativas.
+-- 'enviando' funciona como reserva com prazo: se o worker cair no meio do lote, a mensagem
+-- volta a ser elegível quando proxima_tentativa vencer.
+
+CREATE TABLE IF NOT EXISTS fila_emails (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    destinatario VARCHAR(255) NOT NULL,
+    assunto VARCHAR(500) NOT NULL,
+    corpo_html TEXT NOT NULL,
+    anexo BYTEA,
+    anexo_nome VARCHAR(255),
+    referencia_tipo VARCHAR(50),
+    referencia_id UUID,
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente' CHECK (status IN ('pendente', 'enviando', 'enviado', 'falhou')),
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    max_tentativas INTEGER NOT NULL DEFAULT 5,
+    proxima_tentativa TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ultimo_erro TEXT,
+    enviado_em TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Só as mensagens ainda a enviar entram no índice usado pelo worker
+CREATE INDEX IF NOT EXISTS idx_fila_emails_proxima_tentativa
+    ON fila_emails(proxima_tentativa)
+    WHERE status IN ('pendente', 'enviando');
+
+CREATE INDEX IF NOT EXISTS idx_fila_emails_referencia
+    ON fila_emails(referencia_tipo, referencia_id);
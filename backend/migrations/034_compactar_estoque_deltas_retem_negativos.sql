@@ -0,0 +1,92 @@
+-- Migration: Compactação de deltas de estoque não aborta mais o lote inteiro
+-- Se os deltas de um produto deixariam estoque_atual negativo (CHECK quantidade_disponivel >= 0),
+-- o upsert da 030 falhava e o lote todo voltava, para sempre (e falhava também para toda saída
+-- líquida, pois o CHECK era avaliado na linha proposta ao INSERT, antes do ON CONFLICT). Agora os deltas desse produto ficam
+-- pendentes em estoque_atual_deltas (o saldo negativo continua visível em vw_estoque_atual, coluna
+-- estoque_negativo), os demais produtos são compactados e um WARNING lista os produtos retidos.
+
+CREATE OR REPLACE FUNCTION compactar_estoque_deltas(p_limite INTEGER DEFAULT 100000)
+RETURNS INTEGER AS $$
+DECLARE
+    consumidos INTEGER;
+    retidos UUID[];
+BEGIN
+    WITH lote AS (
+        SELECT id, product_id, quantidade_delta FROM estoque_atual_deltas
+        ORDER BY id
+        LIMIT p_limite
+        FOR UPDATE SKIP LOCKED
+    ),
+    negativos AS (
+        SELECT lote.product_id
+        FROM lote
+        LEFT JOIN estoque_atual ea ON ea.product_id = lote.product_id
+        GROUP BY lote.product_id, ea.quantidade_disponivel
+        HAVING COALESCE(ea.quantidade_disponivel, 0) + SUM(lote.quantidade_delta) < 0
+    ),
+    removidos AS (
+        DELETE FROM estoque_atual_deltas d
+        USING lote
+        WHERE d.id = lote.id
+          AND lote.product_id NOT IN (SELECT product_id FROM negativos)
+        RETURNING d.*
+    ),
+    por_produto AS (
+        SELECT
+            product_id,
+            SUM(quantidade_delta) AS quantidade_delta,
+            (ARRAY_AGG(custo_medio ORDER BY id DESC) FILTER (WHERE custo_medio IS NOT NULL))[1] AS custo_medio,
+            MAX(data_movimentacao) FILTER (WHERE entrada) AS ultima_entrada,
+            MAX(data_movimentacao) FILTER (WHERE NOT entrada) AS ultima_saida,
+            MAX(data_movimentacao) AS ultima_movimentacao,
+            COUNT(*) AS total
+        FROM removidos
+        GROUP BY product_id
+    ),
+    -- UPDATE e INSERT separados: no upsert da 030 o CHECK valia para a linha proposta ao INSERT
+    -- (só o delta), então qualquer saída líquida falhava mesmo com saldo na base
+    atualizados AS (
+        UPDATE estoque_atual ea SET
+            quantidade_disponivel = ea.quantidade_disponivel + p.quantidade_delta,
+            custo_medio = COALESCE(p.custo_medio, ea.custo_medio),
+            ultima_entrada = GREATEST(ea.ultima_entrada, p.ultima_entrada),
+            ultima_saida = GREATEST(ea.ultima_saida, p.ultima_saida),
+            ultima_movimentacao = GREATEST(ea.ultima_movimentacao, p.ultima_movimentacao),
+            updated_at = CURRENT_TIMESTAMP
+        FROM por_produto p
+        WHERE ea.product_id = p.product_id
+        RETURNING ea.product_id
+    ),
+    inseridos AS (
+        INSERT INTO estoque_atual (
+            product_id,
+            quantidade_disponivel,
+            custo_medio,
+            ultima_entrada,
+            ultima_saida,
+            ultima_movimentacao
+        )
+        SELECT
+            product_id,
+            quantidade_delta,
+            custo_medio,
+            ultima_entrada,
+            ultima_saida,
+            ultima_movimentacao
+        FROM por_produto
+        WHERE product_id NOT IN (SELECT product_id FROM atualizados)
+        ORDER BY product_id
+    )
+    SELECT
+        COALESCE(SUM(total), 0),
+        (SELECT ARRAY_AGG(product_id ORDER BY product_id) FROM negativos)
+    INTO consumidos, retidos
+    FROM por_produto;
+
+    IF retidos IS NOT NULL THEN
+        RAISE WARNING 'compactar_estoque_deltas: saldo negativo, deltas mantidos pendentes para os produtos %', retidos;
+    END IF;
+
+    RETURN consumidos;
+END;
+$$ LANGUAGE plpgsql;
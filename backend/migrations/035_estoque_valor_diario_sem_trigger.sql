@@ -0,0 +1,22 @@
+-- Migration: estoque_valor_diario deixa de ser atualizado a cada alteração de estoque
+-- O trigger da 032 fazia upsert na linha única do dia (CURRENT_DATE) a cada linha alterada em
+-- estoque_atual: toda gravação de estoque, de qualquer produto, disputava essa linha (e transações
+-- que tocavam a linha em ordens diferentes podiam entrar em deadlock). Agora o histórico diário é
+-- gravado só por reconciliar_estoque_valor_diario(), na reconciliação noturna; o valor corrente é
+-- lido direto de vw_estoque_atual.
+
+DROP TRIGGER IF EXISTS trigger_estoque_valor_diario ON estoque_atual;
+DROP FUNCTION IF EXISTS atualizar_estoque_valor_diario();
+
+CREATE OR REPLACE FUNCTION reconciliar_estoque_valor_diario()
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO estoque_valor_diario (dia, valor_estoque, quantidade_total)
+    SELECT CURRENT_DATE, COALESCE(SUM(valor_estoque), 0), COALESCE(SUM(quantidade_total), 0)
+    FROM vw_estoque_atual
+    ON CONFLICT (dia) DO UPDATE SET
+        valor_estoque = EXCLUDED.valor_estoque,
+        quantidade_total = EXCLUDED.quantidade_total,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;